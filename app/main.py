@@ -1,14 +1,18 @@
+import asyncio
 import os
 from fastapi import FastAPI, HTTPException
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from dotenv import load_dotenv
 
-from app.models.alert import ZabbixAlert, AlertSearchRequest, IntelligentSearchRequest, ProcedureAssistRequest
+from app.models.alert import ZabbixAlert, ZabbixAlertBatch, AlertSearchRequest, IntelligentSearchRequest, ProcedureAssistRequest
 from app.models.ticket import SimilarTicket
-from app.services.vector_service import VectorService
-from app.services.redmine_service import RedmineService
-from app.services.intelligent_search import IntelligentSearchService
-from app.services.procedure_assistant_service import ProcedureAssistantService
+from app.services.service_container import ServiceContainer
+from app.services.sync_service import DeltaSyncService, SyncScheduler
+from app.services.alert_signature import AlertSignatureTable
+from app.services.alert_ingestor import AlertIngestor
+from app.services.alert_queue import AlertPriorityQueue, normalize_severity
+from app.services.ticket_enricher import TicketEnricher
 
 load_dotenv()
 
@@ -28,9 +32,14 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# サービスの初期化
-vector_service = VectorService()
-redmine_service = RedmineService()
+# サービスの初期化（Qdrant・OpenAI・Redmineのクライアントは1つずつ生成して各サービスで共有）
+services = ServiceContainer()
+app.state.services = services
+vector_service = services.vector_service
+redmine_service = services.redmine_service
+
+# インデックス処理（CLI・差分同期と同じドキュメント形式で保存）
+ticket_indexer = services.ticket_indexer
 
 # Phase 2: Intelligent Search Service (環境変数で制御)
 intelligent_search_enabled = os.getenv("INTELLIGENT_SEARCH_ENABLED", "false").lower() == "true"
@@ -38,7 +47,7 @@ intelligent_search_service = None
 
 if intelligent_search_enabled:
     try:
-        intelligent_search_service = IntelligentSearchService()
+        intelligent_search_service = services.intelligent_search_service
         print("✓ Intelligent Search Service enabled")
     except Exception as e:
         print(f"✗ Failed to initialize Intelligent Search Service: {e}")
@@ -52,7 +61,7 @@ procedure_assistant_service = None
 
 if procedure_assist_enabled:
     try:
-        procedure_assistant_service = ProcedureAssistantService()
+        procedure_assistant_service = services.procedure_assistant_service
         print("✓ Procedure Assistant Service enabled")
     except Exception as e:
         print(f"✗ Failed to initialize Procedure Assistant Service: {e}")
@@ -61,6 +70,107 @@ else:
     print("ℹ Procedure Assistant Service disabled (set PROCEDURE_ASSIST_ENABLED=true to enable)")
 
 
+# 検索結果のRedmine項目はペイロードから返す（live では古いものをバックグラウンドで更新）
+ticket_enricher = TicketEnricher(vector_service, redmine_service)
+alert_enrich_mode = os.getenv("ALERT_ENRICH_MODE", "live")
+
+
+def enrich_alert_results(result_lists: list) -> list:
+    """
+    アラートごとの類似チケットに、代表チケットの解決策を付ける
+
+    カテゴリ・優先度などはペイロードの値を使い、Redmineは応答の経路で呼ばない
+    （ALERT_ENRICH_MODE=live なら古いチケットをバックグラウンドで更新する）。
+    """
+    all_tickets = [ticket for tickets in result_lists for ticket in tickets]
+
+    # 繰り返し起票されたアラートは、クラスタの代表チケットの解決策を添える
+    canonical = vector_service.fetch_canonical_resolutions(all_tickets)
+    ticket_enricher.enrich(all_tickets, mode=alert_enrich_mode)
+
+    enriched_lists = []
+    for tickets in result_lists:
+        enriched_results = []
+        for ticket in tickets:
+            ticket = dict(ticket)
+            if ticket.get("cluster_canonical_id") in canonical:
+                ticket["canonical_resolution"] = canonical[ticket["cluster_canonical_id"]]
+            enriched_results.append(ticket)
+        enriched_lists.append(enriched_results)
+    return enriched_lists
+
+
+def find_similar_for_alert(alert_text: str) -> list:
+    """アラート文の類似チケットを検索し、代表チケットの解決策とRedmineの詳細を付ける"""
+    similar_tickets = vector_service.search_similar_tickets(
+        alert_text,
+        limit=5,
+        weights=vector_service.alert_weights,  # 短いアラート文は件名ベクトルを重視
+        shape="lite"
+    )
+    return enrich_alert_results([similar_tickets])[0]
+
+
+def find_similar_for_alerts(alert_texts: list) -> list:
+    """複数のアラート文の類似チケットを、Embedding・Qdrant・Redmineそれぞれ1回の呼び出しで検索"""
+    result_lists = vector_service.search_similar_tickets_batch(
+        alert_texts,
+        limit=5,
+        weights=vector_service.alert_weights,
+        shape="lite"
+    )
+    return enrich_alert_results(result_lists)
+
+
+# 既知のアラート（シグネチャ）は保存済みの検索結果を返す
+alert_signature_table = AlertSignatureTable(
+    compute=find_similar_for_alert,
+    compute_batch=find_similar_for_alerts
+)
+# アラートストーム対策（event_id の重複除去・同時検索の共有・トリガー単位の集約）
+alert_ingestor = AlertIngestor(alert_signature_table)
+# 重要度順の処理キュー（過負荷時は低い重要度のアラートを 429 で捨て、重要度ごとの待ち件数の上限を超えたら 503）
+alert_queue = AlertPriorityQueue()
+
+# 差分同期（DELTA_SYNC_ENABLED=true でバックグラウンド定期実行）
+delta_sync_service = DeltaSyncService(
+    vector_service=vector_service,
+    redmine_service=redmine_service,
+    indexer=ticket_indexer,
+    on_index_changed=alert_signature_table.schedule_refresh
+)
+delta_sync_enabled = os.getenv("DELTA_SYNC_ENABLED", "false").lower() == "true"
+delta_sync_scheduler = None
+
+if delta_sync_enabled:
+    delta_sync_scheduler = SyncScheduler(
+        delta_sync_service,
+        interval_seconds=int(os.getenv("DELTA_SYNC_INTERVAL_SECONDS", "300"))
+    )
+
+
+@app.on_event("startup")
+async def start_background_jobs():
+    """バックグラウンドジョブの開始"""
+    # 初回検索が再ランキングの時間予算を超えないよう、モデルを先に読み込む
+    vector_service.reranker.warmup()
+    # 保存済みのアラートシグネチャを最新のインデックスで再計算
+    if alert_signature_table.status()["signatures"]:
+        alert_signature_table.schedule_refresh()
+    if delta_sync_scheduler:
+        delta_sync_scheduler.start()
+
+
+@app.on_event("shutdown")
+async def stop_background_jobs():
+    """バックグラウンドジョブの停止"""
+    alert_queue.stop()
+    if delta_sync_scheduler:
+        delta_sync_scheduler.stop()
+    # 保存待ちのアラートシグネチャを書き出す
+    alert_signature_table.save()
+
+
 @app.get("/")
 async def root():
     """ヘルスチェック"""
@@ -88,6 +198,9 @@ async def health_check():
     except Exception as e:
         health_status["qdrant"] = f"unhealthy: {str(e)}"
 
+    health_status["enrichment"] = ticket_enricher.status()
+    health_status["services"] = services.status()
+
     # Redmine接続チェック
     try:
         if redmine_service.test_connection():
@@ -100,6 +213,16 @@ async def health_check():
     return health_status
 
 
+def alert_queue_response(status: str, alert: ZabbixAlert) -> JSONResponse:
+    """キューで処理しなかったアラートの応答（shed: 429 / rejected: 503 / accepted: 202）"""
+    content = {"status": status, "event_id": alert.event_id, "severity": alert.severity}
+    if status == "shed":
+        return JSONResponse(status_code=429, content=content, headers={"Retry-After": "30"})
+    if status == "rejected":
+        return JSONResponse(status_code=503, content=content, headers={"Retry-After": "30"})
+    return JSONResponse(status_code=202, content=content)
+
+
 @app.post("/webhook/zabbix")
 async def receive_zabbix_alert(alert: ZabbixAlert):
     """
@@ -108,43 +231,86 @@ async def receive_zabbix_alert(alert: ZabbixAlert):
     Args:
         alert: Zabbixアラート情報
 
+    同じ event_id の再送には前回の応答を返し、同じシグネチャの同時アラートは検索を共有する。
+    処理は重要度（severity）順のキューのワーカーで行い、完了をイベントループで待つ
+    （待っている間スレッドを占有しない）。
+
     Returns:
         類似チケット検索結果
+        （signature_cache: hit / miss / coalesced、aggregate: 同じシグネチャの直近の件数とホスト、
+         duplicate: 再送された event_id か）。
+        重要度ごとの待ち時間内に終わらなければ 202（処理は続け、再送で結果を返す）、
+        過負荷で捨てた場合は 429、重要度ごとの待ち件数の上限を超えた・停止中の場合は 503
     """
     try:
-        # アラート情報を整形
-        alert_text = f"{alert.trigger_name} on {alert.hostname}: {alert.item_value}"
+        status, response = await alert_queue.run_async(alert.severity, lambda: alert_ingestor.ingest(alert))
 
-        # 類似チケット検索
-        similar_tickets = vector_service.search_similar_tickets(
-            alert_text,
-            limit=5
-        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error processing alert: {str(e)}")
 
-        # Redmineから詳細情報を取得して補完
-        enriched_results = []
-        for ticket in similar_tickets:
-            detail = redmine_service.get_ticket_details(ticket["ticket_id"])
-            if detail:
-                # ベクトル検索結果とRedmine詳細をマージ
-                enriched_results.append({
-                    **ticket,
-                    "category": detail.get("category"),
-                    "priority": detail.get("priority"),
-                    "tracker": detail.get("tracker"),
-                    "project": detail.get("project")
-                })
-            else:
-                enriched_results.append(ticket)
+    if status != "done":
+        return alert_queue_response(status, alert)
+    return response
 
-        return {
-            "alert": alert.dict(),
-            "similar_tickets": enriched_results,
-            "count": len(enriched_results)
-        }
 
+@app.post("/webhook/zabbix/batch")
+async def receive_zabbix_alert_batch(batch: ZabbixAlertBatch):
+    """
+    Zabbixからのアラートをまとめて受信するエンドポイント
+
+    Args:
+        batch: Zabbixアラートのリスト
+
+    /webhook/zabbix と同じ重複除去・集約を行う。アラートは重要度ごとにまとめて重要度順の
+    キューで処理し、参照テーブルにないシグネチャは重要度ごとにまとめて検索する
+    （Embedding API・Qdrant・Redmine の呼び出しは重要度の種類ごとに1回ずつ）。
+
+    Returns:
+        {"results": アラートと同じ順の /webhook/zabbix と同じ形式の応答, "count": アラート件数,
+         "searched": 検索したシグネチャ数}。
+        待ち時間内に終わらなかった・過負荷で捨てた・受け付けなかった重要度のアラートは
+        {"status": "accepted" / "shed" / "rejected", "event_id", "severity"} になる
+    """
+    groups = {}
+    for i, alert in enumerate(batch.alerts):
+        groups.setdefault(normalize_severity(alert.severity), []).append(i)
+
+    jobs = []
+    try:
+        for severity, indexes in groups.items():
+            jobs.append((indexes, alert_queue.submit(
+                severity,
+                lambda indexes=indexes: alert_ingestor.ingest_batch([batch.alerts[i] for i in indexes])
+            )))
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error processing alert: {str(e)}")
+        # 受け付け済みの重要度は（重要度ごとの待ち時間まで）待ってから失敗を返す
+        await asyncio.gather(*(alert_queue.wait_async(job) for _, job in jobs), return_exceptions=True)
+        raise HTTPException(status_code=500, detail=f"Error processing alerts: {str(e)}")
+
+    try:
+        # 1つの重要度が失敗しても、残りを待ち終えてから失敗を返す
+        outcomes = await asyncio.gather(
+            *(alert_queue.wait_async(job) for _, job in jobs), return_exceptions=True
+        )
+        for outcome in outcomes:
+            if isinstance(outcome, Exception):
+                raise outcome
+        results = [None] * len(batch.alerts)
+        searched = 0
+        for (indexes, _), (status, response) in zip(jobs, outcomes):
+            for n, i in enumerate(indexes):
+                if status == "done":
+                    results[i] = response["results"][n]
+                else:
+                    alert = batch.alerts[i]
+                    results[i] = {"status": status, "event_id": alert.event_id, "severity": alert.severity}
+            if status == "done":
+                searched += response["searched"]
+
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error processing alerts: {str(e)}")
+
+    return {"results": results, "count": len(results), "searched": searched}
 
 
 @app.post("/search", response_model=list[SimilarTicket])
@@ -155,6 +321,9 @@ async def search_similar_tickets(request: AlertSearchRequest):
     Args:
         request: 検索リクエスト
 
+    カテゴリ・優先度・トラッカー・プロジェクトはインデックス済みのペイロードから返す。
+    enrich="live" の場合は、古いチケットをRedmineからバックグラウンドで更新する（応答は待たない）。
+
     Returns:
         類似チケットのリスト
     """
@@ -162,25 +331,13 @@ async def search_similar_tickets(request: AlertSearchRequest):
         # ベクトル検索
         similar_tickets = vector_service.search_similar_tickets(
             request.alert_text,
-            limit=request.limit
+            limit=request.limit,
+            weights=vector_service.alert_weights,
+            diversify=request.diversify,
+            shape="lite"  # 応答（SimilarTicket）に含まれない項目は取得しない
         )
 
-        # Redmineから詳細情報を取得
-        enriched_results = []
-        for ticket in similar_tickets:
-            detail = redmine_service.get_ticket_details(ticket["ticket_id"])
-            if detail:
-                enriched_results.append({
-                    **ticket,
-                    "category": detail.get("category"),
-                    "priority": detail.get("priority"),
-                    "tracker": detail.get("tracker"),
-                    "project": detail.get("project")
-                })
-            else:
-                enriched_results.append(ticket)
-
-        return enriched_results
+        return ticket_enricher.enrich(similar_tickets, mode=request.enrich)
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Search error: {str(e)}")
@@ -265,40 +422,34 @@ async def assist_procedure(request: ProcedureAssistRequest):
 
 
 @app.post("/index/ticket/{ticket_id}")
-async def index_ticket(ticket_id: int):
+def index_ticket(ticket_id: int, force: bool = False):
     """
     特定のチケットをインデックスに追加
 
     Args:
         ticket_id: インデックスするチケットID
+        force: Trueの場合、内容が変わっていなくても再ベクトル化する
 
     Returns:
-        インデックス結果
+        インデックス結果（status: indexed / unchanged / skipped）
     """
     try:
-        # Redmineからチケット情報を取得
-        detail = redmine_service.get_ticket_details(ticket_id)
-        if not detail:
+        result = ticket_indexer.index_ticket(ticket_id, skip_unchanged=not force)
+        if result is None:
             raise HTTPException(status_code=404, detail=f"Ticket {ticket_id} not found")
+        if result["status"] == "indexed":
+            alert_signature_table.schedule_refresh()
 
-        # ベクトルDBにインデックス
-        vector_service.index_ticket(
-            ticket_id=detail["ticket_id"],
-            subject=detail["subject"],
-            description=detail["description"],
-            resolution=detail["resolution"],
-            metadata={
-                "category": detail.get("category"),
-                "assigned_to": detail.get("assigned_to"),
-                "status": detail.get("status"),
-                "closed_on": detail.get("closed_on").isoformat() if detail.get("closed_on") else None
-            }
-        )
-
+        messages = {
+            "indexed": f"Ticket #{ticket_id} indexed successfully",
+            "unchanged": f"Ticket #{ticket_id} is already up to date",
+            "skipped": f"Ticket #{ticket_id} has no content to index",
+        }
         return {
             "success": True,
             "ticket_id": ticket_id,
-            "message": f"Ticket #{ticket_id} indexed successfully"
+            "status": result["status"],
+            "message": messages[result["status"]]
         }
 
     except HTTPException:
@@ -322,6 +473,20 @@ async def get_collection_info():
         raise HTTPException(status_code=500, detail=f"Error getting collection info: {str(e)}")
 
 
+@app.get("/search/payload-stats")
+async def get_search_payload_stats():
+    """
+    検索で受け取ったペイロードの量と検索時間（SEARCH_PAYLOAD_STATS=true の場合のみ記録）
+
+    Returns:
+        {"similar:lite" などの検索の種類: 1回あたりのヒット数・ペイロードサイズ（JSON換算バイト）・検索時間}
+    """
+    return {
+        "enabled": vector_service.payload_stats_enabled,
+        "stats": vector_service.payload_stats_summary()
+    }
+
+
 @app.delete("/index/ticket/{ticket_id}")
 async def delete_ticket_from_index(ticket_id: int):
     """
@@ -335,6 +500,7 @@ async def delete_ticket_from_index(ticket_id: int):
     """
     try:
         vector_service.delete_ticket(ticket_id)
+        alert_signature_table.schedule_refresh()
         return {
             "success": True,
             "ticket_id": ticket_id,
@@ -344,6 +510,53 @@ async def delete_ticket_from_index(ticket_id: int):
         raise HTTPException(status_code=500, detail=f"Deletion error: {str(e)}")
 
 
+@app.post("/sync")
+def run_delta_sync(dry_run: bool = False):
+    """
+    Redmineの更新分をインデックスに差分同期
+
+    Args:
+        dry_run: Trueの場合は対象件数の確認のみ
+
+    Returns:
+        同期結果（更新・削除件数、新しいウォーターマーク）
+    """
+    try:
+        return delta_sync_service.sync(dry_run=dry_run)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Sync error: {str(e)}")
+
+
+@app.get("/webhook/zabbix/stats")
+async def get_alert_ingest_stats():
+    """
+    アラート受け付けの統計
+
+    Returns:
+        受け付け件数、重複・共有・集約で省略した件数、シグネチャの参照テーブルの状態、
+        重要度ごとのキューの状態（待ち件数・捨てた件数・キューでの待ち時間）
+    """
+    return {**alert_ingestor.status(), "queue": alert_queue.status()}
+
+
+@app.get("/sync/status")
+async def get_sync_status():
+    """
+    差分同期の状態を取得
+
+    Returns:
+        ウォーターマーク、再試行待ちチケット、直近の同期結果
+    """
+    try:
+        status = delta_sync_service.get_status()
+        status["scheduler_enabled"] = delta_sync_enabled
+        return status
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error getting sync status: {str(e)}")
+
+
 if __name__ == "__main__":
     import uvicorn
 
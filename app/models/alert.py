@@ -1,6 +1,6 @@
 from pydantic import BaseModel, Field
 from datetime import datetime
-from typing import Optional
+from typing import List, Literal, Optional
 
 
 class ZabbixAlert(BaseModel):
@@ -27,10 +27,23 @@ class ZabbixAlert(BaseModel):
         }
 
 
+class ZabbixAlertBatch(BaseModel):
+    """Zabbixからのアラート（複数件まとめて送信）"""
+    alerts: List[ZabbixAlert] = Field(..., min_length=1, max_length=500, description="アラートのリスト")
+
+
 class AlertSearchRequest(BaseModel):
     """類似検索リクエスト"""
     alert_text: str = Field(..., description="検索するアラートテキスト")
     limit: int = Field(5, ge=1, le=20, description="取得する類似チケット数")
+    diversify: Optional[bool] = Field(
+        None,
+        description="ほぼ重複したチケットを集約し、多様な結果を返すか（省略時は SEARCH_DIVERSIFY）"
+    )
+    enrich: Literal["payload", "live"] = Field(
+        "payload",
+        description="payload: インデックス済みの情報のみ / live: 古いチケットをRedmineから非同期で更新"
+    )
 
 
 class IntelligentSearchRequest(BaseModel):
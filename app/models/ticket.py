@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Optional
+from typing import List, Optional
 from datetime import datetime
 
 
@@ -7,6 +7,7 @@ class SimilarTicket(BaseModel):
     """類似チケット情報"""
     ticket_id: int = Field(..., description="チケットID")
     similarity: float = Field(..., ge=0.0, le=1.0, description="類似度スコア (0-1)")
+    fusion_score: Optional[float] = Field(None, description="ハイブリッド検索の融合順位スコア（RRF、0-1に正規化）")
     subject: str = Field(..., description="チケット件名")
     description: Optional[str] = Field(None, description="チケット説明")
     resolution: Optional[str] = Field(None, description="解決策・対応内容")
@@ -14,6 +15,13 @@ class SimilarTicket(BaseModel):
     assigned_to: Optional[str] = Field(None, description="担当者")
     closed_on: Optional[datetime] = Field(None, description="完了日時")
     status: Optional[str] = Field(None, description="ステータス")
+    priority: Optional[str] = Field(None, description="優先度")
+    tracker: Optional[str] = Field(None, description="トラッカー")
+    project: Optional[str] = Field(None, description="プロジェクト")
+    cluster_id: Optional[int] = Field(None, description="ほぼ重複チケットのクラスタID")
+    cluster_size: int = Field(1, description="クラスタのチケット数")
+    duplicate_count: int = Field(0, description="この結果に集約したほぼ重複のチケット数")
+    duplicate_ticket_ids: List[int] = Field(default_factory=list, description="集約したチケットID")
 
     class Config:
         json_schema_extra = {
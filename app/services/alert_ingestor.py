@@ -0,0 +1,231 @@
+"""
+Zabbixアラートの受け付け（アラートストーム対策）
+
+障害時には Zabbix から毎秒数百件のアラートが届き、再送で同じ event_id が繰り返されたり、
+同じトリガーが多数のホストで同時に発火したりする。1件ずつ検索すると
+Embedding API・Qdrant・Redmine への同じ呼び出しが大量に重なるため、受け付け時に
+    1. event_id で重複を除く（再送には前回と同じ応答を返す）
+    2. 同じシグネチャの検索が実行中なら、その結果を待って共有する（AlertSignatureTable）
+    3. シグネチャごとに一定時間内のアラート件数・ホストを集約して応答に含める
+を行い、省略した処理の件数をカウンタに記録する。
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from app.services.alert_signature import AlertSignatureTable, SingleFlight, alert_signature
+
+
+# 応答の集約情報に含めるホスト名の最大数
+MAX_AGGREGATE_HOSTS = 20
+
+
+class AlertIngestor:
+    """event_id の重複除去・同時検索の共有・トリガー単位の集約を行うアラート受け付け"""
+
+    def __init__(
+        self,
+        table: AlertSignatureTable,
+        dedup_ttl_seconds: Optional[float] = None,
+        window_seconds: Optional[float] = None,
+        max_events: int = 10000
+    ):
+        """
+        Args:
+            table: シグネチャ → 検索結果の参照テーブル
+            dedup_ttl_seconds: 同じ event_id を重複とみなす秒数（省略時は ALERT_DEDUP_TTL_SECONDS、デフォルト: 300）
+            window_seconds: シグネチャごとに件数を集約する秒数（省略時は ALERT_AGGREGATE_WINDOW_SECONDS、デフォルト: 60）
+            max_events: 重複判定のために覚えておく event_id の最大数
+        """
+        self.table = table
+        self.dedup_ttl_seconds = dedup_ttl_seconds or float(os.getenv("ALERT_DEDUP_TTL_SECONDS", "300"))
+        self.window_seconds = window_seconds or float(os.getenv("ALERT_AGGREGATE_WINDOW_SECONDS", "60"))
+        self.max_events = max_events
+
+        # event_id -> (応答, 受け付けた時刻)（古い順）
+        self._events: "OrderedDict[int, tuple]" = OrderedDict()
+        # signature -> {"started", "count", "hosts"}
+        self._windows: Dict[str, dict] = {}
+        self._event_flight = SingleFlight()
+        self._lock = threading.Lock()
+        self.counters = {
+            "received": 0,
+            "duplicate_events": 0,
+            "coalesced_events": 0,
+            "aggregated": 0
+        }
+
+    def ingest(self, alert) -> Dict:
+        """
+        アラートを受け付けて類似チケットの検索結果を返す
+
+        Args:
+            alert: ZabbixAlert
+
+        Returns:
+            {"alert", "similar_tickets", "count", "signature", "signature_cache",
+             "aggregate", "duplicate"}
+        """
+        with self._lock:
+            self.counters["received"] += 1
+            self._expire_events()
+            recent = self._events.get(alert.event_id)
+            if recent is not None:
+                self.counters["duplicate_events"] += 1
+
+        if recent is not None:
+            return {**recent[0], "duplicate": True}
+
+        # 同じ event_id の再送が同時に届いた場合も、処理は1回だけ
+        response, shared = self._event_flight.do(alert.event_id, lambda: self._process(alert))
+        if shared:
+            with self._lock:
+                self.counters["coalesced_events"] += 1
+            return {**response, "duplicate": True}
+        return response
+
+    def ingest_batch(self, alerts: List) -> Dict:
+        """
+        複数のアラートをまとめて受け付ける
+
+        1件ずつの ingest() と同じ重複除去・集約を行い、参照テーブルにないシグネチャは
+        AlertSignatureTable.lookup_many でまとめて検索する。
+        バッチ内で同じ event_id が繰り返された場合は、最初のアラートの応答を duplicate として返す。
+
+        Args:
+            alerts: ZabbixAlert のリスト
+
+        Returns:
+            {"results": alerts と同じ順の ingest() と同じ形式の応答, "count": アラート件数,
+             "searched": 検索したシグネチャ数}
+        """
+        responses: List[Optional[Dict]] = [None] * len(alerts)
+        first_index: Dict[int, int] = {}
+        pending = []
+        with self._lock:
+            self._expire_events()
+            for i, alert in enumerate(alerts):
+                self.counters["received"] += 1
+                recent = self._events.get(alert.event_id)
+                if recent is not None or alert.event_id in first_index:
+                    self.counters["duplicate_events"] += 1
+                    if recent is not None:
+                        responses[i] = {**recent[0], "duplicate": True}
+                    continue
+                first_index[alert.event_id] = i
+                pending.append(i)
+
+        items = []
+        aggregates = {}
+        for i in pending:
+            alert = alerts[i]
+            signature = alert_signature(alert.trigger_name, alert.hostname, alert.trigger_id)
+            aggregates[i] = self._aggregate(signature, alert.hostname)
+            items.append((signature, self._alert_text(alert)))
+
+        # 既知のアラートは参照テーブルから返し、未知のシグネチャはまとめて検索する
+        outcomes = self.table.lookup_many(items)
+
+        now = time.monotonic()
+        for i, (signature, _), (similar_tickets, cache_status) in zip(pending, items, outcomes):
+            responses[i] = self._response(alerts[i], signature, similar_tickets, cache_status, aggregates[i])
+        with self._lock:
+            for i in pending:
+                self._events[alerts[i].event_id] = (responses[i], now)
+            self._expire_events()
+
+        # バッチ内で繰り返された event_id
+        for i, alert in enumerate(alerts):
+            if responses[i] is None:
+                responses[i] = {**responses[first_index[alert.event_id]], "duplicate": True}
+
+        return {
+            "results": responses,
+            "count": len(responses),
+            "searched": sum(1 for _, status in outcomes if status == "miss")
+        }
+
+    @staticmethod
+    def _alert_text(alert) -> str:
+        return f"{alert.trigger_name} on {alert.hostname}: {alert.item_value}"
+
+    @staticmethod
+    def _response(alert, signature: str, similar_tickets: List[dict], cache_status: str, aggregate: Dict) -> Dict:
+        return {
+            "alert": alert.dict(),
+            "similar_tickets": similar_tickets,
+            "count": len(similar_tickets),
+            "signature": signature,
+            "signature_cache": cache_status,
+            "aggregate": aggregate,
+            "duplicate": False
+        }
+
+    def _process(self, alert) -> Dict:
+        signature = alert_signature(alert.trigger_name, alert.hostname, alert.trigger_id)
+        aggregate = self._aggregate(signature, alert.hostname)
+
+        # 既知のアラートは参照テーブルから返し、未知の場合だけ検索する
+        similar_tickets, cache_status = self.table.lookup(signature, self._alert_text(alert))
+
+        response = self._response(alert, signature, similar_tickets, cache_status, aggregate)
+        with self._lock:
+            self._events[alert.event_id] = (response, time.monotonic())
+            self._expire_events()
+        return response
+
+    def _aggregate(self, signature: str, hostname: str) -> Dict:
+        """シグネチャごとの集約ウィンドウにアラートを加え、ウィンドウ内の件数とホストを返す"""
+        now = time.time()
+        with self._lock:
+            window = self._windows.get(signature)
+            if window is None or now - window["started"] > self.window_seconds:
+                window = self._windows[signature] = {"started": now, "count": 0, "hosts": set()}
+                self._expire_windows(now)
+            elif window["count"] > 0:
+                self.counters["aggregated"] += 1
+            window["count"] += 1
+            window["hosts"].add(hostname)
+
+            return {
+                "window_seconds": self.window_seconds,
+                "window_started": window["started"],
+                "alert_count": window["count"],
+                "host_count": len(window["hosts"]),
+                "hosts": sorted(window["hosts"])[:MAX_AGGREGATE_HOSTS]
+            }
+
+    def _expire_events(self):
+        """期限切れ・上限超えの event_id を忘れる（ロック内で呼ぶ）"""
+        deadline = time.monotonic() - self.dedup_ttl_seconds
+        while self._events:
+            _, received_at = next(iter(self._events.values()))
+            if received_at >= deadline and len(self._events) <= self.max_events:
+                break
+            self._events.popitem(last=False)
+
+    def _expire_windows(self, now: float):
+        """終わった集約ウィンドウを削除（ロック内で呼ぶ）"""
+        expired = [s for s, w in self._windows.items() if now - w["started"] > self.window_seconds]
+        for signature in expired:
+            del self._windows[signature]
+
+    def status(self) -> Dict:
+        """受け付け件数と省略した処理の件数"""
+        with self._lock:
+            counters = dict(self.counters)
+            active_windows = len(self._windows)
+        table = self.table.status()
+        return {
+            **counters,
+            "active_windows": active_windows,
+            # Embedding・検索・Redmine呼び出しを省略できたアラートの件数
+            "suppressed_searches": (
+                counters["duplicate_events"] + counters["coalesced_events"]
+                + table["hits"] + table["coalesced"]
+            ),
+            "signature_table": table
+        }
@@ -0,0 +1,335 @@
+"""
+重要度（Zabbixのseverity）順のアラート処理キュー
+
+Webhookのアラートを到着順に処理すると、Information/Warning が大量に届いたときに
+Disaster の処理が後回しになる。受け付けたアラートの処理をこのキューに入れ、
+    - 重要度の高いものから取り出す（同じ重要度の中では到着順）
+    - 重要度ごとに同時実行数の上限を設ける（低い重要度がワーカーを占有しない）
+    - 重要度ごとの待ち時間（deadline）を過ぎたら、処理は続けたまま 202（accepted）で応答する
+      （処理結果は event_id の重複除去に記録されるので、再送すると結果が返る）
+    - キューが一杯のときは、待っている最も低い重要度のアラートを捨て（shed）、429 で応答する
+      （届いたアラートより低い重要度のものがなければ、届いたアラートを捨てる）
+    - 重要度ごとの待ち件数の上限を超えたアラートは受け付けず（rejected）、503 で応答する
+      （低い重要度のアラートが大量に届いても、キュー全体を埋めない）
+を行う。重要度ごとの待ち時間（キューに入ってから処理を始めるまで）を記録する。
+停止時に待っていた・ワーカーが取り出したばかりのアラートも rejected で終わらせる。
+
+APIのエンドポイントは run_async() / wait_async() で結果を待つ。ワーカーの完了を
+イベントループで待つので、待っている間スレッドプールのスレッドを占有しない。
+"""
+
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+
+# 重要度（高い順）。不明な値は最も低い "Not classified" として扱う
+SEVERITIES = ["Disaster", "High", "Average", "Warning", "Information", "Not classified"]
+
+# 待ち時間の統計に使う直近のサンプル数（重要度ごと）
+LATENCY_SAMPLES = 1000
+
+
+def normalize_severity(severity: Optional[str]) -> str:
+    """Zabbixの重要度を SEVERITIES のいずれかに揃える（大文字小文字は区別しない）"""
+    value = (severity or "").strip().lower()
+    for name in SEVERITIES:
+        if name.lower() == value:
+            return name
+    return SEVERITIES[-1]
+
+
+def parse_severity_levels(value: str, default: Dict[str, float]) -> Dict[str, float]:
+    """
+    "Disaster=8,High=6" 形式の重要度ごとの設定をパース
+
+    Returns:
+        {重要度: 値}（指定のない重要度は default の値）
+    """
+    levels = dict(default)
+    for part in (value or "").split(","):
+        if "=" not in part:
+            continue
+        name, level = part.split("=", 1)
+        levels[normalize_severity(name)] = float(level)
+    return levels
+
+
+_DEFAULT_CONCURRENCY = {"Disaster": 8, "High": 6, "Average": 4, "Warning": 2, "Information": 1, "Not classified": 1}
+_DEFAULT_DEADLINES = {"Disaster": 30, "High": 20, "Average": 10, "Warning": 5, "Information": 5, "Not classified": 5}
+_DEFAULT_MAX_QUEUED = {
+    "Disaster": 500, "High": 500, "Average": 200, "Warning": 100, "Information": 50, "Not classified": 50
+}
+
+
+class _Job:
+    def __init__(self, severity: str, fn: Callable[[], Any]):
+        self.severity = severity
+        self.fn = fn
+        self.enqueued_at = time.monotonic()
+        # queued / running / done / shed / expired / rejected
+        self.state = "queued"
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self.done = threading.Event()
+        self._callbacks: List[Callable[[], None]] = []
+        self._callbacks_lock = threading.Lock()
+
+    def add_done_callback(self, callback: Callable[[], None]):
+        """終了時に呼ぶ関数を登録（終了済みならすぐ呼ぶ）"""
+        with self._callbacks_lock:
+            if not self.done.is_set():
+                self._callbacks.append(callback)
+                return
+        callback()
+
+    def set_done(self):
+        """終了を通知（待っているスレッド・登録した関数）"""
+        with self._callbacks_lock:
+            self.done.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            callback()
+
+
+class AlertPriorityQueue:
+    """重要度順・重要度ごとの同時実行数上限つきのワーカーキュー"""
+
+    def __init__(
+        self,
+        workers: Optional[int] = None,
+        max_depth: Optional[int] = None,
+        concurrency: Optional[Dict[str, float]] = None,
+        deadlines: Optional[Dict[str, float]] = None,
+        max_age_seconds: Optional[float] = None,
+        max_queued: Optional[Dict[str, float]] = None
+    ):
+        """
+        Args:
+            workers: ワーカースレッド数（省略時は ALERT_QUEUE_WORKERS、デフォルト: 8）
+            max_depth: キューに待たせる最大件数（省略時は ALERT_QUEUE_MAX_DEPTH、デフォルト: 500）
+            concurrency: 重要度ごとの同時実行数（省略時は ALERT_QUEUE_CONCURRENCY）
+            deadlines: 重要度ごとに応答を待つ秒数（省略時は ALERT_QUEUE_DEADLINES）
+            max_age_seconds: これより長く待ったアラートは処理せずに捨てる（省略時は ALERT_QUEUE_MAX_AGE_SECONDS、デフォルト: 300）
+            max_queued: 重要度ごとに待たせる最大件数（省略時は ALERT_QUEUE_MAX_QUEUED）
+        """
+        self.workers = workers or int(os.getenv("ALERT_QUEUE_WORKERS", "8"))
+        self.max_depth = max_depth or int(os.getenv("ALERT_QUEUE_MAX_DEPTH", "500"))
+        self.concurrency = concurrency or parse_severity_levels(
+            os.getenv("ALERT_QUEUE_CONCURRENCY", ""), _DEFAULT_CONCURRENCY
+        )
+        self.deadlines = deadlines or parse_severity_levels(
+            os.getenv("ALERT_QUEUE_DEADLINES", ""), _DEFAULT_DEADLINES
+        )
+        self.max_age_seconds = max_age_seconds or float(os.getenv("ALERT_QUEUE_MAX_AGE_SECONDS", "300"))
+        self.max_queued = max_queued or parse_severity_levels(
+            os.getenv("ALERT_QUEUE_MAX_QUEUED", ""), _DEFAULT_MAX_QUEUED
+        )
+
+        self._queues: Dict[str, Deque[_Job]] = {s: deque() for s in SEVERITIES}
+        self._running = {s: 0 for s in SEVERITIES}
+        self._latency: Dict[str, Deque[float]] = {s: deque(maxlen=LATENCY_SAMPLES) for s in SEVERITIES}
+        self.counters = {
+            s: {"submitted": 0, "processed": 0, "failed": 0, "shed": 0, "accepted": 0, "expired": 0, "rejected": 0}
+            for s in SEVERITIES
+        }
+        self._cond = threading.Condition()
+        self._threads: List[threading.Thread] = []
+        self._stopped = False
+
+    def start(self):
+        """ワーカースレッドを起動（起動済みなら何もしない）"""
+        with self._cond:
+            if self._threads:
+                return
+            self._stopped = False
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._worker, name=f"alert-queue-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def stop(self):
+        """ワーカースレッドを止める（待っているアラートは rejected で終わらせる。実行中のものは最後まで処理する）"""
+        with self._cond:
+            self._stopped = True
+            for queue in self._queues.values():
+                while queue:
+                    self._finish(queue.popleft(), "rejected")
+            self._cond.notify_all()
+            threads, self._threads = self._threads, []
+        for thread in threads:
+            thread.join(timeout=5)
+
+    def run(self, severity: str, fn: Callable[[], Any]) -> Tuple[str, Any]:
+        """
+        処理をキューに入れ、重要度ごとの待ち時間まで結果を待つ
+
+        Args:
+            severity: Zabbixの重要度
+            fn: 実行する処理
+
+        Returns:
+            ("done", 結果) / ("accepted", None): 待ち時間内に終わらなかった（処理は続ける） /
+            ("shed", None): キューが一杯で捨てられた /
+            ("rejected", None): 重要度ごとの待ち件数の上限を超えた・キューが停止した。
+            処理が例外を送出した場合はそのまま送出する
+        """
+        return self.wait(self.submit(severity, fn))
+
+    async def run_async(self, severity: str, fn: Callable[[], Any]) -> Tuple[str, Any]:
+        """run() のイベントループ版（待っている間スレッドを占有しない）"""
+        return await self.wait_async(self.submit(severity, fn))
+
+    def wait(self, job: _Job) -> Tuple[str, Any]:
+        """submit() した処理の結果を、キューに入れてから重要度ごとの待ち時間まで待つ（戻り値は run() と同じ）"""
+        return self._outcome(job, job.done.wait(self._remaining(job)))
+
+    async def wait_async(self, job: _Job) -> Tuple[str, Any]:
+        """wait() のイベントループ版（ワーカーがジョブを終えるとイベントループ上の Future を完了させる）"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        def resolve():
+            if not future.done():
+                future.set_result(None)
+
+        def notify():
+            try:
+                loop.call_soon_threadsafe(resolve)
+            except RuntimeError:
+                # イベントループが既に閉じている（終了処理中）
+                pass
+
+        job.add_done_callback(notify)
+        try:
+            await asyncio.wait_for(future, timeout=self._remaining(job))
+        except asyncio.TimeoutError:
+            pass
+        return self._outcome(job, job.done.is_set())
+
+    def _remaining(self, job: _Job) -> float:
+        """重要度ごとの待ち時間の残り（秒）"""
+        return max(self.deadlines[job.severity] - (time.monotonic() - job.enqueued_at), 0)
+
+    def _outcome(self, job: _Job, finished: bool) -> Tuple[str, Any]:
+        if not finished:
+            with self._cond:
+                self.counters[job.severity]["accepted"] += 1
+            return "accepted", None
+        if job.state in ("shed", "rejected"):
+            return job.state, None
+        if job.state == "expired":
+            return "accepted", None
+        if job.error is not None:
+            raise job.error
+        return "done", job.result
+
+    def submit(self, severity: str, fn: Callable[[], Any]) -> _Job:
+        """
+        処理をキューに入れる
+
+        重要度ごとの待ち件数が上限なら受け付けない（rejected）。キュー全体が一杯なら
+        低い重要度のものを捨てる（shed）。
+        """
+        job = _Job(normalize_severity(severity), fn)
+        if not self._threads:
+            self.start()
+
+        with self._cond:
+            self.counters[job.severity]["submitted"] += 1
+            if len(self._queues[job.severity]) >= self.max_queued[job.severity]:
+                self._finish(job, "rejected")
+                return job
+            if sum(len(q) for q in self._queues.values()) >= self.max_depth:
+                victim = self._lowest_below(job.severity)
+                if victim is None:
+                    self._finish(job, "shed")
+                    return job
+                self._finish(victim, "shed")
+            self._queues[job.severity].append(job)
+            self._cond.notify()
+        return job
+
+    def _lowest_below(self, severity: str) -> Optional[_Job]:
+        """severity より低い重要度で、最も低く最も新しい待ちアラートをキューから外す（ロック内で呼ぶ）"""
+        rank = SEVERITIES.index(severity)
+        for name in reversed(SEVERITIES[rank + 1:]):
+            if self._queues[name]:
+                return self._queues[name].pop()
+        return None
+
+    def _finish(self, job: _Job, state: str):
+        """実行せずに終わらせる（ロック内で呼ぶ）"""
+        job.state = state
+        self.counters[job.severity][state] += 1
+        job.set_done()
+
+    def _next_job(self) -> Optional[_Job]:
+        """同時実行数に空きのある最も高い重要度の先頭（ロック内で呼ぶ）"""
+        for severity in SEVERITIES:
+            if self._queues[severity] and self._running[severity] < self.concurrency[severity]:
+                return self._queues[severity].popleft()
+        return None
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                job = self._next_job()
+                while job is None and not self._stopped:
+                    self._cond.wait()
+                    job = self._next_job()
+                if self._stopped:
+                    # 取り出したが実行していないアラートも、待っている呼び出し元に終了を伝える
+                    if job is not None:
+                        self._finish(job, "rejected")
+                    return
+                waited = time.monotonic() - job.enqueued_at
+                self._latency[job.severity].append(waited)
+                if waited > self.max_age_seconds:
+                    self._finish(job, "expired")
+                    continue
+                job.state = "running"
+                self._running[job.severity] += 1
+
+            try:
+                job.result = job.fn()
+            except Exception as e:
+                job.error = e
+                print(f"✗ Alert processing failed ({job.severity}): {e}")
+
+            with self._cond:
+                self._running[job.severity] -= 1
+                self.counters[job.severity]["failed" if job.error else "processed"] += 1
+                job.state = "done"
+                # 同時実行数の上限で待っていた重要度が取り出せるようになる
+                self._cond.notify_all()
+            job.set_done()
+
+    def status(self) -> Dict:
+        """重要度ごとの待ち件数・実行中の件数・件数カウンタ・キューでの待ち時間（秒）"""
+        with self._cond:
+            severities = {}
+            for severity in SEVERITIES:
+                samples = sorted(self._latency[severity])
+                severities[severity] = {
+                    "queued": len(self._queues[severity]),
+                    "max_queued": int(self.max_queued[severity]),
+                    "running": self._running[severity],
+                    "concurrency": self.concurrency[severity],
+                    "deadline_seconds": self.deadlines[severity],
+                    **self.counters[severity],
+                    "wait_seconds": {
+                        "p50": samples[len(samples) // 2] if samples else None,
+                        "p95": samples[int(len(samples) * 0.95)] if samples else None,
+                        "max": samples[-1] if samples else None
+                    }
+                }
+            return {
+                "workers": len(self._threads),
+                "max_depth": self.max_depth,
+                "depth": sum(len(q) for q in self._queues.values()),
+                "severities": severities
+            }
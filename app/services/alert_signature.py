@@ -0,0 +1,375 @@
+"""
+アラートシグネチャ → 類似チケット検索結果の参照テーブル
+
+Zabbixのアラートの大半は、数百種類のトリガーが数千台のホストで繰り返し発生したもの。
+アラートを「トリガー（数値を除いたテンプレート）＋ホストの種類（番号を除いたホスト名）」の
+シグネチャに正規化し、シグネチャごとの検索結果を保存しておけば、
+既知のアラートは Embedding API・Qdrant・Redmine を呼ばずに即座に返せる。
+
+- 未知のシグネチャは通常どおり検索して結果を保存する
+- インデックスが更新されたら（差分同期・個別インデックス）、保存済みのシグネチャを
+  バックグラウンドで再計算する。再計算中は古い結果を返す
+- 再計算から ALERT_SIGNATURE_TTL_SECONDS 経過した結果も、返したうえで再計算する
+  （別プロセスでのBlue/Green切り替えなども、この間隔で反映される）
+- テーブルは ALERT_SIGNATURE_PATH（デフォルト: data/alert_signatures.json）に保存し、
+  再起動後も既知のシグネチャをすぐ返せるようにする。保存は変更から
+  ALERT_SIGNATURE_SAVE_DELAY_SECONDS 後にバックグラウンドでまとめて行う（検索ごとに書き出さない）
+"""
+
+import copy
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+
+# 再計算でまとめて検索するシグネチャ数（compute_batch がある場合）
+REFRESH_BATCH_SIZE = 64
+# 数値（小数・単位付き・パーセント）
+_NUMBER = re.compile(r"\d+(?:[.,]\d+)*")
+_SPACES = re.compile(r"\s+")
+
+
+def normalize_trigger(trigger_name: str) -> str:
+    """トリガー名から値を除いたテンプレート（"disk usage over 90% on /var" → "disk usage over #% on /var"）"""
+    text = _NUMBER.sub("#", trigger_name or "")
+    return _SPACES.sub(" ", text).strip().lower()
+
+
+def hostname_class(hostname: str) -> str:
+    """ホスト名から番号を除いた種類（"web-prod-01.example.com" → "web-prod-#"）"""
+    short = (hostname or "").split(".")[0].lower()
+    return _NUMBER.sub("#", short)
+
+
+def alert_signature(trigger_name: str, hostname: str, trigger_id: Optional[int] = None) -> str:
+    """
+    アラートのシグネチャ
+
+    トリガーIDがあればトリガー名のテンプレートと併用する（同じIDでも名前のマクロ展開で
+    別のアラートになることがあるため）。
+    """
+    trigger = normalize_trigger(trigger_name)
+    if trigger_id is not None:
+        trigger = f"{trigger_id}:{trigger}"
+    return f"{trigger}|{hostname_class(hostname)}"
+
+
+class SingleFlight:
+    """同じキーの処理が実行中なら、新たに実行せずその結果を待って共有する"""
+
+    class _Call:
+        def __init__(self):
+            self.done = threading.Event()
+            self.result: Any = None
+            self.error: Optional[BaseException] = None
+
+    def __init__(self):
+        self._calls: Dict[Hashable, "SingleFlight._Call"] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """
+        Args:
+            key: 処理を識別するキー
+            fn: 実行する処理
+
+        Returns:
+            (結果, 他の呼び出しの結果を共有したか)。処理が例外を送出した場合は待っていた全員に送出する
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = self._Call()
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result, False
+
+
+class AlertSignatureTable:
+    """シグネチャごとの検索結果を保持し、インデックス更新時に再計算する参照テーブル"""
+
+    def __init__(
+        self,
+        compute: Callable[[str], List[dict]],
+        compute_batch: Optional[Callable[[List[str]], List[List[dict]]]] = None,
+        path: Optional[str] = None,
+        ttl_seconds: Optional[float] = None,
+        max_entries: Optional[int] = None,
+        save_delay: Optional[float] = None
+    ):
+        """
+        Args:
+            compute: アラート文から検索結果を作る関数（未知のシグネチャ・再計算時に呼ぶ）
+            compute_batch: 複数のアラート文の検索結果をまとめて作る関数（lookup_many・再計算で使う）
+            path: テーブルの保存先（省略時は ALERT_SIGNATURE_PATH）
+            ttl_seconds: 結果を再計算するまでの秒数（省略時は ALERT_SIGNATURE_TTL_SECONDS、デフォルト: 3600）
+            max_entries: 保持するシグネチャ数の上限（省略時は ALERT_SIGNATURE_MAX_ENTRIES、デフォルト: 5000）
+            save_delay: 変更してから保存するまでの秒数（省略時は ALERT_SIGNATURE_SAVE_DELAY_SECONDS、デフォルト: 5）
+        """
+        self.compute = compute
+        self.compute_batch = compute_batch
+        self.path = path or os.getenv("ALERT_SIGNATURE_PATH", "data/alert_signatures.json")
+        self.ttl_seconds = ttl_seconds or float(os.getenv("ALERT_SIGNATURE_TTL_SECONDS", "3600"))
+        self.max_entries = max_entries or int(os.getenv("ALERT_SIGNATURE_MAX_ENTRIES", "5000"))
+        self.save_delay = save_delay if save_delay is not None else float(
+            os.getenv("ALERT_SIGNATURE_SAVE_DELAY_SECONDS", "5")
+        )
+
+        # signature -> {"alert_text", "results", "computed_at"}（最近使った順）
+        self._entries: "OrderedDict[str, dict]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._refresh_thread: Optional[threading.Thread] = None
+        self._refresh_requested = False
+        self._flight = SingleFlight()
+        # 未保存の変更があるか・保存待ちのスレッド（_lock で保護）
+        self._dirty = False
+        self._save_thread: Optional[threading.Thread] = None
+        # ファイルへの書き出しを1つずつにする
+        self._save_lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "coalesced": 0, "refreshes": 0}
+
+        self._load()
+
+    def lookup(self, signature: str, alert_text: str) -> Tuple[List[dict], str]:
+        """
+        シグネチャの検索結果を返す（未知なら検索して保存）
+
+        同じ未知のシグネチャが同時に届いた場合は、検索を1回だけ行って結果を共有する。
+
+        Args:
+            signature: alert_signature() の結果
+            alert_text: 未知のシグネチャの場合に検索するアラート文
+
+        Returns:
+            (検索結果, "hit": テーブルにあった / "miss": 検索した /
+             "coalesced": 同時に届いた同じシグネチャの検索結果を共有した)
+        """
+        with self._lock:
+            entry = self._entries.get(signature)
+            if entry is not None:
+                self._entries.move_to_end(signature)
+                self.stats["hits"] += 1
+                stale = time.time() - entry["computed_at"] > self.ttl_seconds
+        if entry is not None:
+            if stale:
+                self.schedule_refresh()
+            return copy.deepcopy(entry["results"]), "hit"
+
+        results, shared = self._flight.do(signature, lambda: self._compute_and_store(signature, alert_text))
+        # 共有した結果・テーブルに保存した結果を呼び出し元が書き換えても影響しないように複製して返す
+        if shared:
+            with self._lock:
+                self.stats["coalesced"] += 1
+            return copy.deepcopy(results), "coalesced"
+        return copy.deepcopy(results), "miss"
+
+    def lookup_many(self, items: List[Tuple[str, str]]) -> List[Tuple[List[dict], str]]:
+        """
+        複数のシグネチャの検索結果を返す（未知のシグネチャはまとめて1回で検索して保存）
+
+        同じ未知のシグネチャが複数含まれる場合は1回だけ検索する（2件目以降は "coalesced"）。
+        ほかのリクエストが同時に同じシグネチャを検索している場合の共有は行わない。
+
+        Args:
+            items: (シグネチャ, アラート文) のリスト
+
+        Returns:
+            items と同じ順の (検索結果, "hit" / "miss" / "coalesced")
+        """
+        found: Dict[str, List[dict]] = {}
+        stale = False
+        with self._lock:
+            for signature, _ in items:
+                entry = self._entries.get(signature)
+                if entry is not None and signature not in found:
+                    self._entries.move_to_end(signature)
+                    found[signature] = entry["results"]
+                    stale = stale or time.time() - entry["computed_at"] > self.ttl_seconds
+        if stale:
+            self.schedule_refresh()
+
+        # 未知のシグネチャ（重複を除き、最初に出てきたアラート文で検索）
+        missing: Dict[str, str] = {}
+        for signature, alert_text in items:
+            if signature not in found:
+                missing.setdefault(signature, alert_text)
+        if missing:
+            texts = list(missing.values())
+            computed = self.compute_batch(texts) if self.compute_batch else [self.compute(t) for t in texts]
+            for (signature, alert_text), results in zip(missing.items(), computed):
+                self._store(signature, alert_text, results)
+                found[signature] = results
+
+        outcomes = []
+        searched = set()
+        with self._lock:
+            for signature, _ in items:
+                if signature not in missing:
+                    status = "hit"
+                    self.stats["hits"] += 1
+                elif signature in searched:
+                    status = "coalesced"
+                    self.stats["coalesced"] += 1
+                else:
+                    status = "miss"
+                    searched.add(signature)
+                outcomes.append((copy.deepcopy(found[signature]), status))
+        return outcomes
+
+    def _compute_and_store(self, signature: str, alert_text: str) -> List[dict]:
+        results = self.compute(alert_text)
+        self._store(signature, alert_text, results)
+        return results
+
+    def _store(self, signature: str, alert_text: str, results: List[dict]):
+        with self._lock:
+            self.stats["misses"] += 1
+            self._entries[signature] = {
+                "alert_text": alert_text, "results": copy.deepcopy(results), "computed_at": time.time()
+            }
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        self._mark_dirty()
+
+    def schedule_refresh(self):
+        """保存済みのシグネチャをバックグラウンドで再計算（実行中なら終わったあとにもう一度）"""
+        with self._lock:
+            self._refresh_requested = True
+            if self._refresh_thread and self._refresh_thread.is_alive():
+                return
+            self._refresh_thread = threading.Thread(target=self._refresh_loop, name="alert-signature-refresh", daemon=True)
+            self._refresh_thread.start()
+
+    def _refresh_loop(self):
+        while True:
+            with self._lock:
+                if not self._refresh_requested:
+                    return
+                self._refresh_requested = False
+                targets = [(signature, entry["alert_text"]) for signature, entry in self._entries.items()]
+
+            started = time.time()
+            refreshed = 0
+            for computed in self._compute_targets(targets):
+                with self._lock:
+                    for signature, results in computed:
+                        if signature in self._entries:
+                            self._entries[signature].update(results=results, computed_at=time.time())
+                            refreshed += 1
+
+            with self._lock:
+                self.stats["refreshes"] += 1
+            self._mark_dirty()
+            print(f"✓ Alert signature table refreshed: {refreshed} signatures ({time.time() - started:.1f}s)")
+
+    def _compute_targets(self, targets: List[Tuple[str, str]]):
+        """再計算の対象を検索し、(シグネチャ, 検索結果) のリストを少しずつ返す（失敗したものは飛ばす）"""
+        if self.compute_batch:
+            for start in range(0, len(targets), REFRESH_BATCH_SIZE):
+                chunk = targets[start:start + REFRESH_BATCH_SIZE]
+                try:
+                    results = self.compute_batch([alert_text for _, alert_text in chunk])
+                except Exception as e:
+                    print(f"⚠️  Alert signature refresh failed for {len(chunk)} signatures: {e}")
+                    continue
+                yield [(signature, r) for (signature, _), r in zip(chunk, results)]
+            return
+
+        for signature, alert_text in targets:
+            try:
+                results = self.compute(alert_text)
+            except Exception as e:
+                print(f"⚠️  Alert signature refresh failed for '{signature}': {e}")
+                continue
+            yield [(signature, results)]
+
+    def status(self) -> Dict:
+        """テーブルの件数とヒット率"""
+        with self._lock:
+            lookups = self.stats["hits"] + self.stats["misses"]
+            return {
+                "signatures": len(self._entries),
+                **self.stats,
+                "hit_rate": self.stats["hits"] / lookups if lookups else None,
+                "refreshing": bool(self._refresh_thread and self._refresh_thread.is_alive())
+            }
+
+    def _load(self):
+        """保存済みのテーブルを読み込む（読み込んだ結果は古い可能性があるので次の参照で再計算される）"""
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                entries = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"⚠️  Could not load alert signature table {self.path}: {e}")
+            return
+        for signature, entry in entries.items():
+            self._entries[signature] = {**entry, "computed_at": 0}
+
+    def _mark_dirty(self):
+        """変更を記録し、save_delay 秒後にバックグラウンドで保存する（待機中の変更はまとめて1回で保存）"""
+        with self._lock:
+            self._dirty = True
+            if self._save_thread is not None:
+                return
+            self._save_thread = threading.Thread(target=self._save_loop, name="alert-signature-save", daemon=True)
+            self._save_thread.start()
+
+    def _save_loop(self):
+        while True:
+            time.sleep(self.save_delay)
+            with self._lock:
+                if not self._dirty:
+                    self._save_thread = None
+                    return
+            self.save()
+
+    def save(self):
+        """未保存の変更があればテーブルを保存（一時ファイルに書いてから置き換え。終了時にも呼ぶ）"""
+        with self._save_lock:
+            with self._lock:
+                if not self._dirty:
+                    return
+                self._dirty = False
+                entries = {signature: dict(entry) for signature, entry in self._entries.items()}
+            tmp_path = None
+            try:
+                directory = os.path.dirname(self.path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                # 保存のたびに別の一時ファイルを使い、同時に書いた内容が混ざらないようにする
+                with tempfile.NamedTemporaryFile(
+                    "w", encoding="utf-8", dir=directory or ".", prefix=".alert_signatures.", suffix=".tmp",
+                    delete=False
+                ) as f:
+                    tmp_path = f.name
+                    json.dump(entries, f, ensure_ascii=False, default=str)
+                os.replace(tmp_path, self.path)
+            except (OSError, TypeError, ValueError) as e:
+                print(f"⚠️  Could not save alert signature table {self.path}: {e}")
+                if tmp_path and os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                # 次の保存で再試行する
+                with self._lock:
+                    self._dirty = True
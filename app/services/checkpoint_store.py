@@ -0,0 +1,178 @@
+"""
+インデックス処理のチェックポイント
+
+長時間のインデックス処理が中断・異常終了しても途中から再開できるように、
+進捗をローカルのSQLiteファイルに永続化する。
+
+保存する情報:
+    - meta: 完了済みページの次のオフセット（再開位置）など
+    - tickets: チケットごとの処理状態（done / skipped / failed）、
+               ベクトル化したテキストのハッシュ、失敗時のエラー内容
+
+failed のチケットはデッドレターとして残り、--retry-failed で再処理できる。
+"""
+
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+STATUS_DONE = "done"
+STATUS_SKIPPED = "skipped"
+STATUS_FAILED = "failed"
+
+
+class CheckpointStore:
+    """SQLiteベースのチェックポイントストア（スレッドセーフ）"""
+
+    def __init__(self, path: str):
+        """
+        Args:
+            path: SQLiteファイルのパス（ディレクトリがなければ作成）
+        """
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS meta (
+                key TEXT PRIMARY KEY,
+                value TEXT
+            );
+            CREATE TABLE IF NOT EXISTS tickets (
+                ticket_id INTEGER PRIMARY KEY,
+                status TEXT NOT NULL,
+                content_hash TEXT,
+                error TEXT,
+                updated_at TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_tickets_status ON tickets(status);
+        """)
+        self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def reset(self):
+        """すべての進捗を削除（最初からやり直す場合）"""
+        with self._lock:
+            self._conn.execute("DELETE FROM meta")
+            self._conn.execute("DELETE FROM tickets")
+            self._conn.commit()
+
+    def start_new_run(self):
+        """
+        進捗（再開位置とチケットの状態）だけをクリアして新しい実行を始める
+
+        build_collection などの設定系のメタ情報は残す。
+        """
+        with self._lock:
+            self._conn.execute("DELETE FROM meta WHERE key IN ('next_offset', 'completed_at')")
+            self._conn.execute("DELETE FROM tickets")
+            self._conn.commit()
+
+    # ------------------------------------------------------------------
+    # 再開位置
+    # ------------------------------------------------------------------
+
+    def get_meta(self, key: str, default: Optional[str] = None) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def set_meta(self, key: str, value: str):
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO meta (key, value) VALUES (?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+                (key, value)
+            )
+            self._conn.commit()
+
+    def get_offset(self) -> int:
+        """再開位置（ここまでのページはすべて処理済み）"""
+        return int(self.get_meta("next_offset", "0"))
+
+    def set_offset(self, offset: int):
+        self.set_meta("next_offset", str(offset))
+
+    # ------------------------------------------------------------------
+    # チケット単位の状態
+    # ------------------------------------------------------------------
+
+    def mark_many(self, records: Iterable[Tuple[int, str, Optional[str], Optional[str]]]):
+        """
+        複数チケットの状態をまとめて記録
+
+        Args:
+            records: (ticket_id, status, content_hash, error) のイテラブル
+        """
+        now = datetime.now().isoformat()
+        rows = [(tid, status, content_hash, error, now) for tid, status, content_hash, error in records]
+        if not rows:
+            return
+        with self._lock:
+            self._conn.executemany(
+                "INSERT INTO tickets (ticket_id, status, content_hash, error, updated_at) "
+                "VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(ticket_id) DO UPDATE SET "
+                "status = excluded.status, "
+                "content_hash = COALESCE(excluded.content_hash, tickets.content_hash), "
+                "error = excluded.error, "
+                "updated_at = excluded.updated_at",
+                rows
+            )
+            self._conn.commit()
+
+    def mark(self, ticket_id: int, status: str, content_hash: Optional[str] = None, error: Optional[str] = None):
+        self.mark_many([(ticket_id, status, content_hash, error)])
+
+    def get_statuses(self, ticket_ids: List[int]) -> Dict[int, str]:
+        """指定チケットの状態を一括取得（未記録のチケットは含まれない）"""
+        if not ticket_ids:
+            return {}
+        placeholders = ",".join("?" for _ in ticket_ids)
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT ticket_id, status FROM tickets WHERE ticket_id IN ({placeholders})",
+                list(ticket_ids)
+            ).fetchall()
+        return {tid: status for tid, status in rows}
+
+    def get_content_hashes(self, ticket_ids: List[int]) -> Dict[int, str]:
+        """指定チケットの前回インデックス時のテキストハッシュを一括取得"""
+        if not ticket_ids:
+            return {}
+        placeholders = ",".join("?" for _ in ticket_ids)
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT ticket_id, content_hash FROM tickets "
+                f"WHERE ticket_id IN ({placeholders}) AND content_hash IS NOT NULL",
+                list(ticket_ids)
+            ).fetchall()
+        return {tid: content_hash for tid, content_hash in rows}
+
+    def failed_ticket_ids(self) -> List[int]:
+        """デッドレター（失敗したチケット）のID一覧"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT ticket_id FROM tickets WHERE status = ? ORDER BY ticket_id",
+                (STATUS_FAILED,)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def summary(self) -> Dict[str, int]:
+        """状態ごとの件数"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT status, COUNT(*) FROM tickets GROUP BY status"
+            ).fetchall()
+        return {status: count for status, count in rows}
@@ -0,0 +1,461 @@
+"""
+コレクションのバージョン管理（Blue/Green再インデックス）
+
+検索は QDRANT_COLLECTION_NAME のエイリアスを通して行い、実体は
+「{エイリアス名}_v{日時}」のバージョン付きコレクションに置く。
+
+再インデックスの流れ:
+    1. 新しいバージョンのコレクションを作成してインデックス（検索は旧バージョンのまま）
+    2. 件数とサンプル検索の再現率を旧バージョンと比較して検証
+    3. エイリアスをアトミックに切り替え（検索が混在・空になる瞬間がない）
+    4. 旧バージョンは残しておき、rollback で即座に戻せる
+
+スナップショット（create_snapshot / recover_snapshot）で復元したコレクションも、
+新しいバージョンとして同じ検証・切り替えの流れに乗せる。
+"""
+
+import os
+import random
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import httpx
+from qdrant_client.models import (
+    CreateAlias,
+    CreateAliasOperation,
+    DeleteAlias,
+    DeleteAliasOperation,
+    PointStruct,
+)
+
+from app.services.qdrant_connection import is_embedded
+from app.services.vector_service import VectorService, VECTOR_BODY
+
+
+class CollectionManager:
+    """エイリアスとバージョン付きコレクションの管理"""
+
+    def __init__(self, vector_service: VectorService, alias_name: Optional[str] = None):
+        """
+        Args:
+            vector_service: VectorService（Qdrantクライアント・Embedding設定を共有）
+            alias_name: 管理するエイリアス名（省略時は vector_service.collection_name）
+        """
+        self.vector_service = vector_service
+        self.qdrant = vector_service.qdrant
+        self.alias_name = alias_name or vector_service.collection_name
+
+    # ------------------------------------------------------------------
+    # 状態の参照
+    # ------------------------------------------------------------------
+
+    def current_collection(self) -> Optional[str]:
+        """エイリアスが現在指しているコレクション"""
+        return self.vector_service.resolve_alias(self.alias_name)
+
+    def is_legacy(self) -> bool:
+        """エイリアス名と同名の実体コレクションがある（エイリアス導入前の構成）"""
+        return self.vector_service.collection_exists(self.alias_name)
+
+    def list_versions(self) -> List[str]:
+        """バージョン付きコレクションを古い順に列挙"""
+        prefix = f"{self.alias_name}_v"
+        names = [c.name for c in self.qdrant.get_collections().collections]
+        return sorted(name for name in names if name.startswith(prefix))
+
+    def status(self) -> Dict:
+        """エイリアスと各バージョンの状態"""
+        current = self.current_collection()
+        versions = []
+        for name in self.list_versions():
+            info = self.qdrant.get_collection(name)
+            versions.append({
+                "name": name,
+                "points_count": info.points_count,
+                "status": str(info.status),
+                "current": name == current,
+            })
+        return {
+            "alias": self.alias_name,
+            "current": current,
+            "legacy_collection": self.is_legacy(),
+            "versions": versions,
+        }
+
+    # ------------------------------------------------------------------
+    # 新バージョンの作成・検証・切り替え
+    # ------------------------------------------------------------------
+
+    def new_version_name(self) -> str:
+        return f"{self.alias_name}_v{datetime.now().strftime('%Y%m%d%H%M%S')}"
+
+    def create_version(self, name: Optional[str] = None, named: Optional[bool] = None) -> str:
+        """
+        新しいバージョンのコレクションを作成
+
+        Args:
+            name: コレクション名（省略時は日時から生成）
+            named: ベクトル構成（省略時は QDRANT_VECTOR_LAYOUT）
+        """
+        name = name or self.new_version_name()
+        self.vector_service.create_collection(name, named=named)
+        return name
+
+    def resume_or_create_build(self, checkpoint=None) -> str:
+        """
+        Blue/Green再インデックスの書き込み先を用意
+
+        チェックポイントに作成途中のバージョンが記録されていればそれを再利用し
+        （中断からの再開）、なければ新しいバージョンを作成する。
+
+        Args:
+            checkpoint: CheckpointStore（Noneの場合は常に新規作成）
+
+        Returns:
+            書き込み先のコレクション名
+        """
+        name = checkpoint.get_meta("build_collection") if checkpoint is not None else None
+        if name and name != self.current_collection() and self.vector_service.collection_exists(name):
+            print(f"  ↻ 作成途中のバージョンを再利用: {name}")
+            return name
+
+        name = self.create_version()
+        if checkpoint is not None:
+            # 別コレクション向けの進捗は使えないので破棄する
+            checkpoint.start_new_run()
+            checkpoint.set_meta("build_collection", name)
+        return name
+
+    def finish_build(self, build_collection: str, checkpoint=None, force: bool = False, **validate_options) -> Dict:
+        """
+        作成したバージョンを検証し、問題なければエイリアスを切り替え
+
+        Args:
+            build_collection: 作成したバージョン
+            checkpoint: CheckpointStore（切り替え後に作成途中の記録を消す）
+            force: 検証に失敗しても切り替える
+            **validate_options: validate() に渡すオプション
+
+        Returns:
+            validate() の結果に "swapped" を加えたもの
+        """
+        report = self.validate(build_collection, **validate_options)
+        report["swapped"] = False
+
+        if report["ok"] or force:
+            self.swap(build_collection, drop_legacy=False)
+            report["swapped"] = True
+            if checkpoint is not None:
+                checkpoint.set_meta("build_collection", "")
+
+        return report
+
+    def validate(
+        self,
+        new_collection: str,
+        sample_size: int = 20,
+        top_k: int = 10,
+        min_count_ratio: float = 0.95,
+        min_recall: float = 0.7
+    ) -> Dict:
+        """
+        新バージョンを現行バージョンと比較して検証
+
+        - 件数: 新バージョンのポイント数が現行の min_count_ratio 以上か
+          （チャンク数の変化でポイント数が増えるのは問題なし）
+        - 再現率: 現行からサンプルしたチケットの件名で両方を検索し、
+          上位 top_k の重なり（次元数が異なる場合は自分自身がヒットする割合）が min_recall 以上か
+
+        Returns:
+            {"ok": bool, "old_count", "new_count", "count_ratio", "recall", "reasons": [...]}
+        """
+        old_collection = self.current_collection() or (self.alias_name if self.is_legacy() else None)
+        new_count = self.qdrant.count(new_collection, exact=True).count
+        report = {
+            "old_collection": old_collection,
+            "new_collection": new_collection,
+            "new_count": new_count,
+            "old_count": None,
+            "count_ratio": None,
+            "recall": None,
+            "reasons": [],
+        }
+
+        if new_count == 0:
+            report["reasons"].append("新バージョンが空です")
+
+        if old_collection is None:
+            # 初回（比較対象なし）は件数のみ確認
+            report["ok"] = not report["reasons"]
+            return report
+
+        old_count = self.qdrant.count(old_collection, exact=True).count
+        report["old_count"] = old_count
+        if old_count:
+            report["count_ratio"] = new_count / old_count
+            if report["count_ratio"] < min_count_ratio:
+                report["reasons"].append(
+                    f"件数が減っています（{old_count} → {new_count}、許容 {min_count_ratio:.0%}）"
+                )
+
+        recall = self._sample_recall(old_collection, new_collection, sample_size, top_k)
+        report["recall"] = recall
+        if recall is not None and recall < min_recall:
+            report["reasons"].append(f"サンプル再現率が低すぎます（{recall:.2f} < {min_recall:.2f}）")
+
+        report["ok"] = not report["reasons"]
+        return report
+
+    def _sample_recall(self, old_collection: str, new_collection: str, sample_size: int, top_k: int) -> Optional[float]:
+        """現行コレクションからサンプルした件名で検索結果の一致度を測る"""
+        records, _ = self.qdrant.scroll(
+            collection_name=old_collection,
+            limit=max(sample_size * 5, 100),
+            with_payload=["ticket_id", "subject"],
+            with_vectors=False
+        )
+        samples = [r for r in records if (r.payload or {}).get("subject")]
+        if not samples:
+            return None
+        samples = random.sample(samples, min(sample_size, len(samples)))
+
+        old_dims = self._vector_size(old_collection)
+        same_space = old_dims == self.vector_service.vector_size
+
+        queries = self.vector_service.embed_texts([r.payload["subject"] for r in samples])
+        scores = []
+        for record, query_vector in zip(samples, queries):
+            # チャンク化したコレクションでも比較できるようチケット単位で検索する
+            new_hits = self.vector_service.search_ticket_groups(
+                query_vector,
+                limit=top_k,
+                collection_name=new_collection,
+                with_payload=["ticket_id"]
+            )
+            new_ids = {hit.payload.get("ticket_id") for hit in new_hits}
+
+            if same_space:
+                old_hits = self.vector_service.search_ticket_groups(
+                    query_vector,
+                    limit=top_k,
+                    collection_name=old_collection,
+                    with_payload=["ticket_id"]
+                )
+                old_ids = {hit.payload.get("ticket_id") for hit in old_hits}
+                if old_ids:
+                    scores.append(len(old_ids & new_ids) / len(old_ids))
+            else:
+                # Embeddingモデル・次元数が変わった場合は旧コレクションを同じベクトルで検索できない
+                scores.append(1.0 if record.payload.get("ticket_id") in new_ids else 0.0)
+
+        return sum(scores) / len(scores) if scores else None
+
+    def _vector_size(self, collection_name: str) -> Optional[int]:
+        vectors = self.qdrant.get_collection(collection_name).config.params.vectors
+        if isinstance(vectors, dict):
+            # 名前付きベクトル構成は本文ベクトルの次元数で比較する
+            vectors = vectors.get(VECTOR_BODY)
+        return getattr(vectors, "size", None)
+
+    def swap(self, new_collection: str, drop_legacy: bool = False):
+        """
+        エイリアスを新バージョンにアトミックに切り替え
+
+        Args:
+            new_collection: 切り替え先のコレクション
+            drop_legacy: エイリアス名と同名の実体コレクション（エイリアス導入前の構成）がある場合に削除するか
+        """
+        if self.is_legacy():
+            if not drop_legacy:
+                raise RuntimeError(
+                    f"'{self.alias_name}' is a real collection, not an alias. "
+                    "Run `python scripts/manage_collections.py migrate` first."
+                )
+            # 同名のエイリアスは作れないため旧コレクションを削除する（直後にエイリアスを作成）
+            self.qdrant.delete_collection(self.alias_name)
+
+        operations = []
+        if self.current_collection():
+            operations.append(DeleteAliasOperation(delete_alias=DeleteAlias(alias_name=self.alias_name)))
+        operations.append(CreateAliasOperation(create_alias=CreateAlias(
+            collection_name=new_collection,
+            alias_name=self.alias_name
+        )))
+
+        # 削除と作成を1リクエストで送ることで、エイリアスが存在しない瞬間をなくす
+        self.qdrant.update_collection_aliases(change_aliases_operations=operations)
+        print(f"Alias '{self.alias_name}' -> '{new_collection}'")
+
+    def rollback(self) -> str:
+        """
+        エイリアスを1つ前のバージョンに戻す
+
+        Returns:
+            切り替え先のコレクション名
+        """
+        current = self.current_collection()
+        versions = self.list_versions()
+        if current not in versions:
+            raise RuntimeError(f"Alias '{self.alias_name}' does not point to a managed version")
+
+        index = versions.index(current)
+        if index == 0:
+            raise RuntimeError("No previous version to roll back to")
+
+        previous = versions[index - 1]
+        self.swap(previous)
+        return previous
+
+    def prune(self, keep: int = 2) -> List[str]:
+        """
+        古いバージョンを削除（現行バージョンと、それより新しいものは常に残す）
+
+        Args:
+            keep: 現行を含めて残すバージョン数
+
+        Returns:
+            削除したコレクション名
+        """
+        current = self.current_collection()
+        versions = self.list_versions()
+        if current not in versions:
+            return []
+
+        index = versions.index(current)
+        keep_from = max(0, index - max(keep, 1) + 1)
+        removed = versions[:keep_from]
+        for name in removed:
+            self.qdrant.delete_collection(name)
+            print(f"Deleted old version: {name}")
+        return removed
+
+    def migrate_legacy(self) -> str:
+        """
+        エイリアス導入前の実体コレクションをバージョン付きコレクションにコピーし、エイリアスに切り替え
+
+        ベクトルもそのままコピーするのでEmbeddingのコストはかからない。
+        同名のエイリアスは作れないため、切り替え時に旧コレクションを削除してからエイリアスを作る。
+        その間の検索は失敗し、コピー開始後の書き込みは移行先に入らないので、
+        APIサーバー・差分同期・インデックス処理を止めてから実行すること。
+
+        Returns:
+            作成したバージョン名
+        """
+        if not self.is_legacy():
+            raise RuntimeError(f"'{self.alias_name}' is not a legacy collection")
+
+        # ベクトルをそのままコピーするので、ベクトル構成は移行元に合わせる
+        version = self.create_version(named=self.vector_service.is_named_layout(self.alias_name))
+        copied = 0
+        offset = None
+        with self.vector_service.point_writer(collection_name=version) as writer:
+            while True:
+                records, offset = self.qdrant.scroll(
+                    collection_name=self.alias_name,
+                    limit=256,
+                    offset=offset,
+                    with_payload=True,
+                    with_vectors=True
+                )
+                for record in records:
+                    writer.add(PointStruct(id=record.id, vector=record.vector, payload=record.payload))
+                copied += len(records)
+                if offset is None:
+                    break
+
+        source_count = self.qdrant.count(self.alias_name, exact=True).count
+        target_count = self.qdrant.count(version, exact=True).count
+        if source_count != target_count:
+            raise RuntimeError(f"Copy incomplete: {source_count} -> {target_count} points")
+
+        print(f"Copied {copied} points to '{version}'")
+        self.swap(version, drop_legacy=True)
+        return version
+
+    # ------------------------------------------------------------------
+    # スナップショット（Qdrantのネイティブ形式でのバックアップ・復元）
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _require_server():
+        if is_embedded():
+            raise RuntimeError("Snapshots require a Qdrant server (QDRANT_MODE=server)")
+
+    def _qdrant_url(self) -> str:
+        self._require_server()
+        return os.getenv("QDRANT_URL", "http://localhost:6333").rstrip("/")
+
+    def create_snapshot(self, collection_name: Optional[str] = None) -> str:
+        """
+        コレクションのスナップショットをQdrantサーバー上に作成
+
+        Args:
+            collection_name: 対象コレクション（省略時はエイリアスの指す現行バージョン）
+
+        Returns:
+            スナップショット名
+        """
+        name = collection_name or self.current_collection() or self.alias_name
+        self._require_server()
+        snapshot = self.qdrant.create_snapshot(collection_name=name, wait=True)
+        return snapshot.name
+
+    def list_snapshots(self, collection_name: Optional[str] = None) -> List[Dict]:
+        """コレクションのスナップショットを作成日時の順に列挙"""
+        name = collection_name or self.current_collection() or self.alias_name
+        self._require_server()
+        snapshots = self.qdrant.list_snapshots(collection_name=name)
+        return sorted(
+            ({"name": s.name, "size": s.size, "created_at": s.creation_time} for s in snapshots),
+            key=lambda s: s["created_at"] or ""
+        )
+
+    def download_snapshot(self, snapshot_name: str, path: str, collection_name: Optional[str] = None) -> int:
+        """
+        スナップショットをローカルファイルにダウンロード（ストリーミング）
+
+        Returns:
+            ダウンロードしたバイト数
+        """
+        name = collection_name or self.current_collection() or self.alias_name
+        url = f"{self._qdrant_url()}/collections/{name}/snapshots/{snapshot_name}"
+        size = 0
+        with httpx.stream("GET", url, timeout=None) as response, open(path, "wb") as f:
+            response.raise_for_status()
+            for chunk in response.iter_bytes(chunk_size=1024 * 1024):
+                f.write(chunk)
+                size += len(chunk)
+        return size
+
+    def recover_snapshot(self, location: str, collection_name: Optional[str] = None) -> str:
+        """
+        スナップショットから新しいバージョンのコレクションを復元
+
+        エイリアスは切り替えない（finish_build() で検証してから切り替える）。
+
+        Args:
+            location: スナップショットのURL（http(s)://、file://）またはローカルファイルのパス
+                      （ローカルファイルはQdrantサーバーにアップロードする）
+            collection_name: 復元先のコレクション（省略時は日時から生成）
+
+        Returns:
+            復元先のコレクション名
+        """
+        name = collection_name or self.new_version_name()
+        if self.vector_service.collection_exists(name):
+            raise ValueError(f"Collection already exists: {name}")
+
+        url = f"{self._qdrant_url()}/collections/{name}/snapshots/upload"
+        if location.startswith(("http://", "https://", "file://")):
+            self.qdrant.recover_snapshot(collection_name=name, location=location, wait=True)
+            return name
+
+        with open(location, "rb") as f:
+            response = httpx.post(
+                url,
+                params={"priority": "snapshot", "wait": "true"},
+                files={"snapshot": (os.path.basename(location), f)},
+                timeout=None
+            )
+        response.raise_for_status()
+        return name
@@ -0,0 +1,154 @@
+"""
+チケット本文のローカルドキュメントストア（SQLite + 圧縮）
+
+説明・解決策・コメント全文・チャンク本文をQdrantのペイロードに持たせると、
+コレクションのメモリ使用量とスナップショットが大きくなり、検索の応答も重くなる。
+DOC_STORE_ENABLED=true の場合はこれらをチケットIDをキーにしたSQLiteファイルに
+圧縮して保存し、Qdrantにはフィルタ・表示に使う小さな項目だけを残す。
+
+保存するドキュメント:
+    {"content_hash": ポイントと同じテキストハッシュ, "description": 説明, "resolution": 解決策,
+     "comments": コメント全文のリスト, "chunks": チャンク本文のリスト（chunk_index の順）}
+
+ストアはコレクションのバージョン（Blue/Green）間で共有する。検索結果の補完では、
+ヒットしたポイントと content_hash が一致する本文だけを使う（VectorService.hydrate_results()）。
+
+圧縮は zstandard がインストールされていれば zstd、なければ zlib を使う
+（行ごとに圧縮形式を記録するので、あとから zstandard を入れても読める）。
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import zlib
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+try:
+    import zstandard
+except ImportError:  # オプション依存（なければ zlib で圧縮）
+    zstandard = None
+
+
+# SQLiteの1文で指定できるパラメータ数の上限に収まるよう分割する
+_SQL_BATCH = 500
+
+# Qdrantのペイロードから外してドキュメントストアに移す項目
+BULKY_FIELDS = ["description", "resolution", "comments", "chunk_text"]
+
+
+class DocumentStore:
+    """チケットIDをキーにした圧縮ドキュメントのストア"""
+
+    def __init__(self, path: Optional[str] = None, level: Optional[int] = None):
+        """
+        Args:
+            path: SQLiteファイルのパス（省略時は DOC_STORE_PATH、デフォルト: data/documents.sqlite3）
+            level: 圧縮レベル（省略時は DOC_STORE_COMPRESSION_LEVEL、デフォルト: 3）
+        """
+        self.path = path or os.getenv("DOC_STORE_PATH", "data/documents.sqlite3")
+        self.level = level or int(os.getenv("DOC_STORE_COMPRESSION_LEVEL", "3"))
+        self.codec = "zstd" if zstandard is not None else "zlib"
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        # インデックス処理のスレッドからも使うので、1つの接続をロックで守る
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS documents ("
+            " ticket_id INTEGER PRIMARY KEY,"
+            " codec TEXT NOT NULL,"
+            " raw_size INTEGER NOT NULL,"
+            " body BLOB NOT NULL,"
+            " updated_at TEXT NOT NULL)"
+        )
+        self._conn.commit()
+
+        if zstandard is not None:
+            self._compressor = zstandard.ZstdCompressor(level=self.level)
+            self._decompressor = zstandard.ZstdDecompressor()
+
+    def _encode(self, document: dict) -> tuple:
+        raw = json.dumps(document, ensure_ascii=False, default=str).encode("utf-8")
+        if self.codec == "zstd":
+            return raw, self._compressor.compress(raw)
+        return raw, zlib.compress(raw, min(self.level, 9))
+
+    def _decode(self, codec: str, body: bytes) -> dict:
+        if codec == "zstd":
+            if zstandard is None:
+                raise RuntimeError("zstandard is required to read zstd-compressed documents")
+            raw = self._decompressor.decompress(body)
+        else:
+            raw = zlib.decompress(body)
+        return json.loads(raw)
+
+    def put_many(self, documents: Dict[int, dict]):
+        """ドキュメントをまとめて保存（同じチケットIDは置き換え）"""
+        if not documents:
+            return
+        now = datetime.now().isoformat()
+        rows = []
+        for ticket_id, document in documents.items():
+            raw, body = self._encode(document)
+            rows.append((int(ticket_id), self.codec, len(raw), body, now))
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO documents (ticket_id, codec, raw_size, body, updated_at) VALUES (?, ?, ?, ?, ?)",
+                rows
+            )
+            self._conn.commit()
+
+    def get_many(self, ticket_ids: Iterable[int]) -> Dict[int, dict]:
+        """ドキュメントをまとめて取得（ないチケットは含まない）"""
+        ids = sorted({int(t) for t in ticket_ids if t is not None})
+        rows = []
+        with self._lock:
+            for start in range(0, len(ids), _SQL_BATCH):
+                batch = ids[start:start + _SQL_BATCH]
+                rows.extend(self._conn.execute(
+                    f"SELECT ticket_id, codec, body FROM documents WHERE ticket_id IN ({','.join('?' * len(batch))})",
+                    batch
+                ).fetchall())
+        return {ticket_id: self._decode(codec, body) for ticket_id, codec, body in rows}
+
+    def delete_many(self, ticket_ids: List[int]):
+        """ドキュメントを削除"""
+        ids = [int(t) for t in ticket_ids]
+        with self._lock:
+            for start in range(0, len(ids), _SQL_BATCH):
+                batch = ids[start:start + _SQL_BATCH]
+                self._conn.execute(
+                    f"DELETE FROM documents WHERE ticket_id IN ({','.join('?' * len(batch))})",
+                    batch
+                )
+            self._conn.commit()
+
+    def status(self) -> Dict:
+        """件数・圧縮前後のサイズ・ファイルサイズ"""
+        with self._lock:
+            count, raw_size, stored_size = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(raw_size), 0), COALESCE(SUM(LENGTH(body)), 0) FROM documents"
+            ).fetchone()
+        file_size = sum(
+            os.path.getsize(p) for p in (self.path, f"{self.path}-wal") if os.path.exists(p)
+        )
+        return {
+            "path": self.path,
+            "codec": self.codec,
+            "documents": count,
+            "raw_bytes": raw_size,
+            "compressed_bytes": stored_size,
+            "compression_ratio": raw_size / stored_size if stored_size else None,
+            "file_bytes": file_size
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
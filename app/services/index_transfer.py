@@ -0,0 +1,199 @@
+"""
+インデックスのエクスポート・インポート（再ベクトル化なし）
+
+コレクションのポイント（ベクトル・ペイロード）をscrollでページごとに読み出し、
+gzip圧縮したNDJSONファイルに書き出す。インポートは新しいコレクションを同じベクトル構成で作成し、
+バッファ付きライターでまとめてupsertする。Embedding APIを呼ばないので、
+新しい環境の初期データ投入やバックアップからの復元を数分で行える。
+
+ファイル形式（1行1JSON）:
+    1行目   ヘッダ {"format", "version", "collection", "named", "sparse", "vector_size",
+                   "embedding_model", "points", "byteorder", "documents", "exported_at"}
+    2行目〜 ポイント {"id", "vector", "payload"[, "document"]}
+            密ベクトルは float32 のバイト列を base64 で、スパースベクトルは {"indices", "values"} で表す。
+            ドキュメントストアが有効な場合は、先頭チャンクに本文（document）を付ける
+    最終行  {"type": "end", "points": 書き出した件数}（途中で切れたファイルの検出用）
+"""
+
+import array
+import base64
+import gzip
+import json
+import sys
+from datetime import datetime
+from typing import Callable, Dict, Optional
+
+from qdrant_client.models import PointStruct, SparseVector
+
+
+EXPORT_FORMAT = "mindaigis-index"
+EXPORT_VERSION = 1
+
+
+def encode_vector(vector):
+    """ベクトルをJSONで書ける形に変換（名前付きベクトルは名前ごと）"""
+    if isinstance(vector, dict):
+        return {name: encode_vector(v) for name, v in vector.items()}
+    if hasattr(vector, "indices"):
+        return {"indices": list(vector.indices), "values": list(vector.values)}
+    return base64.b64encode(array.array("f", vector).tobytes()).decode("ascii")
+
+
+def decode_vector(value, byteorder: str = sys.byteorder):
+    """encode_vector() の逆変換"""
+    if isinstance(value, str):
+        floats = array.array("f")
+        floats.frombytes(base64.b64decode(value))
+        if byteorder != sys.byteorder:
+            floats.byteswap()
+        return floats.tolist()
+    if isinstance(value.get("indices"), list) and isinstance(value.get("values"), list):
+        return SparseVector(indices=value["indices"], values=value["values"])
+    return {name: decode_vector(v, byteorder) for name, v in value.items()}
+
+
+def export_collection(
+    vector_service,
+    path: str,
+    collection_name: Optional[str] = None,
+    batch_size: int = 256,
+    on_progress: Optional[Callable[[int, int], None]] = None
+) -> Dict:
+    """
+    コレクションをファイルに書き出す
+
+    Args:
+        vector_service: VectorService
+        path: 出力ファイル（.ndjson.gz）
+        collection_name: 対象コレクション（省略時は vector_service.collection_name、エイリアスは実体を書き出す）
+        batch_size: 1回のscrollで読むポイント数
+        on_progress: (書き出した件数, 全件数) を受け取るコールバック
+
+    Returns:
+        ヘッダと書き出した件数
+    """
+    name = collection_name or vector_service.collection_name
+    name = vector_service.resolve_alias(name) or name
+    qdrant = vector_service.qdrant
+    total = qdrant.count(collection_name=name, exact=True).count
+    doc_store = vector_service.doc_store
+
+    header = {
+        "format": EXPORT_FORMAT,
+        "version": EXPORT_VERSION,
+        "collection": name,
+        "named": vector_service.is_named_layout(name),
+        "sparse": vector_service.has_sparse_vectors(name),
+        "vector_size": vector_service.vector_size,
+        "embedding_model": vector_service.embedding_model,
+        "points": total,
+        "byteorder": sys.byteorder,
+        "documents": doc_store is not None,
+        "exported_at": datetime.now().isoformat()
+    }
+
+    written = 0
+    offset = None
+    with gzip.open(path, "wt", encoding="utf-8") as f:
+        f.write(json.dumps(header, ensure_ascii=False) + "\n")
+        while True:
+            records, offset = qdrant.scroll(
+                collection_name=name,
+                limit=batch_size,
+                offset=offset,
+                with_payload=True,
+                with_vectors=True
+            )
+            documents = {}
+            if doc_store is not None:
+                parents = [r.payload.get("ticket_id") for r in records if not (r.payload or {}).get("chunk_index")]
+                documents = doc_store.get_many(parents)
+
+            for record in records:
+                line = {"id": record.id, "vector": encode_vector(record.vector), "payload": record.payload}
+                payload = record.payload or {}
+                if not payload.get("chunk_index") and payload.get("ticket_id") in documents:
+                    line["document"] = documents[payload["ticket_id"]]
+                f.write(json.dumps(line, ensure_ascii=False, default=str) + "\n")
+            written += len(records)
+            if on_progress:
+                on_progress(written, total)
+            if offset is None:
+                break
+        f.write(json.dumps({"type": "end", "points": written}) + "\n")
+
+    return {**header, "written": written}
+
+
+def read_header(path: str) -> Dict:
+    """エクスポートファイルのヘッダを読む"""
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        header = json.loads(f.readline())
+    if header.get("format") != EXPORT_FORMAT:
+        raise ValueError(f"{path} is not an index export file")
+    if header.get("version") != EXPORT_VERSION:
+        raise ValueError(f"Unsupported export version: {header.get('version')}")
+    return header
+
+
+def import_collection(
+    vector_service,
+    path: str,
+    collection_name: str,
+    on_progress: Optional[Callable[[int, int], None]] = None
+) -> Dict:
+    """
+    エクスポートファイルから新しいコレクションを作成
+
+    Embeddingモデル・次元数が現在の設定と異なるファイルは、検索クエリのベクトルと
+    比較できないのでエラーにする。
+
+    Args:
+        vector_service: VectorService
+        path: エクスポートファイル
+        collection_name: 作成するコレクション（既に存在する場合はエラー）
+        on_progress: (読み込んだ件数, 全件数) を受け取るコールバック
+
+    Returns:
+        ヘッダと読み込んだ件数・作成したコレクションの件数
+    """
+    header = read_header(path)
+    if header["embedding_model"] != vector_service.embedding_model or header["vector_size"] != vector_service.vector_size:
+        raise ValueError(
+            f"Export was created with {header['embedding_model']} ({header['vector_size']} dims), "
+            f"but this service uses {vector_service.embedding_model} ({vector_service.vector_size} dims)"
+        )
+    if header["documents"] and vector_service.doc_store is None:
+        raise ValueError("Export keeps ticket text in the document store; set DOC_STORE_ENABLED=true to import it")
+    if vector_service.collection_exists(collection_name):
+        raise ValueError(f"Collection already exists: {collection_name}")
+
+    vector_service.create_collection(collection_name, named=header["named"], sparse=header["sparse"])
+
+    byteorder = header.get("byteorder", sys.byteorder)
+    loaded = 0
+    trailer = None
+    with gzip.open(path, "rt", encoding="utf-8") as f, \
+            vector_service.point_writer(collection_name=collection_name) as writer:
+        f.readline()
+        for line in f:
+            record = json.loads(line)
+            if record.get("type") == "end":
+                trailer = record
+                break
+            # 本文はポイントの書き込みが成功してからストアに保存される
+            writer.add(PointStruct(
+                id=record["id"],
+                vector=decode_vector(record["vector"], byteorder),
+                payload=record["payload"]
+            ), document=record.get("document"))
+            loaded += 1
+            if on_progress and loaded % 1000 == 0:
+                on_progress(loaded, header["points"])
+
+    if trailer is None:
+        raise ValueError(f"{path} is truncated (read {loaded} points)")
+    count = vector_service.qdrant.count(collection_name=collection_name, exact=True).count
+    if on_progress:
+        on_progress(loaded, header["points"])
+    return {**header, "loaded": loaded, "count": count}
@@ -0,0 +1,678 @@
+"""
+並列インデックスパイプライン
+
+チケット取得 → 詳細取得 → ベクトル化 → Qdrant保存 を段階ごとに分離し、
+上限付きキューでつないで並列実行する。各ステージのワーカー数は個別に設定でき、
+キューが満杯になると上流ステージが待機する（バックプレッシャー）ため、
+全体のスループットは「各サービスのレイテンシの合計」ではなく
+「最も遅いステージ」で決まる。
+
+ステージ構成:
+    [ページ取得] --id_queue--> [詳細取得 ×N] --doc_queue--> [ベクトル化 ×M] --point_queue--> [保存 ×K]
+"""
+
+import queue
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+from tqdm import tqdm
+
+from app.services.checkpoint_store import (
+    CheckpointStore,
+    STATUS_DONE,
+    STATUS_FAILED,
+    STATUS_SKIPPED,
+)
+
+
+# ステージ終了を下流に伝えるための番兵
+_SENTINEL = object()
+
+
+class StageStats:
+    """ステージごとの処理件数とスループット"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.count = 0
+        self.started_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def add(self, n: int = 1):
+        with self._lock:
+            self.count += n
+
+    def rate(self) -> float:
+        """開始からの平均処理速度（件/秒）"""
+        elapsed = time.monotonic() - self.started_at
+        return self.count / elapsed if elapsed > 0 else 0.0
+
+
+class IndexingPipeline:
+    """Redmine → Embedding → Qdrant の並列インデックスパイプライン"""
+
+    def __init__(
+        self,
+        vector_service,
+        redmine_service,
+        build_document: Callable[[dict], Optional[dict]],
+        fetch_detail: Optional[Callable[[int], Optional[dict]]] = None,
+        page_size: int = 100,
+        detail_workers: int = 4,
+        embed_workers: int = 1,
+        upsert_workers: int = 1,
+        embed_batch_size: int = 32,
+        upsert_batch_size: int = 64,
+        queue_size: int = 256,
+        batch_timeout: float = 1.0,
+        limit: Optional[int] = None,
+        dry_run: bool = False,
+        force: bool = False,
+        checkpoint: Optional[CheckpointStore] = None,
+        resume: bool = True,
+        ticket_ids: Optional[List[int]] = None,
+        skip_unchanged: bool = True
+    ):
+        """
+        Args:
+            vector_service: VectorService
+            redmine_service: RedmineService
+            build_document: チケット詳細から {"ticket_id", "chunks", "content_hash", "payload"} を作る関数
+                            （Noneを返したチケットはスキップ）
+            fetch_detail: チケットIDから詳細を取得する関数（デフォルト: get_ticket_details）
+            page_size: Redmineから1回に取得する件数
+            detail_workers: 詳細取得の並列数
+            embed_workers: ベクトル化の並列数
+            upsert_workers: Qdrant保存の並列数
+            embed_batch_size: 1回のEmbedding APIコールでまとめる件数
+            upsert_batch_size: 1回のupsertでまとめるポイント数（ライターのflush件数）
+            queue_size: ステージ間キューの上限（バックプレッシャー）
+            batch_timeout: バッチが埋まらない場合に送出するまでの待ち時間（秒）
+            limit: パイプラインに流すチケットの最大件数（スキップ・内容が変わらず省略・エラーになった
+                   チケットも含む。インデックスした件数の上限ではない）
+            dry_run: Trueの場合、ベクトル化・保存を行わない
+            force: Trueの場合、チケット単位のエラーで停止しない
+            checkpoint: 進捗を記録するチェックポイント（Noneの場合は記録しない）
+            resume: Trueの場合、チェックポイントのオフセットから再開し処理済みチケットを飛ばす
+            ticket_ids: 指定した場合はページングせずこのチケットだけを処理（失敗分の再処理用）
+            skip_unchanged: Trueの場合、インデックス済みのテキストハッシュと一致する
+                            （内容もEmbeddingモデルも変わっていない）チケットを再ベクトル化しない
+        """
+        self.vector_service = vector_service
+        self.redmine_service = redmine_service
+        self.build_document = build_document
+        self.fetch_detail = fetch_detail or redmine_service.get_ticket_details
+        self.page_size = page_size
+        self.detail_workers = max(1, detail_workers)
+        self.embed_workers = max(1, embed_workers)
+        self.upsert_workers = max(1, upsert_workers)
+        self.embed_batch_size = max(1, embed_batch_size)
+        self.upsert_batch_size = max(1, upsert_batch_size)
+        self.batch_timeout = batch_timeout
+        self.limit = limit
+        self.dry_run = dry_run
+        self.force = force
+        self.checkpoint = None if dry_run else checkpoint
+        self.resume = resume
+        self.ticket_ids = ticket_ids
+        self.skip_unchanged = skip_unchanged
+        self.existing_hashes: Dict[int, str] = {}
+
+        self.id_queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self.doc_queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self.point_queue: queue.Queue = queue.Queue(maxsize=queue_size)
+
+        self.stats = {
+            name: StageStats(name)
+            for name in ("fetch", "detail", "embed", "upsert")
+        }
+        self.indexed_count = 0
+        self.skipped_count = 0
+        self.error_count = 0
+        self.resumed_count = 0
+        self.unchanged_count = 0
+        self._counter_lock = threading.Lock()
+        # チケットごとの未書き込みチャンク数（1チケットが複数ポイントになるため）
+        self._pending_chunks: Dict[int, int] = {}
+        self._exhausted = False
+
+        # チェックポイント用: ページごとの未完了件数と、チケット→ページの対応
+        self._pages: "OrderedDict[int, Dict]" = OrderedDict()
+        self._ticket_page: Dict[int, int] = {}
+        self._content_hashes: Dict[int, str] = {}
+        self._page_lock = threading.Lock()
+
+        self._stop = threading.Event()
+        self._fatal_error: Optional[BaseException] = None
+        self._pbar: Optional[tqdm] = None
+
+        # ステージごとの残りワーカー数（最後の1つが下流に番兵を流す）
+        self._remaining = {
+            "detail": self.detail_workers,
+            "embed": self.embed_workers,
+        }
+        self._remaining_lock = threading.Lock()
+
+    # ------------------------------------------------------------------
+    # 公開API
+    # ------------------------------------------------------------------
+
+    def run(self) -> Dict:
+        """
+        パイプラインを実行し、完了まで待機
+
+        Returns:
+            {"completed": 全件完了したか, "indexed": N, "skipped": N, "errors": N, "resumed": N,
+             "unchanged": N, "elapsed": 秒, "rates": {stage: 件/秒}}
+        """
+        start = time.monotonic()
+        threads: List[threading.Thread] = []
+
+        # インデックス済みのハッシュを先にまとめて取得しておく（ペイロードはハッシュ関連のみ）
+        if self.skip_unchanged:
+            self.existing_hashes = self.vector_service.fetch_content_hashes()
+            print(f"  インデックス済みハッシュ: {len(self.existing_hashes)} 件")
+
+        def spawn(target, name, *args):
+            t = threading.Thread(target=target, name=name, args=args, daemon=True)
+            t.start()
+            threads.append(t)
+
+        with tqdm(total=self.limit, desc="インデックス中", unit="tickets") as pbar:
+            self._pbar = pbar
+
+            spawn(self._fetch_stage, "fetch")
+            for i in range(self.detail_workers):
+                spawn(self._detail_stage, f"detail-{i}")
+            for i in range(self.embed_workers):
+                spawn(self._embed_stage, f"embed-{i}")
+            for i in range(self.upsert_workers):
+                spawn(self._upsert_stage, f"upsert-{i}")
+
+            try:
+                # join(timeout) でループし、Ctrl-C をメインスレッドで受け取れるようにする
+                while any(t.is_alive() for t in threads):
+                    for t in threads:
+                        t.join(timeout=0.5)
+                    pbar.set_postfix_str(self.format_rates(), refresh=False)
+            except KeyboardInterrupt:
+                self._stop.set()
+                pbar.write("\n  ⚠️  中断要求を受け付けました。処理中のバッチを終了しています...")
+                for t in threads:
+                    t.join(timeout=10)
+                raise
+
+            pbar.set_postfix_str(self.format_rates())
+
+        self._pbar = None
+
+        if self._fatal_error is not None:
+            raise self._fatal_error
+
+        # 全ページを最後まで処理できた場合は完了を記録（次回は最初から）
+        # ID指定の実行（--since / --retry-failed）はページングの再開位置に影響させない
+        completed = self._exhausted and not self._stop.is_set()
+        if completed and self.checkpoint is not None and self.ticket_ids is None:
+            self.checkpoint.set_meta("completed_at", datetime.now().isoformat())
+
+        return {
+            "completed": completed,
+            "indexed": self.indexed_count,
+            "skipped": self.skipped_count,
+            "errors": self.error_count,
+            "resumed": self.resumed_count,
+            "unchanged": self.unchanged_count,
+            "elapsed": time.monotonic() - start,
+            "rates": {name: s.rate() for name, s in self.stats.items()},
+        }
+
+    def format_rates(self) -> str:
+        """ステージごとのスループット表示用文字列"""
+        return " | ".join(
+            f"{name} {s.rate():.1f}/s" for name, s in self.stats.items()
+        )
+
+    # ------------------------------------------------------------------
+    # ステージ実装
+    # ------------------------------------------------------------------
+
+    def _fetch_stage(self):
+        """ページ取得: Redmineのチケット一覧をページングしてIDを流す"""
+        try:
+            if self.ticket_ids is not None:
+                self._feed_ticket_ids()
+            else:
+                self._feed_pages()
+        except Exception as e:
+            self._fail(e, "チケット一覧の取得")
+        finally:
+            for _ in range(self.detail_workers):
+                self._put(self.id_queue, _SENTINEL, force=True)
+
+    def _feed_ticket_ids(self):
+        """指定されたチケットIDをそのまま流す"""
+        for fed, ticket_id in enumerate(self.ticket_ids):
+            if self.limit and fed >= self.limit:
+                return
+            if not self._put(self.id_queue, ticket_id):
+                return
+            self.stats["fetch"].add()
+
+        self._exhausted = True
+
+    def _feed_pages(self):
+        """ページングしながらIDを流す（チェックポイントがあれば再開位置から）"""
+        fed = 0
+        start_offset = 0
+        if self.checkpoint is not None and self.resume:
+            if self.checkpoint.get_meta("completed_at"):
+                # 前回は最後まで完了しているので、新しい実行として最初から処理する
+                self.checkpoint.start_new_run()
+            start_offset = self.checkpoint.get_offset()
+            if start_offset and self._pbar is not None:
+                self._pbar.write(f"  ↻ チェックポイントから再開: offset={start_offset}")
+
+        for offset, tickets in self.redmine_service.iter_ticket_pages(
+            batch_size=self.page_size, offset=start_offset
+        ):
+            if self._stop.is_set():
+                break
+
+            ids = [ticket.id for ticket in tickets]
+
+            # 前回までに処理済み（done / skipped / failed）のチケットは飛ばす
+            # failed はデッドレターとして残し、--retry-failed でのみ再処理する
+            if self.checkpoint is not None and self.resume:
+                statuses = self.checkpoint.get_statuses(ids)
+                pending = [tid for tid in ids if tid not in statuses]
+                resumed = len(ids) - len(pending)
+                if resumed:
+                    with self._counter_lock:
+                        self.resumed_count += resumed
+            else:
+                pending = ids
+
+            complete = True
+            if self.limit and fed + len(pending) > self.limit:
+                pending = pending[:max(0, self.limit - fed)]
+                complete = False
+
+            self._register_page(offset, offset + len(tickets), pending, complete)
+
+            for ticket_id in pending:
+                if not self._put(self.id_queue, ticket_id):
+                    return
+                fed += 1
+                self.stats["fetch"].add()
+
+            if not complete:
+                return
+
+        self._exhausted = True
+
+    def _detail_stage(self):
+        """詳細取得: チケット詳細を取得してインデックス用ドキュメントに変換"""
+        try:
+            while True:
+                ticket_id = self._get(self.id_queue)
+                if ticket_id is _SENTINEL:
+                    break
+
+                try:
+                    detail = self.fetch_detail(ticket_id)
+                    document = self.build_document(detail) if detail else None
+                except Exception as e:
+                    self._ticket_error(ticket_id, e)
+                    continue
+                finally:
+                    self.stats["detail"].add()
+
+                if document is None:
+                    self._count_skipped(ticket_id)
+                    continue
+
+                if (
+                    self.skip_unchanged
+                    and document.get("content_hash")
+                    and self.existing_hashes.get(ticket_id) == document["content_hash"]
+                ):
+                    self._count_unchanged(ticket_id, document["content_hash"])
+                    continue
+
+                if self.dry_run:
+                    self._count_indexed([ticket_id])
+                    continue
+
+                if self.checkpoint is not None and document.get("content_hash"):
+                    with self._page_lock:
+                        self._content_hashes[ticket_id] = document["content_hash"]
+
+                if not self._put(self.doc_queue, document):
+                    break
+        finally:
+            self._stage_finished("detail", self.doc_queue, self.embed_workers)
+
+    def _embed_stage(self):
+        """ベクトル化: ドキュメントのチャンクをまとめてEmbedding APIに送る"""
+        try:
+            while True:
+                batch, done = self._collect(self.doc_queue, self.embed_batch_size)
+                if batch:
+                    try:
+                        points = self._embed_batch(batch)
+                    except Exception as e:
+                        # バッチのどこで失敗しても、チケット単位のエラーとして記録する
+                        for document in batch:
+                            self._ticket_error(document["ticket_id"], e)
+                        points = []
+
+                    for item in points:
+                        if not self._put(self.point_queue, item):
+                            done = True
+                            break
+                if done:
+                    break
+        except Exception as e:
+            self._fail(e, "ベクトル化")
+        finally:
+            self._stage_finished("embed", self.point_queue, self.upsert_workers)
+
+    def _embed_batch(self, batch: List[dict]) -> list:
+        """
+        バッチのドキュメントをベクトル化してポイントを作る（失敗時は例外を送出）
+
+        Returns:
+            (ポイント, ドキュメントストアに保存する本文) のリスト（本文はチケットの最後のポイントにだけ付ける）
+        """
+        texts_per_document = [self.vector_service.embedding_texts(document) for document in batch]
+        vectors = self.vector_service.embed_texts(
+            [text for texts in texts_per_document for text in texts]
+        )
+        self.stats["embed"].add(len(batch))
+
+        points = []
+        chunk_counts = {}
+        position = 0
+        for document, texts in zip(batch, texts_per_document):
+            document_points = self.vector_service.make_points(
+                document, vectors[position:position + len(texts)]
+            )
+            position += len(texts)
+            record = self.vector_service.document_record(document)
+            points.extend(
+                (point, record if i == len(document_points) - 1 else None)
+                for i, point in enumerate(document_points)
+            )
+            chunk_counts[document["ticket_id"]] = len(document_points)
+
+        # 全チャンクの書き込みが終わった時点でチケットを完了とする
+        # （バッチ全体のポイントを作れてから登録し、途中で失敗したチケットを残さない）
+        with self._counter_lock:
+            self._pending_chunks.update(chunk_counts)
+
+        # 再インデックスでチャンク数が減ったチケットの余りを削除
+        try:
+            self.vector_service.delete_stale_chunks(
+                {document["ticket_id"]: len(document["chunks"]) for document in batch}
+            )
+        except Exception as e:
+            if self._pbar is not None:
+                self._pbar.write(f"  ⚠️  古いチャンクの削除に失敗: {e}")
+        return points
+
+    def _upsert_stage(self):
+        """
+        保存: ポイントをバッファ付きライター経由でQdrantに書き込む
+
+        ワーカーごとにライターを持ち、途中のflushは wait=False で投げ、
+        終了時に close() で同期書き込みして完了を保証する。
+        wait=False のflushはQdrantへの反映前に返るため、全チャンクを書き込んだチケットも
+        すぐには完了として記録せず、page_size 件たまるごとと終了時の同期書き込み（バリア）の
+        完了後にまとめて記録する（中断しても未反映のチケットは再開時に再処理される）。
+        """
+        # 全チャンクのflushを終え、バリアの完了を待っているチケット
+        unsynced: List[int] = []
+        unsynced_lock = threading.Lock()
+
+        def on_flush(points):
+            completed = self._chunks_written([point.payload["ticket_id"] for point in points])
+            if completed:
+                with unsynced_lock:
+                    unsynced.extend(completed)
+
+        def take_unsynced() -> List[int]:
+            with unsynced_lock:
+                taken = list(unsynced)
+                unsynced.clear()
+            return taken
+
+        def commit(ticket_ids: List[int]):
+            if ticket_ids:
+                self.stats["upsert"].add(len(ticket_ids))
+                self._count_indexed(ticket_ids)
+
+        def on_error(points, error):
+            for ticket_id in dict.fromkeys(point.payload["ticket_id"] for point in points):
+                with self._counter_lock:
+                    # 同じチケットの別チャンクで既に失敗として数えていれば重複させない
+                    if self._pending_chunks.pop(ticket_id, None) is None:
+                        continue
+                self._ticket_error(ticket_id, error)
+
+        writer = self.vector_service.point_writer(
+            flush_count=self.upsert_batch_size,
+            on_flush=on_flush,
+            on_error=on_error
+        )
+        try:
+            while True:
+                item = self._get(self.point_queue)
+                if item is _SENTINEL:
+                    break
+                point, document = item
+                writer.add(point, document=document)
+                with unsynced_lock:
+                    due = len(unsynced) >= self.page_size
+                if due:
+                    # バリアより前にflushしたチケットだけを記録する（以降のflush分は次回）
+                    ready = take_unsynced()
+                    writer.sync()
+                    commit(ready)
+        except Exception as e:
+            self._fail(e, "書き込みの同期")
+        finally:
+            try:
+                writer.close()
+                commit(take_unsynced())
+            except Exception as e:
+                self._fail(e, "最終書き込み")
+
+    def _chunks_written(self, ticket_ids: List[int]) -> List[int]:
+        """書き込んだチャンクを差し引き、全チャンクの書き込みが終わったチケットを返す"""
+        completed = []
+        with self._counter_lock:
+            for ticket_id in ticket_ids:
+                remaining = self._pending_chunks.get(ticket_id)
+                if remaining is None:
+                    continue
+                if remaining <= 1:
+                    del self._pending_chunks[ticket_id]
+                    completed.append(ticket_id)
+                else:
+                    self._pending_chunks[ticket_id] = remaining - 1
+        return completed
+
+    # ------------------------------------------------------------------
+    # キュー操作・集計ヘルパー
+    # ------------------------------------------------------------------
+
+    def _put(self, q: queue.Queue, item, force: bool = False) -> bool:
+        """
+        停止要求を確認しながらキューに投入（満杯なら待機 = バックプレッシャー）
+
+        Returns:
+            投入できた場合True、停止要求により中断した場合False
+        """
+        while True:
+            if self._stop.is_set() and not force:
+                return False
+            try:
+                q.put(item, timeout=0.2)
+                return True
+            except queue.Full:
+                if self._stop.is_set() and force:
+                    # 停止中は下流が消費しないことがあるため番兵投入を諦める
+                    return False
+
+    def _get(self, q: queue.Queue):
+        """停止要求を確認しながらキューから取得（停止時は番兵を返す）"""
+        while True:
+            if self._stop.is_set():
+                return _SENTINEL
+            try:
+                return q.get(timeout=0.2)
+            except queue.Empty:
+                continue
+
+    def _collect(self, q: queue.Queue, batch_size: int):
+        """
+        キューから最大 batch_size 件を集める
+
+        最初の1件を受け取ってから batch_timeout 秒経過した場合は、
+        バッチが埋まっていなくても送出する。
+
+        Returns:
+            (バッチ, 上流が終了したかどうか)
+        """
+        batch = []
+        first = self._get(q)
+        if first is _SENTINEL:
+            return batch, True
+        batch.append(first)
+
+        deadline = time.monotonic() + self.batch_timeout
+        while len(batch) < batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or self._stop.is_set():
+                break
+            try:
+                item = q.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is _SENTINEL:
+                return batch, True
+            batch.append(item)
+
+        return batch, False
+
+    def _stage_finished(self, stage: str, downstream: queue.Queue, downstream_workers: int):
+        """ステージの最後のワーカーが終了したら下流に番兵を流す"""
+        with self._remaining_lock:
+            self._remaining[stage] -= 1
+            last = self._remaining[stage] == 0
+        if last:
+            for _ in range(downstream_workers):
+                self._put(downstream, _SENTINEL, force=True)
+
+    def _count_indexed(self, ticket_ids: List[int]):
+        with self._counter_lock:
+            self.indexed_count += len(ticket_ids)
+        if self._pbar is not None:
+            self._pbar.update(len(ticket_ids))
+        self._finalize(ticket_ids, STATUS_DONE)
+
+    def _count_unchanged(self, ticket_id: int, content_hash: str):
+        """内容が変わっていないため再ベクトル化を省略"""
+        with self._counter_lock:
+            self.unchanged_count += 1
+        if self._pbar is not None:
+            self._pbar.update(1)
+        with self._page_lock:
+            self._content_hashes[ticket_id] = content_hash
+        self._finalize([ticket_id], STATUS_DONE)
+
+    def _count_skipped(self, ticket_id: int):
+        with self._counter_lock:
+            self.skipped_count += 1
+        if self._pbar is not None:
+            self._pbar.update(1)
+        self._finalize([ticket_id], STATUS_SKIPPED)
+
+    def _ticket_error(self, ticket_id: int, error: Exception):
+        """チケット単位のエラー処理（--force でなければパイプライン全体を停止）"""
+        with self._counter_lock:
+            self.error_count += 1
+        if self._pbar is not None:
+            self._pbar.update(1)
+        self._finalize([ticket_id], STATUS_FAILED, str(error))
+
+        if self.force:
+            if self._pbar is not None:
+                self._pbar.write(f"  ⚠️  チケット #{ticket_id} エラー: {error}")
+        else:
+            self._fail(error, f"チケット #{ticket_id}")
+
+    # ------------------------------------------------------------------
+    # チェックポイント
+    # ------------------------------------------------------------------
+
+    def _register_page(self, offset: int, next_offset: int, ticket_ids: List[int], complete: bool):
+        """
+        ページを登録し、未完了チケットの数を管理する
+
+        complete=False（件数制限で途中までしか流さなかったページ）は
+        全件完了してもオフセットを進めない。
+        """
+        if self.checkpoint is None:
+            return
+        with self._page_lock:
+            self._pages[offset] = {
+                "pending": len(ticket_ids),
+                "next_offset": next_offset if complete else offset,
+            }
+            for ticket_id in ticket_ids:
+                self._ticket_page[ticket_id] = offset
+            self._advance_offset_locked()
+
+    def _finalize(self, ticket_ids: List[int], status: str, error: Optional[str] = None):
+        """チケットの処理結果を記録し、完了したページの分だけ再開位置を進める"""
+        if self.checkpoint is None:
+            return
+
+        with self._page_lock:
+            records = [
+                (tid, status, self._content_hashes.pop(tid, None) if status == STATUS_DONE else None, error)
+                for tid in ticket_ids
+            ]
+
+        self.checkpoint.mark_many(records)
+
+        with self._page_lock:
+            for ticket_id in ticket_ids:
+                offset = self._ticket_page.pop(ticket_id, None)
+                if offset is not None and offset in self._pages:
+                    self._pages[offset]["pending"] -= 1
+            self._advance_offset_locked()
+
+    def _advance_offset_locked(self):
+        """先頭から連続して完了しているページの分だけオフセットを保存"""
+        next_offset = None
+        while self._pages:
+            offset, page = next(iter(self._pages.items()))
+            if page["pending"] > 0:
+                break
+            self._pages.popitem(last=False)
+            next_offset = page["next_offset"]
+        if next_offset is not None:
+            self.checkpoint.set_offset(next_offset)
+
+    def _fail(self, error: BaseException, where: str):
+        """致命的エラーを記録してパイプラインを停止"""
+        if self._fatal_error is None:
+            self._fatal_error = error
+            if self._pbar is not None:
+                self._pbar.write(f"\n  ✗ {where} でエラー発生: {error}")
+        self._stop.set()
@@ -21,10 +21,15 @@ from app.services.integration_service import IntegrationService
 class IntelligentSearchService:
     """自然言語クエリを処理する統合検索サービス"""
 
-    def __init__(self):
-        self.llm_service = LLMService()
-        self.vector_service = VectorService()
-        self.redmine_service = RedmineService()
+    def __init__(
+        self,
+        llm_service: Optional[LLMService] = None,
+        vector_service: Optional[VectorService] = None,
+        redmine_service: Optional[RedmineService] = None
+    ):
+        self.llm_service = llm_service or LLMService()
+        self.vector_service = vector_service or VectorService()
+        self.redmine_service = redmine_service or RedmineService()
         self.integration_service = IntegrationService()
 
         print("Intelligent Search Service initialized")
@@ -138,7 +143,9 @@ class IntelligentSearchService:
 
         params = {
             "alert_message": alert_message,
-            "limit": limit
+            "limit": limit,
+            # 同じアラートの繰り返しチケットを代表1件にまとめ、synthesize_facts に渡すトークンを減らす
+            "diversify": True
         }
 
         # 日付範囲フィルタ
@@ -57,12 +57,18 @@ class BaseLLMProvider(ABC):
 class OpenAIProvider(BaseLLMProvider):
     """OpenAI APIを使用した実装"""
 
-    def __init__(self):
-        api_key = os.getenv("OPENAI_API_KEY")
-        if not api_key:
-            raise ValueError("OPENAI_API_KEY must be set in environment variables")
+    def __init__(self, client: Optional[OpenAI] = None):
+        """
+        Args:
+            client: 共有するOpenAIクライアント（省略時は OPENAI_API_KEY で生成）
+        """
+        if client is None:
+            api_key = os.getenv("OPENAI_API_KEY")
+            if not api_key:
+                raise ValueError("OPENAI_API_KEY must be set in environment variables")
+            client = OpenAI(api_key=api_key)
 
-        self.client = OpenAI(api_key=api_key)
+        self.client = client
         self.model = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
 
     def analyze_query(self, query: str) -> Dict:
@@ -299,6 +305,10 @@ class OpenAIProvider(BaseLLMProvider):
                     "status": ticket.get("status")
                 }
 
+                # ほぼ同じ内容のチケットを集約している場合は件数と番号だけ渡す
+                if ticket.get("duplicate_count"):
+                    ticket_info["similar_tickets"] = ticket.get("duplicate_ticket_ids", [])
+
                 # コメントがある場合は追加
                 if ticket.get("comments"):
                     ticket_info["comments"] = [
@@ -433,11 +443,15 @@ class LLaMAProvider(BaseLLMProvider):
 class LLMService:
     """LLMサービスのファサード"""
 
-    def __init__(self):
+    def __init__(self, openai_client: Optional[OpenAI] = None):
+        """
+        Args:
+            openai_client: 共有するOpenAIクライアント（LLM_PROVIDER=openai の場合のみ使用）
+        """
         provider_type = os.getenv("LLM_PROVIDER", "openai").lower()
 
         if provider_type == "openai":
-            self.provider = OpenAIProvider()
+            self.provider = OpenAIProvider(client=openai_client)
         elif provider_type == "llama":
             self.provider = LLaMAProvider()
         else:
@@ -10,6 +10,7 @@
 6. 統合
 """
 
+import os
 import re
 from typing import Dict, List, Optional, Set
 from app.services.llm_service import LLMService
@@ -17,13 +18,24 @@ from app.services.vector_service import VectorService
 from app.services.redmine_service import RedmineService
 
 
+# 視点間の順位融合（Reciprocal Rank Fusion）の定数 k: score = Σ 1 / (k + 順位)
+RRF_K = 60
+
+
 class ProcedureAssistantService:
     """手順書作成補佐サービス"""
 
-    def __init__(self):
-        self.llm_service = LLMService()
-        self.vector_service = VectorService()
-        self.redmine_service = RedmineService()
+    def __init__(
+        self,
+        llm_service: Optional[LLMService] = None,
+        vector_service: Optional[VectorService] = None,
+        redmine_service: Optional[RedmineService] = None
+    ):
+        self.llm_service = llm_service or LLMService()
+        self.vector_service = vector_service or VectorService()
+        self.redmine_service = redmine_service or RedmineService()
+        # LLMで詳細分析するチケット数（融合スコアの上位から）
+        self.analyze_limit = int(os.getenv("PROCEDURE_ANALYZE_LIMIT", "10"))
         print("Procedure Assistant Service initialized")
 
     def assist(self, query: str, context: Optional[str] = None) -> Dict:
@@ -70,22 +82,9 @@ class ProcedureAssistantService:
             tickets = self._search_tickets(search_query, limit=10, score_threshold=0.3)
             print(f"    → {len(tickets)}件")
 
-            # 重複チケットには視点を追加、新規チケットは追加
-            new_count = 0
-            duplicate_count = 0
-            for ticket in tickets:
-                tid = ticket.get("ticket_id")
-                if tid not in tickets_dict:
-                    # 新規チケット
-                    ticket["found_by_perspectives"] = [{"query": search_query, "reason": reason}]
-                    all_tickets.append(ticket)
-                    tickets_dict[tid] = ticket
-                    new_count += 1
-                else:
-                    # 既存チケット - 視点を追加
-                    existing = tickets_dict[tid]
-                    existing["found_by_perspectives"].append({"query": search_query, "reason": reason})
-                    duplicate_count += 1
+            new_count, duplicate_count = self._merge_perspective_results(
+                tickets, search_query, reason, all_tickets, tickets_dict
+            )
 
             if new_count > 0:
                 print(f"    → 新規: {new_count}件")
@@ -102,15 +101,7 @@ class ProcedureAssistantService:
                 reason = sq.get('reason')
                 print(f"  [{idx}] 「{search_query}」で再検索...")
                 tickets = self._search_tickets(search_query, limit=10, score_threshold=0.1)
-                for ticket in tickets:
-                    tid = ticket.get("ticket_id")
-                    if tid not in tickets_dict:
-                        ticket["found_by_perspectives"] = [{"query": search_query, "reason": reason}]
-                        all_tickets.append(ticket)
-                        tickets_dict[tid] = ticket
-                    else:
-                        existing = tickets_dict[tid]
-                        existing["found_by_perspectives"].append({"query": search_query, "reason": reason})
+                self._merge_perspective_results(tickets, search_query, reason, all_tickets, tickets_dict)
             print(f"  再検索結果: 合計 {len(all_tickets)}件")
 
         initial_tickets = all_tickets
@@ -136,20 +127,9 @@ class ProcedureAssistantService:
             print(f"  検索: {add_query}")
             additional_tickets = self._search_tickets(add_query, limit=5, score_threshold=0.3)
 
-            # 重複チケットには視点を追加、新規チケットは追加
-            new_count = 0
-            duplicate_count = 0
-            for ticket in additional_tickets:
-                tid = ticket.get("ticket_id")
-                if tid not in tickets_dict:
-                    ticket["found_by_perspectives"] = [{"query": add_query, "reason": "追加検索"}]
-                    all_tickets.append(ticket)
-                    tickets_dict[tid] = ticket
-                    new_count += 1
-                else:
-                    existing = tickets_dict[tid]
-                    existing["found_by_perspectives"].append({"query": add_query, "reason": "追加検索"})
-                    duplicate_count += 1
+            new_count, duplicate_count = self._merge_perspective_results(
+                additional_tickets, add_query, "追加検索", all_tickets, tickets_dict
+            )
 
             msg = f"    → {len(additional_tickets)}件"
             if new_count > 0:
@@ -166,6 +146,15 @@ class ProcedureAssistantService:
             ticket_ids = {t.get("ticket_id") for t in all_tickets}
             relationships = self._analyze_relationships(ticket_ids)
 
+        # 視点ごとの順位を融合し、多くの視点で上位に出たチケットから分析する
+        all_tickets = self._fuse_perspectives(all_tickets)
+        if all_tickets:
+            top = all_tickets[0]
+            print(
+                f"\n  順位融合: 最上位 #{top.get('ticket_id')}"
+                f"（{len(top['found_by_perspectives'])}視点, score={top['fusion_score']:.4f}）"
+            )
+
         # [Step 5] 全体を深く分析して統合
         print("\n[5/5] 全体を分析・統合中...")
         analyzed_tickets = self._deep_analyze_tickets(all_tickets, query, context)
@@ -202,6 +191,63 @@ class ProcedureAssistantService:
             "recommendations": recommendations
         }
 
+    @staticmethod
+    def _merge_perspective_results(
+        tickets: List[Dict],
+        search_query: str,
+        reason: str,
+        all_tickets: List[Dict],
+        tickets_dict: Dict[int, Dict]
+    ) -> tuple:
+        """
+        1つの視点の検索結果を統合（重複チケットには視点を追加、新規チケットは追加）
+
+        視点ごとの順位（1始まり）と類似度を found_by_perspectives に記録し、
+        後で _fuse_perspectives が順位融合に使う。
+
+        Returns:
+            (新規件数, 重複件数)
+        """
+        new_count = 0
+        duplicate_count = 0
+        for rank, ticket in enumerate(tickets, 1):
+            tid = ticket.get("ticket_id")
+            perspective = {
+                "query": search_query,
+                "reason": reason,
+                "rank": rank,
+                "similarity": ticket.get("similarity", 0)
+            }
+            if tid not in tickets_dict:
+                ticket["found_by_perspectives"] = [perspective]
+                all_tickets.append(ticket)
+                tickets_dict[tid] = ticket
+                new_count += 1
+            else:
+                tickets_dict[tid]["found_by_perspectives"].append(perspective)
+                duplicate_count += 1
+        return new_count, duplicate_count
+
+    @staticmethod
+    def _fuse_perspectives(tickets: List[Dict]) -> List[Dict]:
+        """
+        視点ごとの順位をReciprocal Rank Fusionで融合し、融合スコア順に並べ替える
+
+        複数の視点で上位に出たチケットほど高くなる（score = Σ 1 / (RRF_K + 順位)）。
+        同点の場合は最大類似度で比べる。各チケットに fusion_score を付ける。
+        """
+        for ticket in tickets:
+            perspectives = ticket.get("found_by_perspectives", [])
+            ticket["fusion_score"] = sum(1.0 / (RRF_K + p.get("rank", 1)) for p in perspectives)
+        return sorted(
+            tickets,
+            key=lambda t: (
+                t["fusion_score"],
+                max((p.get("similarity", 0) for p in t.get("found_by_perspectives", [])), default=0)
+            ),
+            reverse=True
+        )
+
     def _analyze_query(self, query: str, context: Optional[str] = None) -> Dict:
         """
         LLMでクエリを分析し、複数の検索クエリを生成
@@ -388,7 +434,8 @@ JSON形式で出力:
             tickets = self.vector_service.search_similar_tickets(
                 alert_message=query,
                 limit=limit,
-                score_threshold=score_threshold
+                score_threshold=score_threshold,
+                shape="lite"  # 詳細はこのあとRedmineから取得する
             )
             print(f"  DEBUG: Qdrant検索結果 - {len(tickets)}件")
 
@@ -468,10 +515,21 @@ JSON形式で出力:
     def _deep_analyze_tickets(self, tickets: List[Dict], query: str, context: Optional[str]) -> List[Dict]:
         """
         LLMで各チケットを深く分析し、重要度順にソート
+
+        tickets は視点間の順位融合（_fuse_perspectives）済みの順序で渡し、上位
+        analyze_limit 件だけを分析する。
+        クロスエンコーダの再ランキングが使える場合は、作業目的に対する関連度で
+        全候補を並べ替えて上位を選び、その関連度を重要度にする
+        （チケットごとのLLM重要度評価を省略する）。
         """
         analyzed = []
 
-        for ticket in tickets[:10]:  # 最大10件を詳細分析
+        reranker = self.vector_service.reranker
+        if reranker.available:
+            rerank_query = f"{query}\n{context}" if context else query
+            tickets = reranker.rerank(rerank_query, tickets)
+
+        for ticket in tickets[:self.analyze_limit]:
             ticket_id = ticket.get("ticket_id")
             subject = ticket.get("subject", "")
             description = ticket.get("description", "")
@@ -482,10 +540,16 @@ JSON形式で出力:
                 ticket_id, subject, description, comments, query
             )
 
-            # 重要度評価
-            importance = self._evaluate_ticket_importance(
-                ticket_id, subject, description, comments, query, context
-            )
+            # 重要度評価（再ランキング済みならその関連度を使う）
+            if "rerank_score" in ticket:
+                importance = {
+                    "score": round(ticket["rerank_score"] * 100),
+                    "reason": "クロスエンコーダによる作業目的との関連度"
+                }
+            else:
+                importance = self._evaluate_ticket_importance(
+                    ticket_id, subject, description, comments, query, context
+                )
 
             analyzed.append({
                 **ticket,
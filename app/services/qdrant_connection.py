@@ -0,0 +1,132 @@
+"""
+Qdrantクライアントの生成（接続モードの切り替え）
+
+QDRANT_MODE で接続先を選ぶ:
+    server: QDRANT_URL のQdrantサーバーに接続（デフォルト。QDRANT_PREFER_GRPC=true でgRPC）
+    local:  qdrant-client の組み込みモードで QDRANT_PATH のディレクトリに保存（Docker不要）
+    memory: 組み込みモードでメモリ上にのみ保持（プロセス終了で消える。動作確認・ベンチマーク用）
+
+組み込みモードはAPIサーバー・スクリプトのプロセス内でQdrantを動かすのでネットワークを経由しない。
+同じディレクトリは1つのクライアントしか開けないため、プロセス内では同じパスのクライアントを共有する
+（memory も共有し、同じプロセスのサービス間で同じデータが見えるようにする）。
+別プロセス（APIサーバーとインデックススクリプトなど）から同時には使えない。
+スナップショット・ペイロードインデックスはサーバーモードのみ対応。
+
+サーバーモードのクライアントも接続設定ごとにプロセス内で共有し、サービスごとに
+HTTPのコネクションプール・gRPCチャネルを作らないようにする（いずれもスレッドセーフ）。
+gRPCでは3072次元のクエリベクトルや検索結果のペイロードをJSONにエンコード・パースせずに済む。
+"""
+
+import os
+import threading
+from typing import Dict, Optional, Tuple
+
+import httpx
+from qdrant_client import QdrantClient
+
+
+QDRANT_MODES = ("server", "local", "memory")
+
+# 組み込みモードのクライアント {パス: クライアント}
+_embedded_clients: Dict[str, QdrantClient] = {}
+# サーバーモードのクライアント {(URL, gRPCか): クライアント}
+_server_clients: Dict[Tuple[str, bool], QdrantClient] = {}
+_clients_lock = threading.Lock()
+
+
+def qdrant_mode() -> str:
+    """QDRANT_MODE（不正な値はエラー）"""
+    mode = os.getenv("QDRANT_MODE", "server").strip().lower()
+    if mode not in QDRANT_MODES:
+        raise ValueError(f"QDRANT_MODE must be one of {', '.join(QDRANT_MODES)}: {mode}")
+    return mode
+
+
+def is_embedded() -> bool:
+    """組み込みモード（local / memory）か"""
+    return qdrant_mode() != "server"
+
+
+def describe_target() -> str:
+    """接続先の表示用文字列"""
+    mode = qdrant_mode()
+    if mode == "local":
+        return f"local:{os.getenv('QDRANT_PATH', 'data/qdrant')}"
+    if mode == "memory":
+        return "memory"
+    grpc = os.getenv("QDRANT_PREFER_GRPC", "false").lower() == "true"
+    return f"{os.getenv('QDRANT_URL', 'http://localhost:6333')}{' (gRPC)' if grpc else ''}"
+
+
+def create_qdrant_client(prefer_grpc: Optional[bool] = None, shared: bool = True) -> QdrantClient:
+    """
+    環境変数に従ってQdrantクライアントを生成
+
+    サーバーモードで QDRANT_PREFER_GRPC=true の場合は gRPC（QDRANT_GRPC_PORT, デフォルト6334）で接続する。
+    大量ポイントの書き込みや検索ではJSONエンコード・パースが不要な分、RESTより高速。
+
+    Args:
+        prefer_grpc: gRPCで接続するか（省略時は QDRANT_PREFER_GRPC。サーバーモードのみ）
+        shared: プロセス内で共有のクライアントを返すか（Falseは比較・計測用に新しい接続を作る）
+    """
+    mode = qdrant_mode()
+    if mode != "server":
+        location = os.getenv("QDRANT_PATH", "data/qdrant") if mode == "local" else ":memory:"
+        with _clients_lock:
+            client = _embedded_clients.get(location)
+            if client is None:
+                if mode == "local":
+                    os.makedirs(location, exist_ok=True)
+                    client = QdrantClient(path=location)
+                else:
+                    client = QdrantClient(location=":memory:")
+                _embedded_clients[location] = client
+            return client
+
+    url = os.getenv("QDRANT_URL", "http://localhost:6333")
+    if prefer_grpc is None:
+        prefer_grpc = os.getenv("QDRANT_PREFER_GRPC", "false").lower() == "true"
+    if not shared:
+        return _connect(url, prefer_grpc)
+
+    with _clients_lock:
+        client = _server_clients.get((url, prefer_grpc))
+        if client is None:
+            client = _connect(url, prefer_grpc)
+            _server_clients[(url, prefer_grpc)] = client
+        return client
+
+
+def _connect(url: str, prefer_grpc: bool) -> QdrantClient:
+    """
+    サーバーに接続するクライアントを生成
+
+    QDRANT_TIMEOUT: リクエストのタイムアウト秒（省略時はクライアントのデフォルト）
+    QDRANT_POOL_SIZE: RESTのコネクションプールの最大接続数（デフォルト: 32）
+    QDRANT_GRPC_KEEPALIVE_SECONDS: gRPCチャネルのkeepalive間隔（デフォルト: 30）
+    QDRANT_GRPC_MAX_MESSAGE_MB: gRPCで送受信できるメッセージの上限（デフォルト: 64）
+    """
+    timeout = os.getenv("QDRANT_TIMEOUT")
+    options = {"timeout": int(timeout)} if timeout else {}
+
+    if prefer_grpc:
+        max_message = int(os.getenv("QDRANT_GRPC_MAX_MESSAGE_MB", "64")) * 1024 * 1024
+        return QdrantClient(
+            url=url,
+            prefer_grpc=True,
+            grpc_port=int(os.getenv("QDRANT_GRPC_PORT", "6334")),
+            grpc_options={
+                "grpc.keepalive_time_ms": int(os.getenv("QDRANT_GRPC_KEEPALIVE_SECONDS", "30")) * 1000,
+                "grpc.keepalive_permit_without_calls": 1,
+                "grpc.max_send_message_length": max_message,
+                "grpc.max_receive_message_length": max_message,
+            },
+            **options
+        )
+
+    pool_size = int(os.getenv("QDRANT_POOL_SIZE", "32"))
+    return QdrantClient(
+        url=url,
+        limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+        **options
+    )
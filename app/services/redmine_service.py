@@ -1,5 +1,6 @@
 import os
-from typing import List, Optional
+from datetime import datetime
+from typing import Dict, List, Optional
 from redminelib import Redmine
 from redminelib.resources import Issue
 from dotenv import load_dotenv
@@ -60,6 +61,38 @@ class RedmineService:
                     resolution = journal.notes
                     break
 
+        return self._issue_to_dict(issue, resolution)
+
+    def get_ticket_details_bulk(self, ticket_ids: List[int]) -> Dict[int, dict]:
+        """
+        複数チケットの詳細情報を1回のAPI呼び出しでまとめて取得
+
+        一覧APIはジャーナルを返さないため resolution は空文字になる
+        （解決策は検索結果のペイロードのものを使う）。
+
+        Args:
+            ticket_ids: チケットIDのリスト
+
+        Returns:
+            {チケットID: チケット情報の辞書}（見つからないチケットは含まない）
+        """
+        ticket_ids = sorted({int(t) for t in ticket_ids if t is not None})
+        if not ticket_ids:
+            return {}
+        try:
+            issues = self.redmine.issue.filter(
+                issue_id=",".join(str(t) for t in ticket_ids),
+                status_id='*',
+                limit=len(ticket_ids)
+            )
+            return {issue.id: self._issue_to_dict(issue, "") for issue in issues}
+        except Exception as e:
+            print(f"Error fetching tickets {ticket_ids[:5]}...: {e}")
+            return {}
+
+    @staticmethod
+    def _issue_to_dict(issue: Issue, resolution: str) -> dict:
+        """Issue をチケット情報の辞書に変換"""
         return {
             "ticket_id": issue.id,
             "subject": issue.subject,
@@ -76,13 +109,19 @@ class RedmineService:
             "project": issue.project.name if hasattr(issue, 'project') else None,
         }
 
-    def get_closed_tickets(self, limit: Optional[int] = None, offset: int = 0) -> List[Issue]:
+    def get_closed_tickets(
+        self,
+        limit: Optional[int] = None,
+        offset: int = 0,
+        sort: Optional[str] = None
+    ) -> List[Issue]:
         """
         チケットを取得（status_id指定なし = Redmineのデフォルト動作）
 
         Args:
             limit: 取得件数上限（Noneの場合は全件）
             offset: オフセット
+            sort: ソート順（例: "id"、Noneの場合はRedmineのデフォルト）
 
         Returns:
             チケットのリスト
@@ -100,6 +139,9 @@ class RedmineService:
             if offset > 0:
                 params['offset'] = offset
 
+            if sort:
+                params['sort'] = sort
+
             # プロジェクト指定がある場合
             if self.project_id:
                 params['project_id'] = self.project_id
@@ -118,35 +160,122 @@ class RedmineService:
             print(f"Error fetching tickets: {e}")
             return []
 
-    def get_all_closed_tickets_iter(self, batch_size: int = 100):
+    def iter_ticket_pages(self, batch_size: int = 100, offset: int = 0):
+        """
+        すべてのチケットをページ単位で取得（チェックポイントからの再開用）
+
+        ID昇順で取得するため、走査中に新規チケットが登録されても
+        既存ページのオフセットはずれない。
+
+        Args:
+            batch_size: 1回のAPIコールで取得する件数
+            offset: 開始オフセット
+
+        Yields:
+            (ページ先頭のオフセット, チケットのリスト)
+        """
+        while True:
+            tickets = self.get_closed_tickets(limit=batch_size, offset=offset, sort='id')
+            if not tickets:
+                break
+
+            yield offset, tickets
+
+            offset += len(tickets)
+
+            # 全件取得完了チェック
+            if len(tickets) < batch_size:
+                break
+
+    def get_all_closed_tickets_iter(self, batch_size: int = 100, offset: int = 0):
         """
         すべてのチケットをイテレータで取得（全ステータス、大量データ対応）
 
         Args:
             batch_size: 1回のAPIコールで取得する件数
+            offset: 開始オフセット
 
         Yields:
             チケットオブジェクト
         """
+        for _, tickets in self.iter_ticket_pages(batch_size=batch_size, offset=offset):
+            for ticket in tickets:
+                yield ticket
+
+    @staticmethod
+    def format_timestamp(value: datetime) -> str:
+        """Redmineのフィルタ用にUTC日時を文字列化（例: 2024-10-01T09:30:00Z）"""
+        return value.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+    def get_updated_tickets_iter(
+        self,
+        since: str,
+        batch_size: int = 100,
+        scoped: bool = True
+    ):
+        """
+        指定日時以降に更新されたチケットを更新日時の昇順でイテレータ取得
+
+        オフセットではなく「最後に見た更新日時」を起点に次ページを取得するため、
+        走査中に更新されたチケットが末尾に移動してもチケットを取りこぼさない
+        （同じチケットが2回返ることはある）。
+
+        Args:
+            since: この日時以降（>=）に更新されたチケットを取得（例: 2024-10-01T09:30:00Z）
+            batch_size: 1回のAPIコールで取得する件数
+            scoped: Trueの場合はREDMINE_PROJECT_ID / REDMINE_TRACKER_IDで絞り込む
+
+        Yields:
+            チケットオブジェクト
+        """
+        cursor = since
         offset = 0
+
         while True:
-            tickets = self.get_closed_tickets(limit=batch_size, offset=offset)
+            params = {
+                'status_id': '*',
+                'updated_on': f'>={cursor}',
+                'sort': 'updated_on,id',
+                'limit': batch_size,
+            }
+            if offset > 0:
+                params['offset'] = offset
+            if scoped and self.project_id:
+                params['project_id'] = self.project_id
+            if scoped and self.tracker_id:
+                params['tracker_id'] = self.tracker_id
+
+            try:
+                tickets = list(self.redmine.issue.filter(**params))
+            except Exception as e:
+                print(f"Error fetching updated tickets: {e}")
+                raise
+
             if not tickets:
                 break
 
             for ticket in tickets:
                 yield ticket
 
-            offset += batch_size
-
-            # 全件取得完了チェック
             if len(tickets) < batch_size:
                 break
 
+            # 次ページの起点を最後のチケットの更新日時に進める
+            last = self.format_timestamp(tickets[-1].updated_on)
+            if last == cursor:
+                # 同一秒に大量の更新がある場合はオフセットで読み進める
+                offset += len(tickets)
+            else:
+                cursor = last
+                offset = sum(1 for t in tickets if self.format_timestamp(t.updated_on) == last)
+
     def search_tickets_by_keyword(self, keyword: str, limit: int = 10) -> List[Issue]:
         """
         キーワードでチケットを検索（従来型検索）
 
+        Redmineの件名 LIKE 検索のため遅い。インデックス済みのチケットは
+        VectorService.search_by_keyword（スパースベクトル）で説明・コメントも含めて高速に検索できる。
+
         Args:
             keyword: 検索キーワード
             limit: 取得件数上限
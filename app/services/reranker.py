@@ -0,0 +1,189 @@
+"""
+ローカルCPUで動くクロスエンコーダによる検索結果の再ランキング
+
+ベクトル検索の順位はクエリとチケットを別々にベクトル化したコサイン類似度なので、
+(クエリ, チケット) のペアをまとめて読むクロスエンコーダで上位候補を並べ替える。
+LLMで1件ずつ重要度を評価するより桁違いに速い（10件で数十ミリ秒程度）。
+
+モデルは ONNX 形式（量子化版があればそちらを優先）を RERANK_MODEL_PATH のディレクトリに置く:
+    {RERANK_MODEL_PATH}/model_quantized.onnx（または model.onnx）
+    {RERANK_MODEL_PATH}/tokenizer.json
+
+依存パッケージ（onnxruntime, tokenizers, numpy）はオプション。
+無効・未インストール・モデルなし・時間切れ・エラーの場合は、ベクトル検索の順位をそのまま返す。
+"""
+
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+
+class CrossEncoderReranker:
+    """ONNXクロスエンコーダによる再ランキング（失敗時はベクトル順にフォールバック）"""
+
+    def __init__(
+        self,
+        model_path: Optional[str] = None,
+        enabled: Optional[bool] = None,
+        budget_ms: Optional[float] = None,
+        batch_size: Optional[int] = None,
+        max_length: Optional[int] = None
+    ):
+        """
+        Args:
+            model_path: モデルのディレクトリ（省略時は RERANK_MODEL_PATH）
+            enabled: 再ランキングを行うか（省略時は RERANK_ENABLED、デフォルト: false）
+            budget_ms: 1回の再ランキングにかけてよい時間（省略時は RERANK_BUDGET_MS、デフォルト: 200）
+            batch_size: 1回の推論でまとめるペア数（省略時は RERANK_BATCH_SIZE、デフォルト: 16）
+            max_length: ペアの最大トークン数（省略時は RERANK_MAX_LENGTH、デフォルト: 256）
+        """
+        if enabled is None:
+            enabled = os.getenv("RERANK_ENABLED", "false").lower() == "true"
+        self.enabled = enabled
+        self.model_path = Path(model_path or os.getenv("RERANK_MODEL_PATH", "models/reranker"))
+        self.budget_ms = budget_ms if budget_ms is not None else float(os.getenv("RERANK_BUDGET_MS", "200"))
+        self.batch_size = batch_size or int(os.getenv("RERANK_BATCH_SIZE", "16"))
+        self.max_length = max_length or int(os.getenv("RERANK_MAX_LENGTH", "256"))
+        self.threads = int(os.getenv("RERANK_THREADS", "2"))
+
+        # ベクトル検索で多めに取る候補数の倍率（limit × この値を並べ替えて上位 limit 件を返す）
+        self.candidate_factor = int(os.getenv("RERANK_CANDIDATE_FACTOR", "3"))
+
+        self._session = None
+        self._tokenizer = None
+        self._input_names = set()
+        self._load_lock = threading.Lock()
+        self._load_failed = False
+
+    @property
+    def available(self) -> bool:
+        """再ランキングできる状態か（必要ならモデルを読み込む）"""
+        return self.enabled and self._load()
+
+    def warmup(self):
+        """モデルを読み込み、1回推論しておく（初回検索が時間切れにならないように）"""
+        if not self.available:
+            return
+        started = time.perf_counter()
+        self._score("warmup", ["warmup"])
+        print(f"✓ Reranker ready ({(time.perf_counter() - started) * 1000:.0f} ms)")
+
+    def _load(self) -> bool:
+        """ONNXモデルとトークナイザを読み込む（1回だけ）"""
+        if self._session is not None:
+            return True
+        if self._load_failed:
+            return False
+
+        with self._load_lock:
+            if self._session is not None:
+                return True
+            if self._load_failed:
+                return False
+            try:
+                import onnxruntime as ort
+                from tokenizers import Tokenizer
+            except ImportError as e:
+                print(f"⚠️  Reranker disabled: {e}（pip install onnxruntime tokenizers numpy）")
+                self._load_failed = True
+                return False
+
+            model_file = self.model_path / "model_quantized.onnx"
+            if not model_file.exists():
+                model_file = self.model_path / "model.onnx"
+            tokenizer_file = self.model_path / "tokenizer.json"
+            if not model_file.exists() or not tokenizer_file.exists():
+                print(f"⚠️  Reranker disabled: model not found in {self.model_path}")
+                self._load_failed = True
+                return False
+
+            try:
+                options = ort.SessionOptions()
+                options.intra_op_num_threads = self.threads
+                options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+                session = ort.InferenceSession(
+                    str(model_file),
+                    sess_options=options,
+                    providers=["CPUExecutionProvider"]
+                )
+
+                tokenizer = Tokenizer.from_file(str(tokenizer_file))
+                tokenizer.enable_truncation(max_length=self.max_length)
+                tokenizer.enable_padding()
+            except Exception as e:
+                print(f"⚠️  Reranker disabled: failed to load {model_file}: {e}")
+                self._load_failed = True
+                return False
+
+            self._tokenizer = tokenizer
+            self._input_names = {i.name for i in session.get_inputs()}
+            self._session = session
+            print(f"✓ Reranker loaded: {model_file}")
+            return True
+
+    def _score(self, query: str, texts: List[str]) -> List[float]:
+        """(query, text) のペアをまとめて推論し、関連度（0〜1）を返す"""
+        import numpy as np
+
+        encodings = self._tokenizer.encode_batch([(query, text) for text in texts])
+        feeds = {
+            "input_ids": np.array([e.ids for e in encodings], dtype=np.int64),
+            "attention_mask": np.array([e.attention_mask for e in encodings], dtype=np.int64)
+        }
+        if "token_type_ids" in self._input_names:
+            feeds["token_type_ids"] = np.array([e.type_ids for e in encodings], dtype=np.int64)
+
+        logits = self._session.run(None, feeds)[0]
+        if logits.ndim == 2 and logits.shape[1] > 1:
+            # 2クラス分類（無関係 / 関係あり）のモデル
+            exp = np.exp(logits - logits.max(axis=1, keepdims=True))
+            return (exp[:, -1] / exp.sum(axis=1)).tolist()
+        return (1.0 / (1.0 + np.exp(-logits.reshape(-1)))).tolist()
+
+    @staticmethod
+    def ticket_text(ticket: Dict) -> str:
+        """チケットからクロスエンコーダに渡すテキストを作る（件名 + 一致したチャンクまたは説明）"""
+        body = ticket.get("matched_text") or ticket.get("description") or ""
+        resolution = ticket.get("resolution") or ""
+        text = f"{ticket.get('subject') or ''}\n{body}"
+        if resolution and resolution not in body:
+            text += f"\n{resolution}"
+        return text
+
+    def rerank(self, query: str, tickets: List[Dict], limit: Optional[int] = None) -> List[Dict]:
+        """
+        チケットを (query, チケット) の関連度順に並べ替える
+
+        時間予算（budget_ms）を超えた場合やエラーの場合は、受け取った順序（ベクトル検索順）のまま返す。
+        並べ替えた場合は各チケットに rerank_score（0〜1）を付ける。
+
+        Args:
+            query: 検索クエリ
+            tickets: ベクトル検索の結果（類似度順）
+            limit: 返す件数（省略時はすべて）
+
+        Returns:
+            並べ替えたチケットのリスト
+        """
+        if not tickets or not self.available:
+            return tickets[:limit] if limit else tickets
+
+        started = time.perf_counter()
+        texts = [self.ticket_text(t) for t in tickets]
+        scores = []
+        try:
+            for start in range(0, len(texts), self.batch_size):
+                scores.extend(self._score(query, texts[start:start + self.batch_size]))
+                elapsed_ms = (time.perf_counter() - started) * 1000
+                if elapsed_ms > self.budget_ms and len(scores) < len(texts):
+                    print(f"⚠️  Rerank budget exceeded ({elapsed_ms:.0f} ms), using vector order")
+                    return tickets[:limit] if limit else tickets
+        except Exception as e:
+            print(f"⚠️  Rerank failed, using vector order: {e}")
+            return tickets[:limit] if limit else tickets
+
+        ranked = sorted(zip(tickets, scores), key=lambda pair: pair[1], reverse=True)
+        results = [{**ticket, "rerank_score": score} for ticket, score in ranked]
+        return results[:limit] if limit else results
@@ -0,0 +1,173 @@
+"""
+検索結果のほぼ重複したチケットの集約とMMRによる多様化
+
+同じアラートが繰り返し起票されると、ほとんど同じ内容のチケット
+（"disk usage over 90% on web-prod-01" など）が上位を埋めてしまう。
+検索時に返したベクトルを使って
+    1. インデックス時に割り当てた同じクラスタ（cluster_id）のチケットを代表1件にまとめる
+    2. ほぼ重複したチケットを代表1件にまとめる（duplicate_count / duplicate_ticket_ids を付ける）
+    3. 残りを MMR（Maximal Marginal Relevance）で関連度と多様性のバランスを取って選ぶ
+ことで、返すチケット数とLLMに渡すトークン数を減らす。
+"""
+
+import os
+from typing import Dict, List, Optional
+
+import numpy as np
+
+
+def _normalize(vectors: List[List[float]]) -> np.ndarray:
+    """行ごとにL2正規化（コサイン類似度を内積で計算するため）"""
+    matrix = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def _relevance(result: Dict) -> float:
+    """並べ替えに使う関連度（再ランキング済みならそのスコア）"""
+    return result.get("rerank_score", result.get("similarity", 0.0))
+
+
+def collapse_clusters(results: List[Dict]) -> List[Dict]:
+    """
+    同じクラスタ（cluster_id）のチケットを、関連度の高い方を代表にして1件にまとめる
+
+    Args:
+        results: 関連度順の検索結果
+
+    Returns:
+        クラスタごとの代表（duplicate_count / duplicate_ticket_ids 付き）
+    """
+    representatives: Dict[int, Dict] = {}
+    collapsed = []
+    for result in results:
+        cluster_id = result.get("cluster_id")
+        representative = representatives.get(cluster_id) if cluster_id is not None else None
+        if representative is not None:
+            representative["duplicate_count"] += 1
+            representative["duplicate_ticket_ids"].append(result.get("ticket_id"))
+            continue
+
+        representative = {**result, "duplicate_count": 0, "duplicate_ticket_ids": []}
+        if cluster_id is not None:
+            representatives[cluster_id] = representative
+        collapsed.append(representative)
+    return collapsed
+
+
+def collapse_near_duplicates(
+    results: List[Dict],
+    vectors: List[List[float]],
+    threshold: float
+) -> tuple:
+    """
+    ほぼ重複したチケットを、関連度の高い方を代表にして1件にまとめる
+
+    Args:
+        results: 関連度順の検索結果
+        vectors: results と同じ順のベクトル
+        threshold: 重複とみなすコサイン類似度
+
+    Returns:
+        (代表の検索結果, 代表のベクトル行列)。代表には duplicate_count と duplicate_ticket_ids を付ける
+    """
+    matrix = _normalize(vectors)
+    representatives = []
+    rep_rows = []
+
+    for row, result in enumerate(results):
+        if rep_rows:
+            similarities = matrix[rep_rows] @ matrix[row]
+            best = int(np.argmax(similarities))
+            if similarities[best] >= threshold:
+                representative = representatives[best]
+                representative["duplicate_count"] += 1 + result.get("duplicate_count", 0)
+                representative["duplicate_ticket_ids"].append(result.get("ticket_id"))
+                representative["duplicate_ticket_ids"].extend(result.get("duplicate_ticket_ids", []))
+                continue
+
+        representatives.append({
+            **result,
+            "duplicate_count": result.get("duplicate_count", 0),
+            "duplicate_ticket_ids": list(result.get("duplicate_ticket_ids", []))
+        })
+        rep_rows.append(row)
+
+    return representatives, matrix[rep_rows]
+
+
+def mmr_select(results: List[Dict], matrix: np.ndarray, limit: int, mmr_lambda: float) -> List[Dict]:
+    """
+    MMRで関連度と多様性のバランスを取りながら limit 件を選ぶ
+
+    score = λ × 関連度 − (1 − λ) × 選択済みチケットとの最大類似度
+
+    Args:
+        results: 検索結果
+        matrix: results と同じ順の正規化済みベクトル
+        limit: 選ぶ件数
+        mmr_lambda: 関連度の重み（1.0 で関連度順のまま、小さいほど多様性を重視）
+
+    Returns:
+        選んだ順の検索結果
+    """
+    if not results:
+        return []
+
+    relevance = np.array([_relevance(r) for r in results], dtype=np.float32)
+    remaining = list(range(len(results)))
+    selected = []
+    # 選択済みチケットとの最大類似度（未選択の間は0）
+    max_similarity = np.zeros(len(results), dtype=np.float32)
+
+    while remaining and len(selected) < limit:
+        scores = mmr_lambda * relevance[remaining] - (1 - mmr_lambda) * max_similarity[remaining]
+        chosen = remaining.pop(int(np.argmax(scores)))
+        selected.append(chosen)
+        max_similarity = np.maximum(max_similarity, matrix @ matrix[chosen])
+
+    return [results[i] for i in selected]
+
+
+def diversify(
+    results: List[Dict],
+    vectors: List[Optional[List[float]]],
+    limit: int,
+    mmr_lambda: Optional[float] = None,
+    duplicate_threshold: Optional[float] = None
+) -> List[Dict]:
+    """
+    ほぼ重複したチケットを集約し、MMRで limit 件を選ぶ
+
+    Args:
+        results: 関連度順の検索結果（limit より多めに渡す）
+        vectors: results と同じ順のベクトル（取得できなかったものは None）
+        limit: 返す件数
+        mmr_lambda: MMRの関連度の重み（省略時は SEARCH_MMR_LAMBDA、デフォルト: 0.7）
+        duplicate_threshold: 重複とみなすコサイン類似度（省略時は SEARCH_DUPLICATE_THRESHOLD、デフォルト: 0.95）
+
+    Returns:
+        多様化した検索結果（各チケットに duplicate_count / duplicate_ticket_ids を付ける）
+    """
+    if mmr_lambda is None:
+        mmr_lambda = float(os.getenv("SEARCH_MMR_LAMBDA", "0.7"))
+    if duplicate_threshold is None:
+        duplicate_threshold = float(os.getenv("SEARCH_DUPLICATE_THRESHOLD", "0.95"))
+
+    # ベクトルのないヒットは比較できないので、多様化の対象から外して後ろに回す
+    paired = [(r, v) for r, v in zip(results, vectors) if v is not None]
+    if not paired:
+        return results[:limit]
+
+    representatives, matrix = collapse_near_duplicates(
+        [r for r, _ in paired], [v for _, v in paired], duplicate_threshold
+    )
+    selected = mmr_select(representatives, matrix, limit, mmr_lambda)
+
+    if len(selected) < limit:
+        selected.extend(
+            {**r, "duplicate_count": r.get("duplicate_count", 0), "duplicate_ticket_ids": r.get("duplicate_ticket_ids", [])}
+            for r, v in zip(results, vectors) if v is None
+        )
+    return selected[:limit]
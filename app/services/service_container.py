@@ -0,0 +1,87 @@
+"""
+APIサーバーで共有するクライアント・サービスの生成と保持
+
+各サービスがそれぞれ VectorService / RedmineService / LLMService を生成すると、
+Qdrant・OpenAI・Redmineのクライアントがサービスの数だけでき、起動時のコレクション確認
+（_ensure_collection）も重複する。コンテナは1つずつだけ生成し、依存するサービスに渡す。
+
+生成は初回参照時に行い、サービスごとの生成時間を記録する（/health の services で確認できる）。
+"""
+
+import os
+import threading
+import time
+from typing import Callable, Dict
+
+from openai import OpenAI
+
+from app.services.intelligent_search import IntelligentSearchService
+from app.services.llm_service import LLMService
+from app.services.procedure_assistant_service import ProcedureAssistantService
+from app.services.redmine_service import RedmineService
+from app.services.ticket_indexer import TicketIndexer
+from app.services.vector_service import VectorService
+
+
+class ServiceContainer:
+    """プロセス内で共有するクライアント・サービス"""
+
+    def __init__(self):
+        self._instances: Dict[str, object] = {}
+        # サービスの生成中に依存サービスを参照するので再入可能なロックにする
+        self._lock = threading.RLock()
+        self.init_seconds: Dict[str, float] = {}
+
+    def _get(self, name: str, factory: Callable[[], object]):
+        """生成済みならそれを返し、なければ生成して保持"""
+        with self._lock:
+            if name not in self._instances:
+                started = time.perf_counter()
+                self._instances[name] = factory()
+                # 依存サービスの生成時間も含む
+                self.init_seconds[name] = time.perf_counter() - started
+            return self._instances[name]
+
+    @property
+    def openai_client(self) -> OpenAI:
+        return self._get("openai_client", lambda: OpenAI(api_key=os.getenv("OPENAI_API_KEY")))
+
+    @property
+    def vector_service(self) -> VectorService:
+        return self._get("vector_service", lambda: VectorService(openai_client=self.openai_client))
+
+    @property
+    def redmine_service(self) -> RedmineService:
+        return self._get("redmine_service", RedmineService)
+
+    @property
+    def llm_service(self) -> LLMService:
+        return self._get("llm_service", lambda: LLMService(openai_client=self.openai_client))
+
+    @property
+    def ticket_indexer(self) -> TicketIndexer:
+        return self._get("ticket_indexer", lambda: TicketIndexer(self.vector_service, self.redmine_service))
+
+    @property
+    def intelligent_search_service(self) -> IntelligentSearchService:
+        return self._get("intelligent_search_service", lambda: IntelligentSearchService(
+            llm_service=self.llm_service,
+            vector_service=self.vector_service,
+            redmine_service=self.redmine_service
+        ))
+
+    @property
+    def procedure_assistant_service(self) -> ProcedureAssistantService:
+        return self._get("procedure_assistant_service", lambda: ProcedureAssistantService(
+            llm_service=self.llm_service,
+            vector_service=self.vector_service,
+            redmine_service=self.redmine_service
+        ))
+
+    def status(self) -> Dict:
+        """生成済みのサービスと生成時間（秒）"""
+        with self._lock:
+            return {
+                "instances": list(self._instances),
+                "init_seconds": {name: round(seconds, 3) for name, seconds in self.init_seconds.items()}
+            }
@@ -0,0 +1,115 @@
+"""
+日本語チケット向けのスパースベクトル（BM25）エンコーダ
+
+ホスト名・エラーコード・設定キー（web-prod-01, ORA-00257, named.conf など）は
+密ベクトル（Embedding）では取りこぼしやすいため、トークン一致で引けるスパースベクトルを
+インデックス時に作成して密ベクトルと一緒に保存する。
+
+トークン化（外部の形態素解析器なしでオフライン動作）:
+    - NFKC正規化・小文字化
+    - 英数字の識別子はそのまま1トークン（"named.conf", "ora-00257"）に加え、
+      記号で区切った部分（"named", "conf", "ora", "00257"）もトークンにする
+    - 日本語（ひらがな・カタカナ・漢字）の連続部分は文字bigram
+
+重み:
+    - ドキュメント: BM25のTF成分（k1, b と想定平均長で文書長を正規化）
+    - クエリ: 出現トークンごとに1.0
+    IDF はQdrantのスパースベクトル設定（modifier=IDF）でサーバー側が計算する。
+"""
+
+import hashlib
+import os
+import re
+import unicodedata
+from collections import Counter
+from typing import List, Tuple
+
+
+# 英数字の識別子（ホスト名、エラーコード、ファイル名、IPアドレスなど）
+_ASCII_TOKEN = re.compile(r"[a-z0-9_][a-z0-9_.\-/:@]*[a-z0-9_]|[a-z0-9_]")
+_ASCII_PART = re.compile(r"[a-z0-9_]+")
+
+# 日本語の連続部分（ひらがな・カタカナ・長音・漢字）
+_JAPANESE_RUN = re.compile(r"[ぁ-ゖァ-ヺー一-鿿々〆]+")
+
+
+class SparseEncoder:
+    """文字n-gram + 識別子トークンによるBM25スパースエンコーダ"""
+
+    def __init__(
+        self,
+        k1: float = 1.2,
+        b: float = 0.75,
+        avg_doc_length: float = None
+    ):
+        """
+        Args:
+            k1: BM25のTF飽和パラメータ
+            b: BM25の文書長正規化の強さ
+            avg_doc_length: 想定する平均トークン数（省略時は SPARSE_AVG_DOC_LENGTH、デフォルト: 300）
+        """
+        self.k1 = k1
+        self.b = b
+        self.avg_doc_length = avg_doc_length or float(os.getenv("SPARSE_AVG_DOC_LENGTH", "300"))
+
+    @staticmethod
+    def tokenize(text: str) -> List[str]:
+        """テキストをトークン列に分割"""
+        if not text:
+            return []
+
+        normalized = unicodedata.normalize("NFKC", text).lower()
+        tokens = []
+
+        for match in _ASCII_TOKEN.finditer(normalized):
+            token = match.group()
+            tokens.append(token)
+            parts = _ASCII_PART.findall(token)
+            if len(parts) > 1:
+                tokens.extend(parts)
+
+        for match in _JAPANESE_RUN.finditer(normalized):
+            run = match.group()
+            if len(run) == 1:
+                tokens.append(run)
+            else:
+                tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+
+        return tokens
+
+    @staticmethod
+    def token_index(token: str) -> int:
+        """トークンを32bitのインデックスにハッシュ（プロセス・マシン間で安定）"""
+        return int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=4).digest(), "big")
+
+    def encode_document(self, text: str) -> Tuple[List[int], List[float]]:
+        """
+        インデックス用のスパースベクトル
+
+        Returns:
+            (indices, values)
+        """
+        tokens = self.tokenize(text)
+        if not tokens:
+            return [], []
+
+        counts = Counter(tokens)
+        norm = self.k1 * (1 - self.b + self.b * len(tokens) / self.avg_doc_length)
+        weights = {}
+        for token, tf in counts.items():
+            index = self.token_index(token)
+            # ハッシュ衝突したトークンは重みを合算
+            weights[index] = weights.get(index, 0.0) + tf * (self.k1 + 1) / (tf + norm)
+
+        indices = sorted(weights)
+        return indices, [weights[i] for i in indices]
+
+    def encode_query(self, text: str) -> Tuple[List[int], List[float]]:
+        """
+        検索用のスパースベクトル（IDFはQdrant側で適用される）
+
+        Returns:
+            (indices, values)
+        """
+        indices = sorted({self.token_index(token) for token in self.tokenize(text)})
+        return indices, [1.0] * len(indices)
@@ -0,0 +1,284 @@
+"""
+差分同期サービス
+
+Redmineで更新されたチケットだけを updated_on の昇順で取得し、
+再ベクトル化してインデックスに反映する。処理済みの最大更新日時を
+ウォーターマークとしてファイルに保存し、次回はそこから再開する。
+
+- スコープ（REDMINE_PROJECT_ID / REDMINE_TRACKER_ID）外に移動したチケットは
+  インデックスから削除する
+- 失敗したチケットは状態ファイルに記録し、次回の同期で再試行する
+- SyncScheduler を使うとAPIプロセス内で定期実行できる
+"""
+
+import json
+import os
+import threading
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+from app.services.vector_service import VectorService
+from app.services.redmine_service import RedmineService
+from app.services.ticket_indexer import TicketIndexer, build_document
+from app.services.ticket_clusterer import TicketClusterer
+
+
+# ウォーターマーク未保存時の起点（＝全件同期）
+INITIAL_WATERMARK = "1970-01-01T00:00:00Z"
+
+
+class SyncStateStore:
+    """同期状態（ウォーターマーク等）をJSONファイルに永続化"""
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or os.getenv("SYNC_STATE_PATH", "data/sync_state.json")
+
+    def load(self) -> Dict:
+        """状態を読み込む（ファイルがなければ空の状態）"""
+        if not os.path.exists(self.path):
+            return {"watermark": None, "failed_ticket_ids": []}
+        with open(self.path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def save(self, state: Dict):
+        """一時ファイルに書いてからリネームし、途中で落ちても壊れないように保存"""
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.path)
+
+
+class DeltaSyncService:
+    """Redmine → Qdrant 差分同期"""
+
+    def __init__(
+        self,
+        vector_service: Optional[VectorService] = None,
+        redmine_service: Optional[RedmineService] = None,
+        state_store: Optional[SyncStateStore] = None,
+        batch_size: int = 100,
+        embed_batch_size: int = 32,
+        indexer: Optional[TicketIndexer] = None,
+        on_index_changed: Optional[Callable[[], None]] = None
+    ):
+        """
+        Args:
+            on_index_changed: 同期でチケットを更新・削除したあとに呼ぶ関数
+                              （検索結果のキャッシュの再計算など）
+        """
+        self.vector_service = vector_service or VectorService()
+        self.redmine_service = redmine_service or RedmineService()
+        self.indexer = indexer or TicketIndexer(self.vector_service, self.redmine_service)
+        self.state_store = state_store or SyncStateStore()
+        self.batch_size = batch_size
+        self.embed_batch_size = embed_batch_size
+        self.on_index_changed = on_index_changed
+
+        # 同期のあとに、更新したチケットをほぼ重複チケットのクラスタに割り当てる
+        self.cluster_on_sync = os.getenv("CLUSTER_ON_SYNC", "true").lower() == "true"
+        self.clusterer = TicketClusterer(self.vector_service)
+
+        self.last_result: Optional[Dict] = None
+        self._lock = threading.Lock()
+
+    def get_status(self) -> Dict:
+        """現在のウォーターマークと直近の同期結果"""
+        state = self.state_store.load()
+        return {
+            "watermark": state.get("watermark"),
+            "failed_ticket_ids": state.get("failed_ticket_ids", []),
+            "last_synced_at": state.get("last_synced_at"),
+            "running": self._lock.locked(),
+            "last_result": self.last_result
+        }
+
+    def sync(self, since: Optional[str] = None, dry_run: bool = False) -> Dict:
+        """
+        差分同期を実行
+
+        Args:
+            since: 起点日時（省略時は保存済みウォーターマーク）
+            dry_run: Trueの場合は対象の洗い出しのみ行い、インデックス・状態を更新しない
+
+        Returns:
+            {"since", "watermark", "updated", "unchanged", "deleted", "skipped", "errors",
+             "failed_ticket_ids", "elapsed"}
+        """
+        if not self._lock.acquire(blocking=False):
+            raise RuntimeError("Delta sync is already running")
+
+        try:
+            return self._sync(since, dry_run)
+        finally:
+            self._lock.release()
+
+    def _sync(self, since: Optional[str], dry_run: bool) -> Dict:
+        start_time = datetime.now()
+        state = self.state_store.load()
+        since = since or state.get("watermark") or INITIAL_WATERMARK
+        retry_ids = set(state.get("failed_ticket_ids", []))
+
+        print(f"Delta sync: updated_on >= {since}")
+
+        # 1. スコープ内で更新されたチケット（更新日時の昇順）
+        changed: Dict[int, str] = {}
+        watermark = since
+        for ticket in self.redmine_service.get_updated_tickets_iter(since, batch_size=self.batch_size):
+            updated_on = self.redmine_service.format_timestamp(ticket.updated_on)
+            changed[ticket.id] = updated_on
+            if updated_on > watermark:
+                watermark = updated_on
+
+        # 2. スコープ外に移動したチケット（絞り込みなしの更新分 − スコープ内の更新分。
+        #    インデックスにないものは削除の対象にしない）
+        out_of_scope: List[int] = []
+        if self.redmine_service.project_id or self.redmine_service.tracker_id:
+            for ticket in self.redmine_service.get_updated_tickets_iter(
+                since, batch_size=self.batch_size, scoped=False
+            ):
+                if ticket.id not in changed:
+                    out_of_scope.append(ticket.id)
+
+        # 前回失敗分も再処理対象に含める
+        target_ids = list(changed.keys()) + [tid for tid in retry_ids if tid not in changed]
+
+        print(f"  Changed: {len(changed)}, retry: {len(retry_ids)}, out of scope: {len(out_of_scope)}")
+
+        result = {
+            "since": since,
+            "watermark": watermark,
+            "updated": 0,
+            "deleted": 0,
+            "skipped": 0,
+            "unchanged": 0,
+            "errors": 0,
+            "failed_ticket_ids": [],
+            "dry_run": dry_run
+        }
+
+        if dry_run:
+            result["updated"] = len(target_ids)
+            result["deleted"] = len(self.vector_service.existing_ticket_ids(out_of_scope)) if out_of_scope else 0
+            result["elapsed"] = (datetime.now() - start_time).total_seconds()
+            self.last_result = result
+            return result
+
+        # 3. 変更チケットを再ベクトル化して書き込み
+        failed: List[int] = []
+
+        def on_write_error(points, error):
+            print(f"  ✗ {len(points)} 件の書き込みに失敗: {error}")
+            failed.extend(point.payload["ticket_id"] for point in points)
+
+        documents = []
+        with self.vector_service.point_writer(on_error=on_write_error) as writer:
+            for ticket_id in target_ids:
+                try:
+                    detail = self.indexer.fetch_detail(ticket_id)
+                except Exception as e:
+                    print(f"  ✗ チケット #{ticket_id} の取得に失敗: {e}")
+                    failed.append(ticket_id)
+                    continue
+
+                document = build_document(detail) if detail else None
+                if document is None:
+                    result["skipped"] += 1
+                    continue
+
+                documents.append(document)
+                if len(documents) >= self.embed_batch_size:
+                    self._embed_and_write(documents, writer, failed, result)
+                    documents = []
+
+            self._embed_and_write(documents, writer, failed, result)
+
+        # 4. スコープ外のチケットを削除
+        if out_of_scope:
+            try:
+                indexed = self.vector_service.existing_ticket_ids(out_of_scope)
+                self.vector_service.delete_tickets(indexed)
+                result["deleted"] = len(indexed)
+            except Exception as e:
+                print(f"  ✗ スコープ外チケットの削除に失敗: {e}")
+                result["errors"] += 1
+                # 削除できなかった場合はウォーターマークを進めず次回やり直す
+                watermark = since
+
+        result["failed_ticket_ids"] = sorted(set(failed))
+        result["errors"] += len(result["failed_ticket_ids"])
+        result["updated"] = (
+            len(target_ids) - result["skipped"] - result["unchanged"] - len(result["failed_ticket_ids"])
+        )
+        result["watermark"] = watermark
+
+        # 5. 更新したチケットをクラスタに割り当て（失敗しても次回の同期で再処理される）
+        if self.cluster_on_sync and result["updated"]:
+            try:
+                clustered = self.clusterer.assign_pending()
+                result["clustered"] = clustered["processed"]
+            except Exception as e:
+                print(f"  ⚠️  クラスタ割り当てに失敗: {e}")
+
+        result["elapsed"] = (datetime.now() - start_time).total_seconds()
+
+        # 6. ウォーターマークを保存（書き込み完了後に保存するので、落ちても取りこぼさない）
+        self.state_store.save({
+            "watermark": watermark,
+            "failed_ticket_ids": result["failed_ticket_ids"],
+            "last_synced_at": datetime.now().isoformat(),
+            "last_result": result
+        })
+
+        print(
+            f"Delta sync done: updated={result['updated']}, unchanged={result['unchanged']}, "
+            f"deleted={result['deleted']}, skipped={result['skipped']}, errors={result['errors']}, watermark={watermark}"
+        )
+
+        if self.on_index_changed and (result["updated"] or result["deleted"]):
+            self.on_index_changed()
+
+        self.last_result = result
+        return result
+
+    def _embed_and_write(self, documents: List[dict], writer, failed: List[int], result: Dict):
+        """ドキュメントをまとめてベクトル化してライターに追加（内容が変わっていないものは省略）"""
+        written = self.indexer.write_documents(documents, writer)
+        result["unchanged"] += len(written["unchanged"])
+        failed.extend(written["failed"])
+
+
+class SyncScheduler:
+    """APIプロセス内で差分同期を定期実行するバックグラウンドスレッド"""
+
+    def __init__(self, sync_service: DeltaSyncService, interval_seconds: int = 300):
+        self.sync_service = sync_service
+        self.interval_seconds = interval_seconds
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="delta-sync", daemon=True)
+        self._thread.start()
+        print(f"✓ Delta sync scheduler started (every {self.interval_seconds}s)")
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.sync_service.sync()
+            except RuntimeError as e:
+                # 手動実行と重なった場合はスキップ
+                print(f"Delta sync skipped: {e}")
+            except Exception as e:
+                print(f"Delta sync error: {e}")
+            self._stop.wait(self.interval_seconds)
@@ -0,0 +1,301 @@
+"""
+ほぼ重複したチケットのクラスタリング（SimHash）
+
+繰り返し起票されるアラートのチケットは、件名・説明がほとんど同じになる。
+インデックス時に件名＋説明から64bitのSimHashを作ってペイロードに保存し、
+ハミング距離が閾値以下のチケットを同じクラスタにまとめる。
+
+ペイロード（チケットのすべてのチャンクに同じ値を持たせる）:
+    simhash               SimHash（16進文字列）
+    simhash_bands         SimHashを16bitずつ4つに分けた値（近傍候補の検索用、帯番号付き）
+    cluster_id            クラスタID（クラスタ内の最小のチケットID）
+    cluster_size          クラスタのチケット数
+    cluster_canonical_id  クラスタの代表チケット（解決策があり、最も新しく完了したもの）
+    cluster_pending       クラスタ未割り当て（インデックス直後は True、1件だけのクラスタ扱い）
+
+ハミング距離が3以下なら4つの帯のどれかは必ず一致するので、帯の一致で候補を絞ってから距離を確認する。
+"""
+
+import hashlib
+import os
+from collections import Counter
+from typing import Dict, Iterator, List, Optional, Set
+
+from qdrant_client.models import FieldCondition, Filter, FilterSelector, MatchAny, MatchValue, Range
+
+from app.services.sparse_encoder import SparseEncoder
+
+
+SIMHASH_BITS = 64
+SIMHASH_BAND_BITS = 16
+
+
+def compute_simhash(text: str) -> int:
+    """
+    テキストの64bit SimHash（トークンはスパースベクトルと同じ分割、出現回数で重み付け）
+
+    数字だけのトークン（使用率・件数・時刻など、同じアラートでも毎回変わる値）は除く。
+    """
+    counts = Counter(token for token in SparseEncoder.tokenize(text) if not token.isdigit())
+    if not counts:
+        return 0
+
+    weights = [0] * SIMHASH_BITS
+    for token, count in counts.items():
+        value = int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest(), "big")
+        for bit in range(SIMHASH_BITS):
+            weights[bit] += count if value >> bit & 1 else -count
+
+    return sum(1 << bit for bit in range(SIMHASH_BITS) if weights[bit] > 0)
+
+
+def simhash_bands(simhash: int) -> List[int]:
+    """SimHashを16bitずつの帯に分ける（帯番号を上位ビットに付けて、別の帯の値と区別する）"""
+    mask = (1 << SIMHASH_BAND_BITS) - 1
+    return [
+        band << SIMHASH_BAND_BITS | (simhash >> (band * SIMHASH_BAND_BITS) & mask)
+        for band in range(SIMHASH_BITS // SIMHASH_BAND_BITS)
+    ]
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+def cluster_payload(ticket_id: int, subject: str, description: str) -> dict:
+    """インデックス時にペイロードに加える項目（クラスタは未割り当て＝自分だけのクラスタ）"""
+    simhash = compute_simhash(f"{subject}\n{description}")
+    return {
+        "simhash": f"{simhash:016x}",
+        "simhash_bands": simhash_bands(simhash),
+        "cluster_id": ticket_id,
+        "cluster_size": 1,
+        "cluster_canonical_id": ticket_id,
+        "cluster_pending": True
+    }
+
+
+# 親ポイント（先頭チャンク）だけを対象にする条件
+_PARENT_ONLY = FieldCondition(key="chunk_index", range=Range(gt=0))
+
+_CLUSTER_FIELDS = [
+    "ticket_id", "subject", "description", "resolution", "has_resolution", "closed_on",
+    "simhash", "cluster_id", "cluster_size", "cluster_canonical_id", "cluster_pending"
+]
+
+
+class TicketClusterer:
+    """SimHashによるほぼ重複チケットのクラスタ割り当て"""
+
+    def __init__(self, vector_service, threshold: Optional[int] = None):
+        """
+        Args:
+            vector_service: VectorService
+            threshold: 同じクラスタとみなすハミング距離（省略時は CLUSTER_HAMMING_THRESHOLD、デフォルト: 3）
+        """
+        self.vector_service = vector_service
+        self.qdrant = vector_service.qdrant
+        self.threshold = threshold if threshold is not None else int(os.getenv("CLUSTER_HAMMING_THRESHOLD", "3"))
+
+    @property
+    def collection_name(self) -> str:
+        return self.vector_service.collection_name
+
+    def _scroll_parents(self, must: Optional[list] = None, batch_size: int = 256) -> Iterator:
+        """条件に合う親ポイントをすべて取得"""
+        offset = None
+        while True:
+            records, offset = self.qdrant.scroll(
+                collection_name=self.collection_name,
+                scroll_filter=Filter(must=must, must_not=[_PARENT_ONLY]),
+                limit=batch_size,
+                offset=offset,
+                with_payload=_CLUSTER_FIELDS,
+                with_vectors=False
+            )
+            yield from records
+            if offset is None:
+                break
+
+    @staticmethod
+    def _simhash(payload: dict) -> int:
+        """ペイロードのSimHash（機能追加前にインデックスしたポイントは件名・説明から計算）"""
+        if payload.get("simhash"):
+            return int(payload["simhash"], 16)
+        return compute_simhash(f"{payload.get('subject') or ''}\n{payload.get('description') or ''}")
+
+    def _set_ticket_payload(self, key: str, values: List[int], payload: dict):
+        """指定したチケット（またはクラスタ）のすべてのチャンクにペイロードを設定"""
+        self.qdrant.set_payload(
+            collection_name=self.collection_name,
+            payload=payload,
+            points=FilterSelector(filter=Filter(must=[FieldCondition(key=key, match=MatchAny(any=values))])),
+            wait=True
+        )
+
+    @staticmethod
+    def _canonical(members: List[dict]) -> int:
+        """クラスタの代表チケット（解決策があり最も新しく完了したもの、なければクラスタID）"""
+        # 解決策の本文をドキュメントストアに移したポイントは has_resolution で判定する
+        resolved = [m for m in members if m.get("has_resolution") or (m.get("resolution") or "").strip()]
+        if not resolved:
+            return min(m["ticket_id"] for m in members)
+        return max(resolved, key=lambda m: (m.get("closed_on") or "", m["ticket_id"]))["ticket_id"]
+
+    def _refresh_clusters(self, cluster_ids: Set[int]):
+        """クラスタのサイズと代表チケットを数え直して、メンバー全員のペイロードに反映"""
+        for cluster_id in cluster_ids:
+            members = [
+                r.payload for r in self._scroll_parents(
+                    must=[FieldCondition(key="cluster_id", match=MatchValue(value=cluster_id))]
+                )
+            ]
+            if not members:
+                continue
+            self._set_ticket_payload("cluster_id", [cluster_id], {
+                "cluster_size": len(members),
+                "cluster_canonical_id": self._canonical(members)
+            })
+
+    def _neighbors(self, ticket_id: int, simhash: int) -> List[dict]:
+        """SimHashのハミング距離が閾値以下の他のチケット"""
+        candidates = self._scroll_parents(must=[
+            FieldCondition(key="simhash_bands", match=MatchAny(any=simhash_bands(simhash)))
+        ])
+        return [
+            r.payload for r in candidates
+            if r.payload.get("ticket_id") != ticket_id
+            and hamming_distance(simhash, self._simhash(r.payload)) <= self.threshold
+        ]
+
+    def assign_pending(self, limit: Optional[int] = None) -> Dict:
+        """
+        インデックス後にクラスタ未割り当てのチケットを、近傍チケットのクラスタに統合（差分処理）
+
+        近傍が複数のクラスタにまたがる場合は、それらを最小のクラスタIDに統合する。
+        再インデックスで内容が変わったチケットが抜けたクラスタは、残りのメンバーでIDを付け直す
+        （抜けたクラスタのサイズや削除されたチケットの反映は recompute_all で行う）。
+
+        Args:
+            limit: 処理する最大件数（省略時はすべて）
+
+        Returns:
+            {"processed": 処理件数, "merged": 他のチケットと同じクラスタになった件数,
+             "clusters": サイズを更新したクラスタ数}
+        """
+        pending = FieldCondition(key="cluster_pending", match=MatchValue(value=True))
+        result = {"processed": 0, "merged": 0, "clusters": 0}
+        touched: Set[int] = set()
+
+        # 処理中にペイロードを書き換えるので、先に対象を確定させる
+        targets = []
+        for record in self._scroll_parents(must=[pending]):
+            targets.append(record.payload)
+            if limit and len(targets) >= limit:
+                break
+
+        for payload in targets:
+            ticket_id = payload["ticket_id"]
+            simhash = self._simhash(payload)
+
+            # このチケットが以前いたクラスタ（IDがこのチケットのもの）に他のメンバーが残っていれば付け直す
+            former = [
+                r.payload["ticket_id"] for r in self._scroll_parents(
+                    must=[FieldCondition(key="cluster_id", match=MatchValue(value=ticket_id))]
+                ) if r.payload["ticket_id"] != ticket_id
+            ]
+            if former:
+                self._set_ticket_payload("ticket_id", former, {"cluster_id": min(former)})
+                touched.add(min(former))
+
+            neighbors = self._neighbors(ticket_id, simhash)
+            cluster_ids = {n.get("cluster_id", n["ticket_id"]) for n in neighbors}
+            target_id = min(cluster_ids | {ticket_id})
+
+            # 近傍のクラスタを1つに統合
+            merging = sorted(cluster_ids - {target_id})
+            if merging:
+                self._set_ticket_payload("cluster_id", merging, {"cluster_id": target_id})
+
+            self._set_ticket_payload("ticket_id", [ticket_id], {
+                "simhash": f"{simhash:016x}",
+                "simhash_bands": simhash_bands(simhash),
+                "cluster_id": target_id,
+                "cluster_pending": False
+            })
+            touched.add(target_id)
+            result["processed"] += 1
+            if neighbors:
+                result["merged"] += 1
+
+        self._refresh_clusters(touched)
+        result["clusters"] = len(touched)
+        return result
+
+    def recompute_all(self) -> Dict:
+        """
+        すべてのチケットのクラスタを計算し直す（値が変わったチケットだけ書き込む）
+
+        削除されたチケットの反映や、閾値を変えたときに使う。
+        SimHashのないポイント（機能追加前にインデックスしたもの）は件名・説明から計算して保存する。
+
+        Returns:
+            {"tickets": チケット数, "clusters": クラスタ数, "multi": 2件以上のクラスタ数, "updated": 書き込んだ件数}
+        """
+        members: Dict[int, dict] = {}
+        hashes: Dict[int, int] = {}
+        for record in self._scroll_parents():
+            ticket_id = record.payload["ticket_id"]
+            members[ticket_id] = record.payload
+            hashes[ticket_id] = self._simhash(record.payload)
+
+        # 帯ごとのバケツで候補を絞り、ハミング距離が閾値以下のペアを Union-Find でつなぐ
+        parent = {ticket_id: ticket_id for ticket_id in members}
+
+        def find(x):
+            while parent[x] != x:
+                parent[x] = parent[parent[x]]
+                x = parent[x]
+            return x
+
+        buckets: Dict[int, List[int]] = {}
+        for ticket_id, simhash in hashes.items():
+            for band in simhash_bands(simhash):
+                buckets.setdefault(band, []).append(ticket_id)
+
+        for bucket in buckets.values():
+            for i, a in enumerate(bucket):
+                for b in bucket[i + 1:]:
+                    if find(a) != find(b) and hamming_distance(hashes[a], hashes[b]) <= self.threshold:
+                        ra, rb = find(a), find(b)
+                        parent[max(ra, rb)] = min(ra, rb)
+
+        clusters: Dict[int, List[int]] = {}
+        for ticket_id in members:
+            clusters.setdefault(find(ticket_id), []).append(ticket_id)
+
+        updated = 0
+        for ticket_ids in clusters.values():
+            cluster_id = min(ticket_ids)
+            expected = {
+                "cluster_id": cluster_id,
+                "cluster_size": len(ticket_ids),
+                "cluster_canonical_id": self._canonical([members[t] for t in ticket_ids]),
+                "cluster_pending": False
+            }
+            for ticket_id in ticket_ids:
+                payload = members[ticket_id]
+                changes = {k: v for k, v in expected.items() if payload.get(k) != v}
+                if not payload.get("simhash"):
+                    changes["simhash"] = f"{hashes[ticket_id]:016x}"
+                    changes["simhash_bands"] = simhash_bands(hashes[ticket_id])
+                if changes:
+                    self._set_ticket_payload("ticket_id", [ticket_id], changes)
+                    updated += 1
+
+        return {
+            "tickets": len(members),
+            "clusters": len(clusters),
+            "multi": sum(1 for ids in clusters.values() if len(ids) > 1),
+            "updated": updated
+        }
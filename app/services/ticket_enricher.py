@@ -0,0 +1,122 @@
+"""
+検索結果のチケット情報（カテゴリ・優先度・トラッカー・プロジェクトなど）の補完
+
+これらの項目はインデックス時にQdrantのペイロードに保存しているので、検索結果は
+Redmineを呼ばずにペイロードだけで返す（enrich="payload"）。
+
+enrich="live" の場合も応答はペイロードの値で即座に返し、補完情報が古い
+（enriched_at から ENRICH_STALE_SECONDS 経過した、または補完項目がない）チケットだけ、
+バックグラウンドでRedmineからまとめて取得してペイロードを更新する。
+次回以降の検索から新しい値が返る。
+"""
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Optional, Set
+
+from qdrant_client.models import FieldCondition, Filter, MatchValue, SetPayload, SetPayloadOperation
+
+
+ENRICH_MODES = ("payload", "live")
+
+# Redmineから取得してペイロードに保存する項目
+ENRICH_FIELDS = ["category", "assigned_to", "status", "priority", "tracker", "project", "closed_on"]
+
+
+class TicketEnricher:
+    """検索結果のRedmine項目の補完（ペイロードから返し、古いものはバックグラウンドで更新）"""
+
+    def __init__(self, vector_service, redmine_service, stale_seconds: Optional[float] = None):
+        """
+        Args:
+            vector_service: VectorService
+            redmine_service: RedmineService
+            stale_seconds: 補完情報を古いとみなす秒数（省略時は ENRICH_STALE_SECONDS、デフォルト: 3600）
+        """
+        self.vector_service = vector_service
+        self.redmine_service = redmine_service
+        self.stale_seconds = stale_seconds or float(os.getenv("ENRICH_STALE_SECONDS", "3600"))
+
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ticket-enricher")
+        # 更新待ち・更新中のチケットID（同じチケットを重ねて取得しない）
+        self._pending: Set[int] = set()
+        self._lock = threading.Lock()
+        self.stats = {"scheduled": 0, "refreshed": 0, "failed": 0}
+
+    def enrich(self, results: List[dict], mode: str = "payload") -> List[dict]:
+        """
+        検索結果を返す（live の場合は古いチケットのバックグラウンド更新を予約）
+
+        Args:
+            results: search_similar_tickets() などの結果（ペイロードの補完項目と enriched_at を含む）
+            mode: "payload": ペイロードの値のみ / "live": 古いチケットをRedmineから非同期で更新
+
+        Returns:
+            results（そのまま）
+        """
+        if mode == "live":
+            stale = [r["ticket_id"] for r in results if self.is_stale(r)]
+            if stale:
+                self.schedule_refresh(stale)
+        return results
+
+    def is_stale(self, result: dict) -> bool:
+        """補完情報が古いか（機能追加前にインデックスしたチケットは enriched_at がない）"""
+        enriched_at = result.get("enriched_at")
+        if not enriched_at:
+            return True
+        try:
+            age = (datetime.now() - datetime.fromisoformat(enriched_at)).total_seconds()
+        except (TypeError, ValueError):
+            return True
+        return age > self.stale_seconds
+
+    def schedule_refresh(self, ticket_ids: List[int]):
+        """チケットの補完情報をバックグラウンドで更新（更新待ちのチケットは除く）"""
+        with self._lock:
+            targets = [t for t in dict.fromkeys(ticket_ids) if t not in self._pending]
+            if not targets:
+                return
+            self._pending.update(targets)
+            self.stats["scheduled"] += len(targets)
+        self._executor.submit(self._refresh, targets)
+
+    def _refresh(self, ticket_ids: List[int]):
+        try:
+            details = self.redmine_service.get_ticket_details_bulk(ticket_ids)
+            if details:
+                self._write(details)
+            with self._lock:
+                self.stats["refreshed"] += len(details)
+        except Exception as e:
+            print(f"⚠️  Ticket enrichment refresh failed for {len(ticket_ids)} tickets: {e}")
+            with self._lock:
+                self.stats["failed"] += len(ticket_ids)
+        finally:
+            with self._lock:
+                self._pending.difference_update(ticket_ids)
+
+    def _write(self, details: Dict[int, dict]):
+        """チケットごとのすべてのチャンクのペイロードを1回の呼び出しで更新"""
+        now = datetime.now().isoformat()
+        operations = []
+        for ticket_id, detail in details.items():
+            payload = {field: detail.get(field) for field in ENRICH_FIELDS}
+            if hasattr(payload["closed_on"], "isoformat"):
+                payload["closed_on"] = payload["closed_on"].isoformat()
+            payload["enriched_at"] = now
+            operations.append(SetPayloadOperation(set_payload=SetPayload(
+                payload=payload,
+                filter=Filter(must=[FieldCondition(key="ticket_id", match=MatchValue(value=ticket_id))])
+            )))
+        self.vector_service.qdrant.batch_update_points(
+            collection_name=self.vector_service.collection_name,
+            update_operations=operations,
+            wait=False
+        )
+
+    def status(self) -> Dict:
+        with self._lock:
+            return {**self.stats, "pending": len(self._pending), "stale_seconds": self.stale_seconds}
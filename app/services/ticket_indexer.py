@@ -0,0 +1,409 @@
+"""
+チケットインデックス処理の共通モジュール
+
+index_tickets.py / reindex_tickets_with_comments.py / POST /index/ticket/{id} /
+差分同期はすべてこのモジュールを通してドキュメントを作成・保存する。
+どの経路でインデックスしても、コレクション内のポイントは同じ形
+（コメント・サーバー名を含む全文とペイロード）になる。
+
+担当する処理:
+    - ドキュメント作成（build_document）とチャンク分割（長いチケットは説明・コメント・解決策ごとに別ポイント）
+    - テキストハッシュによる変更検知（内容が同じなら再ベクトル化しない）
+    - バッチでのベクトル化とバッファ付き書き込み
+    - 一括インデックスの実行（並列パイプライン、チェックポイント、--since、Blue/Green、最後にクラスタ割り当て）
+"""
+
+import os
+from typing import Dict, List, Optional
+
+from app.services.vector_service import VectorService
+from app.services.redmine_service import RedmineService
+from app.services.indexing_pipeline import IndexingPipeline
+from app.services.checkpoint_store import CheckpointStore, STATUS_DONE, STATUS_SKIPPED
+from app.services.collection_manager import CollectionManager
+from app.services.ticket_clusterer import TicketClusterer
+
+
+def build_document(detail: dict) -> Optional[dict]:
+    """
+    チケット詳細からインデックス用ドキュメントを作成（全経路で共通）
+
+    Args:
+        detail: RedmineService.get_ticket_details_with_comments() の結果
+
+    Returns:
+        {"ticket_id", "text", "chunks", "content_hash", "payload"}
+        （説明文・解決策・コメントがすべて空の場合はNone = スキップ）
+    """
+    if not detail.get("description") and not detail.get("resolution") and not detail.get("comments"):
+        return None
+
+    return VectorService.build_ticket_document(detail, with_comments=True)
+
+
+class TicketIndexer:
+    """チケットのインデックス処理（CLI・API・差分同期で共通）"""
+
+    def __init__(
+        self,
+        vector_service: Optional[VectorService] = None,
+        redmine_service: Optional[RedmineService] = None
+    ):
+        self.vector_service = vector_service or VectorService()
+        self.redmine_service = redmine_service or RedmineService()
+
+    def fetch_detail(self, ticket_id: int) -> Optional[dict]:
+        """インデックスに使うチケット詳細（コメント付き）を取得"""
+        return self.redmine_service.get_ticket_details_with_comments(ticket_id)
+
+    # ------------------------------------------------------------------
+    # 少量のインデックス（API・差分同期）
+    # ------------------------------------------------------------------
+
+    def index_ticket(self, ticket_id: int, skip_unchanged: bool = True) -> Optional[Dict]:
+        """
+        1件のチケットをインデックス
+
+        Args:
+            ticket_id: チケットID
+            skip_unchanged: Trueの場合、インデックス済みのテキストハッシュと一致すれば書き換えない
+
+        Returns:
+            {"ticket_id", "status": "indexed" | "unchanged" | "skipped"}（チケットが存在しない場合はNone）
+        """
+        detail = self.fetch_detail(ticket_id)
+        if not detail:
+            return None
+
+        document = build_document(detail)
+        if document is None:
+            return {"ticket_id": ticket_id, "status": "skipped"}
+
+        with self.vector_service.point_writer() as writer:
+            result = self.write_documents([document], writer, skip_unchanged=skip_unchanged)
+
+        if result["failed"]:
+            raise RuntimeError(result["errors"][0])
+
+        status = "unchanged" if result["unchanged"] else "indexed"
+        print(f"Indexed ticket #{ticket_id} ({status}): {detail['subject']}")
+        return {"ticket_id": ticket_id, "status": status}
+
+    def write_documents(self, documents: List[dict], writer, skip_unchanged: bool = True) -> Dict:
+        """
+        ドキュメントをまとめてベクトル化してライターに追加
+
+        Args:
+            documents: build_document() の結果のリスト
+            writer: BufferedPointWriter
+            skip_unchanged: Trueの場合、テキストハッシュが一致するドキュメントは書き換えない
+
+        Returns:
+            {"written": [ticket_id], "unchanged": [ticket_id], "failed": [ticket_id], "errors": [str]}
+        """
+        result = {"written": [], "unchanged": [], "failed": [], "errors": []}
+        if not documents:
+            return result
+
+        # ステータス変更だけなど、ベクトル化するテキストが変わっていないチケットは書き換えない
+        if skip_unchanged:
+            try:
+                existing = self.vector_service.fetch_content_hashes([d["ticket_id"] for d in documents])
+            except Exception:
+                existing = {}
+            pending = []
+            for document in documents:
+                if existing.get(document["ticket_id"]) == document["content_hash"]:
+                    result["unchanged"].append(document["ticket_id"])
+                else:
+                    pending.append(document)
+            documents = pending
+            if not documents:
+                return result
+
+        texts_per_document = [self.vector_service.embedding_texts(document) for document in documents]
+        try:
+            vectors = self.vector_service.embed_texts(
+                [text for texts in texts_per_document for text in texts]
+            )
+        except Exception as e:
+            print(f"  ✗ {len(documents)} 件のベクトル化に失敗: {e}")
+            result["failed"].extend(d["ticket_id"] for d in documents)
+            result["errors"].append(str(e))
+            return result
+
+        position = 0
+        for document, texts in zip(documents, texts_per_document):
+            points = self.vector_service.make_points(document, vectors[position:position + len(texts)])
+            # 本文はチケットの最後のポイントの書き込みが成功してからストアに保存される
+            record = self.vector_service.document_record(document)
+            for i, point in enumerate(points):
+                writer.add(point, document=record if i == len(points) - 1 else None)
+            position += len(texts)
+            result["written"].append(document["ticket_id"])
+
+        # 再インデックスでチャンク数が減ったチケットの余りを削除
+        try:
+            self.vector_service.delete_stale_chunks({d["ticket_id"]: len(d["chunks"]) for d in documents})
+        except Exception as e:
+            print(f"  ⚠️  古いチャンクの削除に失敗: {e}")
+
+        return result
+
+    # ------------------------------------------------------------------
+    # 一括インデックス（CLI）
+    # ------------------------------------------------------------------
+
+    def run(
+        self,
+        checkpoint_path: str,
+        workers: int = 4,
+        embed_workers: int = 1,
+        upsert_workers: int = 1,
+        batch_size: int = 100,
+        embed_batch_size: int = 32,
+        upsert_batch_size: int = 64,
+        queue_size: int = 256,
+        limit: Optional[int] = None,
+        since: Optional[str] = None,
+        resume: bool = True,
+        retry_failed: bool = False,
+        reembed_all: bool = False,
+        dry_run: bool = False,
+        force: bool = False,
+        blue_green: bool = False,
+        force_swap: bool = False
+    ) -> Dict:
+        """
+        チケットを一括インデックス
+
+        Args:
+            checkpoint_path: 進捗を保存するチェックポイントファイル
+                             （--since の場合は「<名前>.since<拡張子>」を別に使う）
+            workers: チケット詳細取得の並列数
+            embed_workers: ベクトル化の並列数
+            upsert_workers: Qdrant保存の並列数
+            batch_size: Redmineから1回に取得する件数
+            embed_batch_size: 1回のEmbedding APIコールでまとめる件数
+            upsert_batch_size: 1回のupsertでまとめる件数
+            queue_size: ステージ間キューの上限
+            limit: 処理する（パイプラインに流す）チケットの最大件数。スキップ・内容が変わらず
+                   省略・エラーになったチケットも数える
+            since: 指定した場合、この日時以降に更新されたチケットだけを処理（例: 2024-10-01T00:00:00Z）
+            resume: Trueの場合、チェックポイントから再開する
+            retry_failed: Trueの場合、前回失敗したチケットだけを再処理する
+            reembed_all: Trueの場合、テキストハッシュが一致するチケットも再ベクトル化する
+            dry_run: Trueの場合、ベクトル化・保存を行わない
+            force: Trueの場合、チケット単位のエラーで停止しない
+            blue_green: Trueの場合、新しいバージョンのコレクションに書き込み、検証後にエイリアスを切り替える
+            force_swap: Trueの場合、検証に失敗してもエイリアスを切り替える
+
+        Returns:
+            IndexingPipeline.run() の結果に以下を加えたもの
+            {"interrupted", "error", "failed_ticket_ids", "build_collection", "swap_report", "clustered"}
+
+        インデックスしたチケットはクラスタ未割り当て（cluster_pending）で保存されるので、最後に
+        クラスタを割り当てる。Blue/Green の新しいバージョンは全件完了後にすべて計算し直してから
+        検証・切り替えを行う（計算に失敗した場合は切り替えない）。
+        """
+        if blue_green and (since or retry_failed):
+            raise ValueError("--blue-green cannot be combined with --since or --retry-failed")
+
+        if since:
+            root, ext = os.path.splitext(checkpoint_path)
+            checkpoint_path = f"{root}.since{ext}"
+
+        checkpoint = CheckpointStore(checkpoint_path)
+        if not resume and not dry_run:
+            # DRY-RUNでは前回の（中断した本番実行の）進捗を消さない
+            checkpoint.reset()
+        print(f"  チェックポイント: {checkpoint_path}")
+
+        try:
+            ticket_ids, resumed = self._select_tickets(checkpoint, since, resume, retry_failed)
+
+            # Blue/Green: 検索中のコレクションには触れず、新しいバージョンに書き込む
+            target_service = self.vector_service
+            collection_manager = None
+            build_collection = None
+            if blue_green and not dry_run:
+                collection_manager = CollectionManager(self.vector_service)
+                if collection_manager.is_legacy():
+                    raise RuntimeError(
+                        "エイリアス導入前のコレクションです。"
+                        "先に `python scripts/manage_collections.py migrate` を実行してください"
+                    )
+                build_collection = collection_manager.resume_or_create_build(checkpoint)
+                target_service = VectorService(collection_name=build_collection)
+                print(f"  Blue/Green: 書き込み先 {build_collection}（現行: {collection_manager.current_collection()}）")
+
+            print(f"  ワーカー数: 詳細取得 {workers} / ベクトル化 {embed_workers} / 保存 {upsert_workers}")
+
+            pipeline = IndexingPipeline(
+                vector_service=target_service,
+                redmine_service=self.redmine_service,
+                build_document=build_document,
+                fetch_detail=self.fetch_detail,
+                page_size=batch_size,
+                detail_workers=workers,
+                embed_workers=embed_workers,
+                upsert_workers=upsert_workers,
+                embed_batch_size=embed_batch_size,
+                upsert_batch_size=upsert_batch_size,
+                queue_size=queue_size,
+                limit=limit,
+                dry_run=dry_run,
+                force=force,
+                checkpoint=checkpoint,
+                resume=resume,
+                ticket_ids=ticket_ids,
+                skip_unchanged=not reembed_all
+            )
+
+            result = None
+            interrupted = False
+            error = None
+            try:
+                result = pipeline.run()
+            except KeyboardInterrupt:
+                interrupted = True
+            except Exception as e:
+                error = str(e)
+
+            if result is None:
+                result = {
+                    "completed": False,
+                    "indexed": pipeline.indexed_count,
+                    "skipped": pipeline.skipped_count,
+                    "errors": pipeline.error_count,
+                    "resumed": pipeline.resumed_count,
+                    "unchanged": pipeline.unchanged_count,
+                    "rates": {name: s.rate() for name, s in pipeline.stats.items()},
+                }
+            result["resumed"] += resumed
+            result["rates_text"] = pipeline.format_rates()
+            result["interrupted"] = interrupted
+            result["error"] = error
+            result["failed_ticket_ids"] = [] if dry_run else checkpoint.failed_ticket_ids()
+
+            # --since: 最後まで処理できたら次回は同じ起点でも最初から処理する
+            if since and not dry_run and not interrupted and error is None:
+                checkpoint.start_new_run()
+
+            # インデックスしたチケットをクラスタに割り当て
+            # （Blue/Green は全件完了後に新しいバージョン全体を計算し直す）
+            result["clustered"] = None
+            cluster_ready = True
+            if build_collection:
+                if result["completed"]:
+                    try:
+                        result["clustered"] = TicketClusterer(target_service).recompute_all()["tickets"]
+                    except Exception as e:
+                        cluster_ready = False
+                        result["error"] = result["error"] or f"クラスタの計算に失敗: {e}"
+            elif not dry_run and not interrupted and result["indexed"]:
+                try:
+                    result["clustered"] = TicketClusterer(target_service).assign_pending()["processed"]
+                except Exception as e:
+                    # 割り当てられなかったチケットは次回の差分同期で再処理される
+                    print(f"  ⚠️  クラスタ割り当てに失敗: {e}")
+
+            # Blue/Green: 全件完了していれば検証してエイリアスを切り替え
+            result["build_collection"] = build_collection
+            result["swap_report"] = None
+            if build_collection and result["completed"] and cluster_ready:
+                result["swap_report"] = collection_manager.finish_build(
+                    build_collection, checkpoint, force=force_swap
+                )
+
+            return result
+
+        finally:
+            checkpoint.close()
+
+    def _select_tickets(self, checkpoint: CheckpointStore, since: Optional[str], resume: bool, retry_failed: bool):
+        """
+        処理対象のチケットIDを決める
+
+        Returns:
+            (チケットIDのリスト（Noneの場合は全件をページング）, チェックポイントにより省略した件数)
+        """
+        if retry_failed:
+            ticket_ids = checkpoint.failed_ticket_ids()
+            print(f"  再処理対象（前回失敗分）: {len(ticket_ids)} 件")
+            return ticket_ids, 0
+
+        if not since:
+            return None, 0
+
+        # 起点が変わった場合は別の実行として扱う
+        if checkpoint.get_meta("since") != since:
+            checkpoint.start_new_run()
+            checkpoint.set_meta("since", since)
+
+        ticket_ids = []
+        seen = set()
+        for ticket in self.redmine_service.get_updated_tickets_iter(since):
+            if ticket.id not in seen:
+                seen.add(ticket.id)
+                ticket_ids.append(ticket.id)
+
+        resumed = 0
+        if resume:
+            statuses = checkpoint.get_statuses(ticket_ids)
+            pending = [
+                tid for tid in ticket_ids
+                if statuses.get(tid) not in (STATUS_DONE, STATUS_SKIPPED)
+            ]
+            resumed = len(ticket_ids) - len(pending)
+            ticket_ids = pending
+
+        print(f"  {since} 以降に更新されたチケット: {len(ticket_ids) + resumed} 件（処理済み {resumed} 件）")
+        return ticket_ids, resumed
+
+
+def print_run_summary(result: Dict, dry_run: bool = False):
+    """TicketIndexer.run() の結果を表示（CLI共通）"""
+    if result["interrupted"]:
+        print("\n  ⚠️  ユーザーによる中断（次回はチェックポイントから再開します）")
+    if result["error"]:
+        print(f"\n  ✗ 処理エラー: {result['error']}")
+
+    print("\n" + "=" * 60)
+    print("処理完了")
+    print("=" * 60)
+    print(f"  インデックス成功: {result['indexed']} 件")
+    print(f"  変更なし（再ベクトル化を省略）: {result['unchanged']} 件")
+    print(f"  スキップ: {result['skipped']} 件")
+    print(f"  エラー: {result['errors']} 件")
+    print(f"  処理済みのため省略（チェックポイント）: {result['resumed']} 件")
+    if "elapsed" in result:
+        total = result["indexed"] + result["unchanged"] + result["skipped"] + result["errors"]
+        throughput = total / result["elapsed"] if result["elapsed"] > 0 else 0.0
+        print(f"  処理時間: {result['elapsed']:.1f}秒（{throughput:.1f} 件/秒）")
+    print(f"  ステージ別スループット: {result['rates_text']}")
+    if result.get("clustered") is not None:
+        print(f"  クラスタ割り当て: {result['clustered']} 件")
+
+    if result["failed_ticket_ids"]:
+        print(f"\n  ⚠️  失敗したチケット: {len(result['failed_ticket_ids'])} 件（--retry-failed で再処理できます）")
+
+    build_collection = result["build_collection"]
+    if build_collection:
+        report = result["swap_report"]
+        if report is None:
+            print(f"\n  ℹ️  {build_collection} は作成途中です。再実行すると続きから再開します")
+        else:
+            print("\nBlue/Green 検証結果:")
+            print(f"  件数: {report['old_count']} → {report['new_count']}")
+            if report["recall"] is not None:
+                print(f"  サンプル再現率: {report['recall']:.2f}")
+            for reason in report["reasons"]:
+                print(f"  ⚠️  {reason}")
+            if report["swapped"]:
+                print(f"  ✓ エイリアスを {build_collection} に切り替えました（旧バージョンは rollback 用に保持）")
+            else:
+                print("  ✗ 検証に失敗したため切り替えていません（--force-swap で強制切り替え）")
+
+    if dry_run:
+        print("\n  ℹ️  DRY-RUNモードのため、実際にはインデックスされていません")
@@ -1,55 +1,534 @@
 import os
-from typing import List, Optional
+import json
+import hashlib
+import threading
+import time
+import uuid
+from typing import Callable, Dict, List, Optional
 from datetime import datetime
 from qdrant_client import QdrantClient
-from qdrant_client.models import Distance, VectorParams, PointStruct, Filter, FieldCondition, MatchValue
+from qdrant_client.models import (
+    Distance,
+    VectorParams,
+    PointStruct,
+    Filter,
+    FieldCondition,
+    MatchValue,
+    MatchAny,
+    Range,
+    FilterSelector,
+    Fusion,
+    FusionQuery,
+    HasIdCondition,
+    Modifier,
+    NamedVector,
+    PayloadSchemaType,
+    PayloadSelectorExclude,
+    PayloadSelectorInclude,
+    Prefetch,
+    QueryRequest,
+    SparseVector,
+    SparseVectorParams,
+)
 from openai import OpenAI
 from dotenv import load_dotenv
 
+from app.services.document_store import BULKY_FIELDS, DocumentStore
+from app.services.qdrant_connection import create_qdrant_client, qdrant_mode
+from app.services.reranker import CrossEncoderReranker
+from app.services.result_diversifier import collapse_clusters, diversify as diversify_results
+from app.services.sparse_encoder import SparseEncoder
+from app.services.ticket_clusterer import cluster_payload
+
 load_dotenv()
 
 
+# チャンク1つあたりの最大文字数（これを超えるチケットは説明・コメント・解決策ごとに分割する）
+CHUNK_MAX_CHARS = int(os.getenv("CHUNK_MAX_CHARS", "1500"))
+
+# 2番目以降のチャンクのポイントID（UUID）を ticket_id から決定的に作るための名前空間
+CHUNK_ID_NAMESPACE = uuid.UUID("6f1c9a52-3d0e-4b8a-9a57-2f4e1c7b8d10")
+
+# 名前付きベクトル（件名だけのベクトルと、本文チャンクのベクトル）
+VECTOR_SUBJECT = "subject"
+VECTOR_BODY = "body"
+
+# 新規コレクションのベクトル構成（named: subject/body の名前付きベクトル、single: 従来の1ベクトル）
+VECTOR_LAYOUT = os.getenv("QDRANT_VECTOR_LAYOUT", "named").lower()
+
+# スパース（BM25）ベクトル。新規コレクションに密ベクトルと並べて持たせる
+SPARSE_VECTOR = "text"
+SPARSE_ENABLED = os.getenv("QDRANT_SPARSE_ENABLED", "true").lower() == "true"
+
+# 1ベクトル構成のコレクションでスパースベクトルと併用する場合の密ベクトル名（Qdrantのデフォルト名）
+DEFAULT_VECTOR = ""
+
+# QdrantのRRFの定数 k（score = Σ 1 / (k + 順位)、順位は0始まり）。スコアの正規化に使う
+RRF_K = 2
+
+
+def parse_vector_weights(value: str) -> Dict[str, float]:
+    """
+    "subject=0.7,body=0.3" 形式の重み指定をパース
+
+    Returns:
+        {ベクトル名: 重み}（合計が1になるよう正規化）
+    """
+    weights = {}
+    for part in value.split(","):
+        if "=" not in part:
+            continue
+        name, weight = part.split("=", 1)
+        weights[name.strip()] = max(float(weight), 0.0)
+    total = sum(weights.values())
+    if total <= 0:
+        return {VECTOR_BODY: 1.0}
+    return {name: weight / total for name, weight in weights.items()}
+
+
+# 検索結果に含めないペイロード（コメント全文は親ポイントにしかないため別途取得する。
+# 変更検知・クラスタリング用の項目は検索では使わない。content_hash はドキュメントストアの本文との照合に使う）
+SEARCH_PAYLOAD = PayloadSelectorExclude(exclude=[
+    "comments", "embedding_model", "embedding_dims", "indexed_at", "simhash", "simhash_bands"
+])
+
+# 検索結果の形
+#   lite: 一覧表示・アラート応答に必要な項目のみ（SimilarTicket の項目と本文照合用の content_hash、
+#         一致したチャンク本文を含まない）
+#   full: SEARCH_PAYLOAD（一致したチャンク本文・サーバー名・日時などを含む）
+RESULT_SHAPES = ("lite", "full")
+LITE_PAYLOAD_FIELDS = [
+    "ticket_id", "subject", "description", "resolution",
+    "category", "assigned_to", "status", "priority", "tracker", "project", "closed_on", "enriched_at",
+    "cluster_id", "cluster_size", "cluster_canonical_id", "content_hash"
+]
+
+
+class BufferedPointWriter:
+    """
+    Qdrantへのバッファ付きポイント書き込み
+
+    ポイントを溜めておき、件数・推定バイト数・経過時間のいずれかが閾値を
+    超えた時点でまとめてupsertする。途中のflushは wait=False で投げっぱなしにし、
+    close() で最後のバッチを wait=True で書き込むことで同期点（バリア）とする。
+    Qdrantは1コレクションへの更新を受け付け順に適用するため、最後の同期書き込みが
+    完了した時点で先行する非同期書き込みもすべて反映済みになる。
+
+    ドキュメントストアを渡した場合、add() でポイントに付けた本文は、そのポイントの
+    書き込みが成功してからストアに保存する（失敗・DRY-RUNでストアだけが先に更新されないように）。
+
+    使い方:
+        with vector_service.point_writer() as writer:
+            for point in points:
+                writer.add(point)
+    """
+
+    def __init__(
+        self,
+        qdrant: QdrantClient,
+        collection_name: str,
+        flush_count: int = 256,
+        flush_bytes: int = 8 * 1024 * 1024,
+        flush_interval: float = 2.0,
+        on_flush: Optional[Callable[[List[PointStruct]], None]] = None,
+        on_error: Optional[Callable[[List[PointStruct], Exception], None]] = None,
+        doc_store: Optional[DocumentStore] = None
+    ):
+        """
+        Args:
+            qdrant: Qdrantクライアント
+            collection_name: 書き込み先コレクション
+            flush_count: この件数に達したらflush
+            flush_bytes: 推定サイズがこのバイト数に達したらflush
+            flush_interval: 最初のポイント追加からこの秒数が経過したらflush
+            on_flush: flush成功時に書き込んだポイントを受け取るコールバック
+            on_error: flush失敗時に (ポイント, 例外) を受け取るコールバック
+                      （未指定の場合は失敗したポイントをバッファに戻して例外を送出する。
+                      タイマーによるflushの失敗は記録しておき、次の add() / flush() で送出する。
+                      バッファに戻したポイントは次のflushと close() で再送する）
+            doc_store: add() で渡した本文の保存先（Noneの場合は本文を保存しない）
+        """
+        self.qdrant = qdrant
+        self.collection_name = collection_name
+        self.flush_count = max(1, flush_count)
+        self.flush_bytes = flush_bytes
+        self.flush_interval = flush_interval
+        self.on_flush = on_flush
+        self.on_error = on_error
+        self.doc_store = doc_store
+
+        self.written_count = 0
+        self.flush_calls = 0
+
+        self._buffer: List[PointStruct] = []
+        self._buffer_bytes = 0
+        self._buffer_started: Optional[float] = None
+        self._last_written: Optional[PointStruct] = None
+        self._pending_async = False
+        # 書き込み成功後にストアへ保存する本文 {ポイントID: (チケットID, 本文)}
+        self._documents: Dict = {}
+        # タイマーによるflushで発生し、まだ呼び出し元に伝えていない例外
+        self._error: Optional[Exception] = None
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+
+        # 流量が少ないときでも flush_interval ごとに書き出すためのタイマー
+        self._timer = threading.Thread(target=self._timer_loop, daemon=True)
+        self._timer.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    @staticmethod
+    def estimate_size(point: PointStruct) -> int:
+        """ポイントの転送サイズを概算（float32ベクトル + JSONペイロード）"""
+        vector = point.vector
+        if isinstance(vector, dict):
+            dims = sum(len(v) for v in vector.values() if isinstance(v, list))
+        else:
+            dims = len(vector or [])
+        payload_size = len(json.dumps(point.payload or {}, ensure_ascii=False, default=str).encode("utf-8"))
+        return dims * 4 + payload_size
+
+    def add(self, point: PointStruct, document: Optional[dict] = None):
+        """
+        ポイントをバッファに追加（閾値を超えたらflush）
+
+        Args:
+            point: 書き込むポイント
+            document: このポイントの書き込み成功後にドキュメントストアへ保存する本文
+                      （VectorService.document_record() の結果。チケットの最後のポイントに付ける）
+        """
+        with self._lock:
+            self._raise_pending_error()
+            if document is not None and self.doc_store is not None:
+                self._documents[point.id] = (point.payload["ticket_id"], document)
+            if not self._buffer:
+                self._buffer_started = time.monotonic()
+            self._buffer.append(point)
+            self._buffer_bytes += self.estimate_size(point)
+
+            if len(self._buffer) >= self.flush_count or self._buffer_bytes >= self.flush_bytes:
+                self._flush_locked(wait=False)
+
+    def flush(self, wait: bool = False):
+        """バッファの内容を書き込む"""
+        with self._lock:
+            self._raise_pending_error()
+            self._flush_locked(wait=wait)
+
+    def sync(self):
+        """
+        残りを同期書き込みし、先行する非同期書き込みの完了を待つ（ライターは使い続けられる）
+
+        これが返った時点で、呼び出し前に on_flush に渡したポイントはすべてQdrantに反映済み。
+        """
+        with self._lock:
+            self._sync_locked()
+
+    def close(self):
+        """残りを同期書き込みし、先行する非同期書き込みの完了を待つ"""
+        if self._closed.is_set():
+            return
+        self._closed.set()
+
+        with self._lock:
+            self._sync_locked()
+
+    def _sync_locked(self):
+        if self._buffer:
+            # タイマーのflushで失敗してバッファに戻したポイントもここで再送する
+            self._flush_locked(wait=True)
+        if self._pending_async and self._last_written is not None:
+            # 同期書き込みしていない（または on_error に渡して失敗した）場合は
+            # 最後に書いたポイントを同期で書き直してバリアにする（冪等）
+            self._upsert([self._last_written], wait=True)
+        self._pending_async = False
+        # 失敗したポイントは再送できたので、記録していた例外は不要
+        self._error = None
+
+    def _raise_pending_error(self):
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
+
+    def _timer_loop(self):
+        while not self._closed.wait(timeout=max(self.flush_interval / 2, 0.05)):
+            with self._lock:
+                if (
+                    self._buffer
+                    and self._buffer_started is not None
+                    and time.monotonic() - self._buffer_started >= self.flush_interval
+                ):
+                    try:
+                        self._flush_locked(wait=False)
+                    except Exception as e:
+                        # スレッドを止めずに記録し、次の add() / flush() で呼び出し元に伝える
+                        print(f"⚠️  Background flush to '{self.collection_name}' failed: {e}")
+                        self._error = e
+
+    def _flush_locked(self, wait: bool):
+        if not self._buffer:
+            return
+
+        points = self._buffer
+        self._buffer = []
+        self._buffer_bytes = 0
+        self._buffer_started = None
+
+        try:
+            self._upsert(points, wait=wait)
+        except Exception as e:
+            if self.on_error is None:
+                # 本文は再送に成功したときに保存する
+                # 失敗したポイントを先頭に戻す（次のflush・close() で再送、間隔は flush_interval 空ける）
+                self._buffer = points + self._buffer
+                self._buffer_bytes = sum(self.estimate_size(point) for point in self._buffer)
+                self._buffer_started = time.monotonic()
+                raise
+            for point in points:
+                self._documents.pop(point.id, None)
+            self.on_error(points, e)
+            return
+
+        self.written_count += len(points)
+        self._last_written = points[-1]
+        self._pending_async = not wait
+        if self._documents:
+            written = [self._documents.pop(point.id) for point in points if point.id in self._documents]
+            if written:
+                try:
+                    self.doc_store.put_many(dict(written))
+                except Exception as e:
+                    # ポイントは書き込めているので止めない（ハッシュが合わない本文は検索結果に使われない）
+                    print(f"⚠️  Failed to store {len(written)} documents: {e}")
+        if self.on_flush is not None:
+            self.on_flush(points)
+
+    def _upsert(self, points: List[PointStruct], wait: bool):
+        self.flush_calls += 1
+        self.qdrant.upsert(
+            collection_name=self.collection_name,
+            points=points,
+            wait=wait
+        )
+
+
 class VectorService:
     """ベクトル検索サービス（Qdrant + OpenAI Embeddings）"""
 
-    def __init__(self):
-        self.qdrant = QdrantClient(
-            url=os.getenv("QDRANT_URL", "http://localhost:6333")
-        )
-        self.openai = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-        self.collection_name = os.getenv("QDRANT_COLLECTION_NAME", "maintenance_tickets")
+    def __init__(self, collection_name: Optional[str] = None, openai_client: Optional[OpenAI] = None):
+        """
+        Args:
+            collection_name: 対象コレクション（省略時は QDRANT_COLLECTION_NAME）。
+                             エイリアス名も指定でき、検索はエイリアスの指す実体に対して行われる
+            openai_client: 共有するOpenAIクライアント（省略時は OPENAI_API_KEY で生成）
+        """
+        self.qdrant = self._create_qdrant_client()
+        self.openai = openai_client or OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        self.collection_name = collection_name or os.getenv("QDRANT_COLLECTION_NAME", "maintenance_tickets")
         self.embedding_model = "text-embedding-3-large"
         self.vector_size = 3072
 
+        # 検索の融合重み（アラート文は件名に、自然文の質問は本文に一致しやすい）
+        self.alert_weights = parse_vector_weights(os.getenv("SEARCH_WEIGHTS_ALERT", "subject=0.7,body=0.3"))
+        self.query_weights = parse_vector_weights(os.getenv("SEARCH_WEIGHTS_QUERY", "subject=0.3,body=0.7"))
+
+        # コレクションごとのベクトル構成のキャッシュ {名前: (構成, 有効期限)}
+        self._layout_cache: Dict[str, tuple] = {}
+
+        # スパース（BM25）ベクトルのエンコーダ（ローカルで計算、APIコールなし）
+        self.sparse_encoder = SparseEncoder()
+
+        # 上位候補の再ランキング（RERANK_ENABLED=true かつモデルがある場合のみ）
+        self.reranker = CrossEncoderReranker()
+
+        # ほぼ重複したチケットの集約とMMRによる多様化（検索ごとに指定、省略時のデフォルト）
+        self.diversify_default = os.getenv("SEARCH_DIVERSIFY", "false").lower() == "true"
+        self.diversify_candidate_factor = int(os.getenv("SEARCH_DIVERSIFY_CANDIDATE_FACTOR", "4"))
+
+        # 説明・解決策・コメント・チャンク本文のローカルストア（DOC_STORE_ENABLED=true の場合のみ。
+        # 有効ならQdrantのペイロードにはこれらを保存しない）
+        self.doc_store = DocumentStore() if os.getenv("DOC_STORE_ENABLED", "false").lower() == "true" else None
+
+        # 検索結果の形ごとのペイロードの量と検索時間（SEARCH_PAYLOAD_STATS=true の場合のみ記録）
+        self.payload_stats_enabled = os.getenv("SEARCH_PAYLOAD_STATS", "false").lower() == "true"
+        self.payload_stats: Dict[str, dict] = {}
+        self._payload_stats_lock = threading.Lock()
+
         # コレクションの初期化
         self._ensure_collection()
 
+    @staticmethod
+    def _create_qdrant_client() -> QdrantClient:
+        """環境変数（QDRANT_MODE など）に従ってQdrantクライアントを生成"""
+        return create_qdrant_client()
+
+    def point_writer(
+        self,
+        flush_count: Optional[int] = None,
+        flush_bytes: Optional[int] = None,
+        flush_interval: Optional[float] = None,
+        on_flush: Optional[Callable[[List[PointStruct]], None]] = None,
+        on_error: Optional[Callable[[List[PointStruct], Exception], None]] = None,
+        collection_name: Optional[str] = None
+    ) -> BufferedPointWriter:
+        """
+        このコレクション向けのバッファ付きライターを生成
+
+        collection_name を指定すると別のコレクションに書き込む（移行・コピー用）。
+        閾値を省略した場合は環境変数 QDRANT_FLUSH_COUNT / QDRANT_FLUSH_BYTES /
+        QDRANT_FLUSH_INTERVAL（デフォルト: 256件 / 8MB / 2秒）を使用する。
+
+        Returns:
+            BufferedPointWriter（使い終わったら close() するか with 文で使うこと）
+        """
+        return BufferedPointWriter(
+            qdrant=self.qdrant,
+            collection_name=collection_name or self.collection_name,
+            flush_count=flush_count or int(os.getenv("QDRANT_FLUSH_COUNT", "256")),
+            flush_bytes=flush_bytes or int(os.getenv("QDRANT_FLUSH_BYTES", str(8 * 1024 * 1024))),
+            flush_interval=flush_interval or float(os.getenv("QDRANT_FLUSH_INTERVAL", "2.0")),
+            on_flush=on_flush,
+            on_error=on_error,
+            doc_store=self.doc_store
+        )
+
     def _ensure_collection(self):
-        """コレクションが存在しない場合は作成"""
-        try:
-            collections = self.qdrant.get_collections().collections
-            collection_names = [c.name for c in collections]
+        """
+        コレクション（またはエイリアス）が存在しない場合は作成
 
-            if self.collection_name not in collection_names:
-                print(f"Creating collection: {self.collection_name}")
-                from qdrant_client.models import OptimizersConfigDiff
-                self.qdrant.create_collection(
-                    collection_name=self.collection_name,
-                    vectors_config=VectorParams(
-                        size=self.vector_size,
-                        distance=Distance.COSINE
-                    ),
-                    optimizers_config=OptimizersConfigDiff(
-                        indexing_threshold=1  # 1件からインデックス化
-                    )
-                )
-                print(f"Collection '{self.collection_name}' created successfully")
+        新規環境では「{名前}_v{日時}」のバージョン付きコレクションを作り、名前をそのエイリアスにする
+        （最初からBlue/Green再インデックス・ロールバックを使える）。
+        QDRANT_USE_ALIASES=false の場合だけ、名前どおりの実体コレクションを作成する。
+        """
+        try:
+            target = self.resolve_alias(self.collection_name)
+            if target:
+                print(f"Collection alias '{self.collection_name}' -> '{target}'")
+            elif not self.collection_exists(self.collection_name):
+                if os.getenv("QDRANT_USE_ALIASES", "true").lower() == "true":
+                    # collection_manager は VectorService を使うため、ここで読み込む
+                    from app.services.collection_manager import CollectionManager
+                    manager = CollectionManager(self, alias_name=self.collection_name)
+                    manager.swap(manager.create_version())
+                else:
+                    self.create_collection(self.collection_name)
             else:
                 print(f"Collection '{self.collection_name}' already exists")
+                self._ensure_payload_indexes(self.collection_name)
         except Exception as e:
             print(f"Error ensuring collection: {e}")
             raise
 
+    def collection_exists(self, name: str) -> bool:
+        """実体のコレクションが存在するか（エイリアスは含まない）"""
+        collections = self.qdrant.get_collections().collections
+        return name in [c.name for c in collections]
+
+    def resolve_alias(self, alias_name: str) -> Optional[str]:
+        """
+        エイリアスが指しているコレクション名を取得
+
+        Returns:
+            コレクション名（エイリアスでない場合はNone）
+        """
+        for alias in self.qdrant.get_aliases().aliases:
+            if alias.alias_name == alias_name:
+                return alias.collection_name
+        return None
+
+    def create_collection(self, name: str, named: Optional[bool] = None, sparse: Optional[bool] = None):
+        """
+        現在のEmbedding設定でコレクションを作成
+
+        Args:
+            name: コレクション名
+            named: Trueの場合は subject/body の名前付きベクトル、Falseの場合は1ベクトル
+                   （省略時は QDRANT_VECTOR_LAYOUT、デフォルト: named）
+            sparse: Trueの場合はスパース（BM25）ベクトルも持たせる
+                    （省略時は QDRANT_SPARSE_ENABLED、デフォルト: true）
+        """
+        if named is None:
+            named = VECTOR_LAYOUT == "named"
+        if sparse is None:
+            sparse = SPARSE_ENABLED
+        print(
+            f"Creating collection: {name} "
+            f"({'named vectors' if named else 'single vector'}{' + sparse' if sparse else ''})"
+        )
+        from qdrant_client.models import OptimizersConfigDiff
+        params = VectorParams(
+            size=self.vector_size,
+            distance=Distance.COSINE
+        )
+        self.qdrant.create_collection(
+            collection_name=name,
+            vectors_config={VECTOR_SUBJECT: params, VECTOR_BODY: params} if named else params,
+            # IDFはQdrantがコレクション全体の統計から計算する
+            sparse_vectors_config={SPARSE_VECTOR: SparseVectorParams(modifier=Modifier.IDF)} if sparse else None,
+            optimizers_config=OptimizersConfigDiff(
+                indexing_threshold=1  # 1件からインデックス化
+            )
+        )
+        self._ensure_payload_indexes(name)
+        print(f"Collection '{name}' created successfully")
+
+    def _collection_layout(self, collection_name: Optional[str] = None) -> dict:
+        """
+        コレクションのベクトル構成 {"named": bool, "sparse": bool}
+
+        エイリアスの切り替えで構成が変わることがあるため、結果は60秒だけキャッシュする。
+        """
+        name = collection_name or self.collection_name
+        now = time.monotonic()
+        cached = self._layout_cache.get(name)
+        if cached and cached[1] > now:
+            return cached[0]
+
+        params = self.qdrant.get_collection(name).config.params
+        layout = {
+            "named": isinstance(params.vectors, dict),
+            "sparse": SPARSE_VECTOR in (getattr(params, "sparse_vectors", None) or {})
+        }
+        self._layout_cache[name] = (layout, now + 60)
+        return layout
+
+    def is_named_layout(self, collection_name: Optional[str] = None) -> bool:
+        """コレクションが名前付きベクトル（subject/body）構成か"""
+        return self._collection_layout(collection_name)["named"]
+
+    def has_sparse_vectors(self, collection_name: Optional[str] = None) -> bool:
+        """コレクションがスパース（BM25）ベクトルを持つか"""
+        return self._collection_layout(collection_name)["sparse"]
+
+    def _ensure_payload_indexes(self, name: str):
+        """
+        ペイロードインデックスを作成
+
+        チャンクをチケット単位でまとめる・削除するための ticket_id / chunk_index と、
+        ほぼ重複チケットのクラスタリング用の項目。
+        """
+        fields = {
+            "ticket_id": PayloadSchemaType.INTEGER,
+            "chunk_index": PayloadSchemaType.INTEGER,
+            "cluster_id": PayloadSchemaType.INTEGER,
+            "simhash_bands": PayloadSchemaType.INTEGER,
+            "cluster_pending": PayloadSchemaType.BOOL
+        }
+        for field, schema in fields.items():
+            try:
+                self.qdrant.create_payload_index(
+                    collection_name=name,
+                    field_name=field,
+                    field_schema=schema
+                )
+            except Exception as e:
+                print(f"Warning: could not create payload index '{field}' on '{name}': {e}")
+
     def embed_text(self, text: str) -> List[float]:
         """
         テキストをベクトル化
@@ -70,65 +549,1123 @@ class VectorService:
             print(f"Error creating embedding: {e}")
             raise
 
+    def embed_texts(self, texts: List[str]) -> List[List[float]]:
+        """
+        複数テキストを1回のAPIコールでまとめてベクトル化
+
+        Args:
+            texts: ベクトル化するテキストのリスト
+
+        Returns:
+            入力と同じ順序のベクトルのリスト
+        """
+        if not texts:
+            return []
+
+        try:
+            response = self.openai.embeddings.create(
+                model=self.embedding_model,
+                input=texts
+            )
+            # APIは順序を保証しないことがあるため index で並べ直す
+            ordered = sorted(response.data, key=lambda d: d.index)
+            return [d.embedding for d in ordered]
+        except Exception as e:
+            print(f"Error creating embeddings for {len(texts)} texts: {e}")
+            raise
+
+    @staticmethod
+    def build_ticket_text(
+        subject: str,
+        description: str = "",
+        resolution: str = "",
+        comments: Optional[List[dict]] = None
+    ) -> str:
+        """
+        ベクトル化対象の全文を組み立てる
+
+        Args:
+            subject: 件名
+            description: 説明
+            resolution: 解決策
+            comments: コメントリスト（Noneの場合はコメント行を含めない）
+
+        Returns:
+            ベクトル化するテキスト
+        """
+        full_text = f"件名: {subject}\n説明: {description}\n解決策: {resolution}"
+
+        if comments is not None:
+            comments_text = "\n".join([
+                f"コメント ({c.get('user', 'N/A')}, {c.get('created_on', 'N/A')}): {c.get('notes', '')}"
+                for c in comments
+            ])
+            full_text += f"\n{comments_text}"
+
+        return full_text
+
+    @staticmethod
+    def _split_text(text: str, max_chars: int) -> List[str]:
+        """行単位で max_chars 以内に分割（1行が長すぎる場合は文字数で切る）"""
+        pieces = []
+        current = ""
+        for line in text.splitlines():
+            while len(line) > max_chars:
+                if current:
+                    pieces.append(current)
+                    current = ""
+                pieces.append(line[:max_chars])
+                line = line[max_chars:]
+            if current and len(current) + len(line) + 1 > max_chars:
+                pieces.append(current)
+                current = ""
+            current = f"{current}\n{line}" if current else line
+        if current:
+            pieces.append(current)
+        return pieces
+
+    @classmethod
+    def build_ticket_chunks(
+        cls,
+        subject: str,
+        description: str = "",
+        resolution: str = "",
+        comments: Optional[List[dict]] = None,
+        max_chars: Optional[int] = None
+    ) -> List[dict]:
+        """
+        チケットをベクトル化の単位（チャンク）に分割
+
+        全文が max_chars 以内のチケットは従来どおり1チャンク（chunk_type="full"）。
+        長いチケットは「説明」「コメント（連続するコメントを max_chars 以内でまとめた窓）」
+        「解決策」に分け、どのチャンクにも件名を付けて文脈を保つ。
+
+        Args:
+            subject: 件名
+            description: 説明
+            resolution: 解決策
+            comments: コメントリスト（Noneの場合はコメントを含めない）
+            max_chars: チャンクの最大文字数（省略時は CHUNK_MAX_CHARS）
+
+        Returns:
+            [{"chunk_index": N, "chunk_type": "full" | "description" | "comments" | "resolution",
+              "text": ベクトル化するテキスト}]
+        """
+        max_chars = max_chars or CHUNK_MAX_CHARS
+        full_text = cls.build_ticket_text(subject, description, resolution, comments)
+        if len(full_text) <= max_chars:
+            return [{"chunk_index": 0, "chunk_type": "full", "text": full_text}]
+
+        header = f"件名: {subject}"
+        body_chars = max(max_chars - len(header) - 1, 200)
+        chunks = []
+
+        def add(chunk_type: str, body: str):
+            for piece in cls._split_text(body, body_chars):
+                chunks.append({"chunk_index": len(chunks), "chunk_type": chunk_type, "text": f"{header}\n{piece}"})
+
+        # 説明（空でも先頭チャンクは必ず作る。チケットの親ポイントになる）
+        add("description", f"説明: {description}")
+
+        # コメントは連続する数件ずつの窓にまとめる
+        comment_lines = [
+            f"コメント ({c.get('user', 'N/A')}, {c.get('created_on', 'N/A')}): {c.get('notes', '')}"
+            for c in (comments or [])
+        ]
+        window = []
+        window_chars = 0
+        for line in comment_lines:
+            if window and window_chars + len(line) + 1 > body_chars:
+                add("comments", "\n".join(window))
+                window = []
+                window_chars = 0
+            window.append(line)
+            window_chars += len(line) + 1
+        if window:
+            add("comments", "\n".join(window))
+
+        # 解決策（コメント付きの場合は最後のコメントと同じなので重複させない）
+        comment_notes = {c.get("notes") for c in (comments or [])}
+        if resolution and resolution not in comment_notes:
+            add("resolution", f"解決策: {resolution}")
+
+        return chunks
+
+    @staticmethod
+    def chunk_point_id(ticket_id: int, chunk_index: int):
+        """
+        チャンクのポイントID
+
+        先頭チャンクは ticket_id そのもの（チャンク化前のポイントを上書きでき、
+        retrieve(ticket_id) で親ポイントを取得できる）。2番目以降は決定的なUUID。
+        """
+        if chunk_index == 0:
+            return ticket_id
+        return str(uuid.uuid5(CHUNK_ID_NAMESPACE, f"{ticket_id}:{chunk_index}"))
+
+    @staticmethod
+    def compute_content_hash(text: str) -> str:
+        """ベクトル化するテキストのハッシュ（変更検知用）"""
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    @classmethod
+    def build_ticket_document(cls, detail: dict, with_comments: bool = True) -> dict:
+        """
+        チケット詳細からインデックス用ドキュメントを作成
+
+        Args:
+            detail: RedmineService.get_ticket_details() /
+                    get_ticket_details_with_comments() の結果
+            with_comments: コメントを全文・ペイロードに含めるか
+
+        Returns:
+            {"ticket_id": ID, "text": 全文, "chunks": build_ticket_chunks() の結果,
+             "content_hash": チャンクのテキストのハッシュ, "payload": Qdrantペイロード}
+        """
+        def iso(value):
+            return value.isoformat() if hasattr(value, "isoformat") else value
+
+        subject = detail["subject"]
+        description = detail.get("description", "") or ""
+        resolution = detail.get("resolution", "") or ""
+        comments = (detail.get("comments") or []) if with_comments else None
+
+        text = cls.build_ticket_text(subject, description, resolution, comments)
+        chunks = cls.build_ticket_chunks(subject, description, resolution, comments)
+        # チャンクの分け方が変わった場合も再ベクトル化されるよう、チャンク単位のテキストからハッシュを作る
+        content_hash = cls.compute_content_hash("\x1e".join(c["text"] for c in chunks))
+
+        payload = {
+            "ticket_id": detail["ticket_id"],
+            "subject": subject,
+            "description": description,
+            "resolution": resolution,
+            "indexed_at": datetime.now().isoformat(),
+            "content_hash": content_hash,
+            "category": detail.get("category"),
+            "assigned_to": detail.get("assigned_to"),
+            "status": detail.get("status"),
+            "priority": detail.get("priority"),
+            "tracker": detail.get("tracker"),
+            "project": detail.get("project"),
+            "closed_on": iso(detail.get("closed_on")),
+            # Redmine項目を取得した時刻（検索結果はペイロードから返し、古ければ TicketEnricher が更新する）
+            "enriched_at": datetime.now().isoformat(),
+            # ほぼ重複チケットの検出用（クラスタは TicketClusterer があとで割り当てる）
+            **cluster_payload(detail["ticket_id"], subject, description)
+        }
+        if with_comments:
+            payload.update({
+                "comments": comments,
+                "server_names": detail.get("server_names", []),
+                "created_on": iso(detail.get("created_on")),
+                "updated_on": iso(detail.get("updated_on"))
+            })
+
+        return {
+            "ticket_id": detail["ticket_id"],
+            "text": text,
+            "chunks": chunks,
+            "content_hash": content_hash,
+            "payload": payload
+        }
+
+    def embedding_texts(self, document: dict) -> List[str]:
+        """
+        ドキュメントをインデックスするためにベクトル化するテキスト
+
+        チャンクごとの本文に加え、名前付きベクトル構成では件名を末尾に追加する。
+        make_points() にはこの順序のままベクトルを渡す。
+        """
+        texts = [chunk["text"] for chunk in document["chunks"]]
+        if self.is_named_layout():
+            texts.append(document["payload"].get("subject") or "(件名なし)")
+        return texts
+
+    def make_points(self, document: dict, vectors: List[List[float]]) -> List[PointStruct]:
+        """
+        build_ticket_document() のドキュメントとチャンクごとのベクトルからポイントを作成
+
+        すべてのチャンクにチケット単位のペイロード（ticket_id・件名・フィルタ用の項目）を持たせ、
+        検索時は ticket_id でグループ化する。コメント全文は先頭チャンク（親ポイント）にだけ保存する。
+        ペイロードには使用したEmbeddingモデルと次元数も記録する
+        （モデル変更時に「変更なし」と誤判定しないため）。
+
+        名前付きベクトル構成では各チャンクに本文ベクトル（body）を、先頭チャンクには
+        件名ベクトル（subject）も持たせる（件名ベクトルはチケットに1つで十分なため）。
+        スパースベクトルを持つコレクションでは、チャンクのテキストからBM25ベクトルも作る。
+
+        ドキュメントストアが有効な場合は、説明・解決策・コメント・チャンク本文をペイロードから外す
+        （本文は document_record() で作り、ポイントの書き込み成功後にストアへ保存する）。
+
+        Args:
+            document: build_ticket_document() の結果
+            vectors: embedding_texts() と同じ順序のベクトル
+
+        Returns:
+            チャンクごとのポイント
+        """
+        base = {
+            **{k: v for k, v in document["payload"].items() if k != "comments"},
+            "content_hash": document["content_hash"],
+            "embedding_model": self.embedding_model,
+            "embedding_dims": self.vector_size,
+            "chunk_count": len(document["chunks"]),
+            # 解決策の本文をストアに移してもクラスタの代表チケットを選べるように
+            "has_resolution": bool((document["payload"].get("resolution") or "").strip())
+        }
+        if self.doc_store is not None:
+            for field in BULKY_FIELDS:
+                base.pop(field, None)
+
+        chunk_count = len(document["chunks"])
+        subject_vector = vectors[chunk_count] if len(vectors) > chunk_count else None
+        sparse = self.has_sparse_vectors()
+
+        points = []
+        for chunk, vector in zip(document["chunks"], vectors[:chunk_count]):
+            if subject_vector is not None:
+                vector = {VECTOR_BODY: vector}
+                if chunk["chunk_index"] == 0:
+                    vector[VECTOR_SUBJECT] = subject_vector
+            if sparse:
+                if not isinstance(vector, dict):
+                    vector = {DEFAULT_VECTOR: vector}
+                indices, values = self.sparse_encoder.encode_document(chunk["text"])
+                vector[SPARSE_VECTOR] = SparseVector(indices=indices, values=values)
+            payload = {
+                **base,
+                "chunk_index": chunk["chunk_index"],
+                "chunk_type": chunk["chunk_type"]
+            }
+            if self.doc_store is None:
+                payload["chunk_text"] = chunk["text"]
+                if chunk["chunk_index"] == 0 and "comments" in document["payload"]:
+                    payload["comments"] = document["payload"]["comments"]
+            points.append(PointStruct(
+                id=self.chunk_point_id(document["ticket_id"], chunk["chunk_index"]),
+                vector=vector,
+                payload=payload
+            ))
+        return points
+
+    def document_record(self, document: dict) -> Optional[dict]:
+        """
+        ドキュメントストアに保存する本文（ストアが無効な場合はNone）
+
+        ストアはコレクションのバージョン（Blue/Green）間で共有するため、本文にはポイントと同じ
+        content_hash を記録し、検索結果の補完では一致するものだけを使う。
+        """
+        if self.doc_store is None:
+            return None
+        return {
+            "content_hash": document["content_hash"],
+            "description": document["payload"].get("description", ""),
+            "resolution": document["payload"].get("resolution", ""),
+            "comments": document["payload"].get("comments") or [],
+            "chunks": [chunk["text"] for chunk in document["chunks"]]
+        }
+
+    def delete_stale_chunks(self, chunk_counts: Dict[int, int]):
+        """
+        再インデックスでチャンク数が減ったチケットの、余ったチャンクを削除
+
+        Args:
+            chunk_counts: {ticket_id: 新しいチャンク数}
+        """
+        if not chunk_counts:
+            return
+
+        conditions = [
+            Filter(must=[
+                FieldCondition(key="ticket_id", match=MatchValue(value=ticket_id)),
+                FieldCondition(key="chunk_index", range=Range(gte=count))
+            ])
+            for ticket_id, count in chunk_counts.items()
+        ]
+        self.qdrant.delete(
+            collection_name=self.collection_name,
+            points_selector=FilterSelector(filter=Filter(should=conditions)),
+            wait=False
+        )
+
+    def fetch_content_hashes(self, ticket_ids: Optional[List[int]] = None, page_size: int = 1000) -> dict:
+        """
+        インデックス済みチケットのテキストハッシュを一括取得
+
+        ペイロードのうちハッシュ関連のフィールドだけを、親ポイント（先頭チャンク）からのみ
+        取得するので、全件でも軽量。
+        現在のEmbeddingモデル・次元数と異なる設定でインデックスされたポイントは
+        再ベクトル化が必要なため結果に含めない。
+
+        Args:
+            ticket_ids: 対象チケットID（Noneの場合はコレクション全体をscroll）
+            page_size: scroll 1回あたりの取得件数
+
+        Returns:
+            {ticket_id: content_hash}
+        """
+        fields = ["ticket_id", "content_hash", "embedding_model", "embedding_dims"]
+        hashes = {}
+
+        def collect(records):
+            for record in records:
+                payload = record.payload or {}
+                if (
+                    payload.get("content_hash")
+                    and payload.get("embedding_model") == self.embedding_model
+                    and payload.get("embedding_dims") == self.vector_size
+                ):
+                    hashes[payload.get("ticket_id", record.id)] = payload["content_hash"]
+
+        try:
+            if ticket_ids is not None:
+                if ticket_ids:
+                    collect(self.qdrant.retrieve(
+                        collection_name=self.collection_name,
+                        ids=list(ticket_ids),
+                        with_payload=fields,
+                        with_vectors=False
+                    ))
+                return hashes
+
+            offset = None
+            while True:
+                records, offset = self.qdrant.scroll(
+                    collection_name=self.collection_name,
+                    scroll_filter=Filter(must_not=[
+                        FieldCondition(key="chunk_index", range=Range(gt=0))
+                    ]),
+                    limit=page_size,
+                    offset=offset,
+                    with_payload=fields,
+                    with_vectors=False
+                )
+                collect(records)
+                if offset is None:
+                    break
+
+            return hashes
+
+        except Exception as e:
+            print(f"Error fetching content hashes: {e}")
+            raise
+
+    def existing_ticket_ids(self, ticket_ids: List[int], page_size: int = 1000) -> List[int]:
+        """
+        指定したチケットのうち、インデックス済みのものだけを返す
+
+        親ポイント（先頭チャンク）のIDはチケットIDなので、ペイロードなしで retrieve するだけで判定できる。
+
+        Args:
+            ticket_ids: 対象チケットID
+            page_size: retrieve 1回あたりの件数
+
+        Returns:
+            インデックス済みのチケットID（指定順）
+        """
+        ids = list(ticket_ids)
+        found = set()
+        try:
+            for start in range(0, len(ids), page_size):
+                records = self.qdrant.retrieve(
+                    collection_name=self.collection_name,
+                    ids=ids[start:start + page_size],
+                    with_payload=False,
+                    with_vectors=False
+                )
+                found.update(record.id for record in records)
+        except Exception as e:
+            print(f"Error checking indexed tickets: {e}")
+            raise
+        return [ticket_id for ticket_id in ids if ticket_id in found]
+
+    def upsert_points(self, points: List[PointStruct]):
+        """
+        複数ポイントを1回のリクエストでQdrantに保存
+
+        Args:
+            points: 保存するポイントのリスト
+        """
+        if not points:
+            return
+
+        try:
+            self.qdrant.upsert(
+                collection_name=self.collection_name,
+                points=points
+            )
+        except Exception as e:
+            print(f"Error upserting {len(points)} points: {e}")
+            raise
+
     def index_ticket(
         self,
         ticket_id: int,
         subject: str,
         description: str = "",
         resolution: str = "",
-        metadata: dict = None
+        metadata: dict = None,
+        writer: Optional[BufferedPointWriter] = None
     ):
         """
         Redmineチケットをインデックス
 
+        互換性のために残している。ペイロードの形をCLI・APIで揃えるため、
+        新しいコードでは TicketIndexer（app/services/ticket_indexer.py）を使うこと。
+
         Args:
             ticket_id: チケットID
             subject: 件名
             description: 説明
             resolution: 解決策
             metadata: 追加メタデータ（カテゴリ、担当者など）
+            writer: 指定した場合は即時upsertせずライターのバッファに追加
         """
-        # 検索対象となる全文を結合
-        full_text = f"件名: {subject}\n説明: {description}\n解決策: {resolution}"
-
         try:
-            # ベクトル化
-            vector = self.embed_text(full_text)
-
-            # ペイロード作成
-            payload = {
+            document = self.build_ticket_document({
                 "ticket_id": ticket_id,
                 "subject": subject,
                 "description": description,
-                "resolution": resolution,
-                "indexed_at": datetime.now().isoformat()
-            }
+                "resolution": resolution
+            }, with_comments=False)
+            self._index_document(document, metadata, writer)
+            print(f"Indexed ticket #{ticket_id}: {subject}")
+
+        except Exception as e:
+            print(f"Error indexing ticket {ticket_id}: {e}")
+            raise
 
-            # メタデータを追加
-            if metadata:
-                payload.update(metadata)
+    def _index_document(self, document: dict, metadata: Optional[dict], writer: Optional[BufferedPointWriter]):
+        """ドキュメントをベクトル化して保存（ライター指定時はバッファに追加）"""
+        if metadata:
+            document["payload"].update(metadata)
 
-            # Qdrantに保存
+        vectors = self.embed_texts(self.embedding_texts(document))
+        points = self.make_points(document, vectors)
+        record = self.document_record(document)
+
+        if writer is not None:
+            for i, point in enumerate(points):
+                writer.add(point, document=record if i == len(points) - 1 else None)
+        else:
             self.qdrant.upsert(
                 collection_name=self.collection_name,
-                points=[PointStruct(
-                    id=ticket_id,
-                    vector=vector,
-                    payload=payload
-                )]
+                points=points
             )
+            if record is not None:
+                self.doc_store.put_many({document["ticket_id"]: record})
+        self.delete_stale_chunks({document["ticket_id"]: len(points)})
 
-            print(f"Indexed ticket #{ticket_id}: {subject}")
+    def search_ticket_groups(
+        self,
+        query_vector: List[float],
+        limit: int = 5,
+        score_threshold: Optional[float] = None,
+        query_filter: Optional[Filter] = None,
+        collection_name: Optional[str] = None,
+        with_payload=SEARCH_PAYLOAD,
+        using: str = VECTOR_BODY,
+        with_vectors=False
+    ) -> list:
+        """
+        ticket_id でグループ化して検索し、チケットごとに最もスコアの高いチャンクを返す
 
-        except Exception as e:
-            print(f"Error indexing ticket {ticket_id}: {e}")
-            raise
+        長いチケットも、クエリに一致した特定のコメント・説明のチャンクで見つかる。
+        1チケットが上位を占有することもない。
+
+        Args:
+            query_vector: クエリベクトル
+            limit: 取得するチケット数
+            score_threshold: 類似度の閾値
+            query_filter: 絞り込み条件
+            collection_name: 検索対象（省略時はこのサービスのコレクション）
+            with_payload: 取得するペイロード
+            using: 名前付きベクトル構成の場合に検索するベクトル（subject / body）。
+                   1ベクトル構成のコレクションでは無視される
+            with_vectors: 取得するベクトル（dense_vector_selector を参照）
+
+        Returns:
+            チケットごとのベストヒット（ScoredPoint）のリスト（スコア降順）
+        """
+        name = collection_name or self.collection_name
+        if self.is_named_layout(name):
+            query_vector = NamedVector(name=using, vector=query_vector)
+
+        groups = self.qdrant.search_groups(
+            collection_name=name,
+            query_vector=query_vector,
+            group_by="ticket_id",
+            limit=limit,
+            group_size=1,
+            score_threshold=score_threshold,
+            query_filter=query_filter,
+            with_payload=with_payload,
+            with_vectors=with_vectors
+        )
+        return [group.hits[0] for group in groups.groups if group.hits]
+
+    def search_fused(
+        self,
+        query_vector: List[float],
+        weights: Dict[str, float],
+        limit: int = 5,
+        score_threshold: Optional[float] = None,
+        query_filter: Optional[Filter] = None,
+        collection_name: Optional[str] = None,
+        with_payload=SEARCH_PAYLOAD,
+        query_text: Optional[str] = None,
+        with_vectors=False
+    ) -> list:
+        """
+        件名ベクトルと本文ベクトルの検索結果を重み付きで融合
+
+        ベクトルごとにチケット単位で検索し、スコアを重み付き和で合成する。
+        片方の結果にしか出てこないチケットは、もう片方のスコアをその結果の最低スコアで補う。
+        1ベクトル構成のコレクション、または重みが1つのベクトルに偏っている場合は単独検索になる。
+
+        query_text を渡し、コレクションがスパースベクトルを持つ場合はハイブリッド検索
+        （search_hybrid）になる。重みはハイブリッド検索でもRRFの融合に使われる。
+
+        Args:
+            query_vector: クエリベクトル
+            weights: {ベクトル名: 重み}（例: {"subject": 0.7, "body": 0.3}）
+            limit: 取得するチケット数
+            score_threshold: 融合後スコアの閾値
+            query_filter: 絞り込み条件
+            collection_name: 検索対象（省略時はこのサービスのコレクション）
+            with_payload: 取得するペイロード
+            query_text: クエリの原文（スパースベクトルの作成に使う）
+            with_vectors: 取得するベクトル（dense_vector_selector を参照）
+
+        Returns:
+            チケットごとのヒット（score は融合後のスコア、スコア降順）
+        """
+        name = collection_name or self.collection_name
+        active = {vector: w for vector, w in weights.items() if w > 0}
+
+        if query_text and self.has_sparse_vectors(name):
+            return self.search_hybrid(
+                query_text,
+                query_vector,
+                dense_vectors=list(active) or [VECTOR_BODY],
+                weights=active,
+                limit=limit,
+                score_threshold=score_threshold,
+                query_filter=query_filter,
+                collection_name=name,
+                with_payload=with_payload,
+                with_vectors=with_vectors
+            )
+
+        if not self.is_named_layout(name) or len(active) <= 1:
+            using = next(iter(active), VECTOR_BODY)
+            return self.search_ticket_groups(
+                query_vector,
+                limit=limit,
+                score_threshold=score_threshold,
+                query_filter=query_filter,
+                collection_name=name,
+                with_payload=with_payload,
+                using=using,
+                with_vectors=with_vectors
+            )
+
+        # 融合後に順位が入れ替わる分を見込んで多めに取得
+        hits_by_vector = {
+            vector_name: self.search_ticket_groups(
+                query_vector,
+                limit=limit * 3,
+                query_filter=query_filter,
+                collection_name=name,
+                with_payload=with_payload,
+                using=vector_name,
+                with_vectors=with_vectors
+            )
+            for vector_name in active
+        }
+        return self._fuse_weighted(hits_by_vector, active, limit, score_threshold)
+
+    @staticmethod
+    def _fuse_weighted(
+        hits_by_vector: Dict[str, list],
+        active: Dict[str, float],
+        limit: int,
+        score_threshold: Optional[float]
+    ) -> list:
+        """
+        ベクトルごとのチケット単位のヒットを重み付き和で融合（search_fused を参照）
+
+        Args:
+            hits_by_vector: {ベクトル名: チケットごとのヒット（スコア降順）}
+            active: {ベクトル名: 重み}
+            limit: 返すチケット数
+            score_threshold: 融合後スコアの閾値
+        """
+        candidates = {}
+        floors = {}
+        for vector_name, hits in hits_by_vector.items():
+            floors[vector_name] = min((hit.score for hit in hits), default=0.0)
+            for hit in hits:
+                ticket_id = hit.payload.get("ticket_id")
+                candidates.setdefault(ticket_id, {})[vector_name] = hit
+
+        fused = []
+        for ticket_id, hits in candidates.items():
+            score = sum(
+                weight * (hits[vector_name].score if vector_name in hits else floors[vector_name])
+                for vector_name, weight in active.items()
+            )
+            if score_threshold is not None and score < score_threshold:
+                continue
+            # 本文のヒットを優先して返す（一致したチャンクの情報を持つため）
+            hit = hits.get(VECTOR_BODY) or next(iter(hits.values()))
+            hit.score = score
+            fused.append(hit)
+
+        fused.sort(key=lambda hit: hit.score, reverse=True)
+        return fused[:limit]
+
+    def search_hybrid(
+        self,
+        query_text: str,
+        query_vector: List[float],
+        dense_vectors: Optional[List[str]] = None,
+        limit: int = 5,
+        score_threshold: Optional[float] = None,
+        query_filter: Optional[Filter] = None,
+        collection_name: Optional[str] = None,
+        with_payload=SEARCH_PAYLOAD,
+        with_vectors=False,
+        weights: Optional[Dict[str, float]] = None
+    ) -> list:
+        """
+        密ベクトルとスパース（BM25）ベクトルをRRF融合して検索
+
+        密ベクトルごと・スパースベクトルでそれぞれ候補を取り（prefetch）、
+        Reciprocal Rank Fusion で順位を合成してから ticket_id でグループ化する。
+        ホスト名やエラーコードのような完全一致トークンはスパース側で拾える。
+
+        密ベクトルの重み（weights）が均等でない場合は、候補リストごとに検索して重み付きRRFを
+        クライアント側で計算する（QdrantのRRFは候補リストに重みを付けられないため）。
+        重みは並び順に効き、件名重視（アラート）・本文重視（自然文）の違いがハイブリッド検索でも保たれる。
+
+        並び順は（重み付き）RRFの順位のまま、score は返すチャンクと密ベクトルのコサイン類似度
+        （複数の密ベクトルは同じ重みでの加重平均）にする。類似度は融合後のヒットだけを対象に
+        もう1回の問い合わせで取得し、score_threshold もこの類似度に適用する
+        （スパース側だけで見つかった低類似度のヒットも閾値で落ちる）。閾値で落ちる分を見込んで
+        limit の2倍のチケットを取り、閾値の適用後に limit 件にする。
+        RRFスコアは0〜1に正規化して payload["fusion_score"] に入れる。
+
+        Args:
+            query_text: クエリの原文
+            query_vector: クエリの密ベクトル
+            dense_vectors: 使う密ベクトル名（名前付き構成のみ、省略時は body）
+            limit: 取得するチケット数
+            score_threshold: 類似度（コサイン）の閾値
+            query_filter: 絞り込み条件
+            collection_name: 検索対象（省略時はこのサービスのコレクション）
+            with_payload: 取得するペイロード
+            with_vectors: 取得するベクトル（dense_vector_selector を参照）
+            weights: 密ベクトルごとの重み（RRFの融合と類似度の重み付き平均に使う、省略時は均等）
+
+        Returns:
+            チケットごとのヒット（RRFの順位順）
+        """
+        name = collection_name or self.collection_name
+        fetch_limit = limit * 2 if score_threshold is not None else limit
+        prefetch = self._hybrid_prefetch(
+            query_text, query_vector, dense_vectors, fetch_limit * 3, score_threshold, query_filter, name
+        )
+
+        list_weights = self._fusion_weights(prefetch, weights)
+        if list_weights is None:
+            result = self.qdrant.query_points_groups(
+                collection_name=name,
+                prefetch=prefetch,
+                query=FusionQuery(fusion=Fusion.RRF),
+                group_by="ticket_id",
+                group_size=1,
+                limit=fetch_limit,
+                with_payload=with_payload,
+                with_vectors=with_vectors
+            )
+            hits = [group.hits[0] for group in result.groups if group.hits]
+            list_weights = [1.0] * len(prefetch)
+        else:
+            responses = self.qdrant.query_batch_points(
+                collection_name=name,
+                requests=self._prefetch_requests(prefetch, with_payload, with_vectors)
+            )
+            hits = self._fuse_rrf([response.points for response in responses], list_weights, fetch_limit)
+        if not hits:
+            return []
+
+        dense_weights = self._dense_weights(name, dense_vectors, weights)
+        rescored = self.qdrant.query_batch_points(
+            collection_name=name,
+            requests=self._dense_rescore_requests(query_vector, dense_weights, hits)
+        )
+        return self._apply_dense_scores(hits, rescored, dense_weights, sum(list_weights), score_threshold)[:limit]
+
+    @staticmethod
+    def _fusion_weights(prefetch: List[Prefetch], weights: Optional[Dict[str, float]]) -> Optional[List[float]]:
+        """
+        候補リストごとのRRFの重み（密ベクトルの重みが均等ならNone: QdrantのRRFでそのまま融合する）
+
+        密ベクトルの候補リストには重みを平均1になるように配分し、スパースの候補リストは1にする
+        （重みが均等なら通常のRRFと同じ結果になる）。
+        """
+        raw = [(weights or {}).get(p.using, 1.0) for p in prefetch if p.using != SPARSE_VECTOR]
+        total = sum(raw)
+        if not raw or total <= 0 or max(raw) - min(raw) < 1e-9:
+            return None
+        scaled = iter(w * len(raw) / total for w in raw)
+        return [1.0 if p.using == SPARSE_VECTOR else next(scaled) for p in prefetch]
+
+    @staticmethod
+    def _prefetch_requests(prefetch: List[Prefetch], with_payload, with_vectors) -> List[QueryRequest]:
+        """候補リストをそれぞれ単独のクエリにする（重み付きRRFをクライアント側で計算するため）"""
+        return [
+            QueryRequest(
+                query=p.query,
+                using=p.using,
+                limit=p.limit,
+                score_threshold=p.score_threshold,
+                filter=p.filter,
+                with_payload=with_payload,
+                with_vector=with_vectors
+            )
+            for p in prefetch
+        ]
+
+    @staticmethod
+    def _fuse_rrf(point_lists: List[list], list_weights: List[float], limit: int) -> list:
+        """
+        候補リスト（チャンク単位、スコア降順）を重み付きRRFで融合し、チケットごとの最上位を返す
+
+        スコアは Σ 重み / (RRF_K + 順位)（順位は0始まり）。返すヒットの score はこのRRFスコア。
+        """
+        scores: Dict = {}
+        points: Dict = {}
+        for weight, listed in zip(list_weights, point_lists):
+            for rank, point in enumerate(listed):
+                scores[point.id] = scores.get(point.id, 0.0) + weight / (RRF_K + rank)
+                points.setdefault(point.id, point)
+
+        hits = []
+        seen = set()
+        for point_id in sorted(scores, key=scores.get, reverse=True):
+            point = points[point_id]
+            ticket_id = point.payload.get("ticket_id")
+            if ticket_id in seen:
+                continue
+            seen.add(ticket_id)
+            point.score = scores[point_id]
+            hits.append(point)
+            if len(hits) >= limit:
+                break
+        return hits
+
+    def _dense_weights(
+        self,
+        collection_name: str,
+        dense_vectors: Optional[List[str]],
+        weights: Optional[Dict[str, float]] = None
+    ) -> Dict[str, float]:
+        """ハイブリッド検索で使う密ベクトル名と類似度の重み（_hybrid_prefetch と同じベクトル）"""
+        if not self.is_named_layout(collection_name):
+            return {DEFAULT_VECTOR: 1.0}
+        return {using: (weights or {}).get(using, 1.0) for using in dense_vectors or [VECTOR_BODY]}
+
+    @staticmethod
+    def _dense_rescore_requests(query_vector: List[float], dense_weights: Dict[str, float], hits: list) -> List[QueryRequest]:
+        """融合後のヒット（チャンク）だけを対象に、密ベクトルごとのコサイン類似度を取るリクエスト"""
+        ids = [hit.id for hit in hits]
+        return [
+            QueryRequest(
+                query=query_vector,
+                using=using or None,
+                filter=Filter(must=[HasIdCondition(has_id=ids)]),
+                limit=len(ids),
+                with_payload=False
+            )
+            for using in dense_weights
+        ]
+
+    @staticmethod
+    def _apply_dense_scores(
+        hits: list,
+        rescored: list,
+        dense_weights: Dict[str, float],
+        fusion_weight: float,
+        score_threshold: Optional[float]
+    ) -> list:
+        """
+        RRFで並んだヒットの score を密ベクトルの類似度に置き換え、閾値未満を除く
+
+        Args:
+            hits: RRFの順位順のヒット（score はRRFスコア）
+            rescored: _dense_rescore_requests() の応答（密ベクトルごと）
+            dense_weights: {密ベクトル名: 重み}
+            fusion_weight: RRFで融合した候補リストの重みの合計（重みなしなら候補リストの数。正規化に使う）
+            score_threshold: 類似度の閾値
+        """
+        total_weight = sum(dense_weights.values()) or 1.0
+        similarity: Dict = {}
+        for weight, response in zip(dense_weights.values(), rescored):
+            for point in response.points:
+                similarity[point.id] = similarity.get(point.id, 0.0) + weight * point.score
+
+        # 全候補リストで1位のときのRRFスコアで割って0〜1にする
+        max_fusion = fusion_weight / RRF_K
+        results = []
+        for hit in hits:
+            score = similarity.get(hit.id, 0.0) / total_weight
+            if score_threshold is not None and score < score_threshold:
+                continue
+            if hit.payload is not None:
+                hit.payload["fusion_score"] = min(hit.score / max_fusion, 1.0)
+            hit.score = score
+            results.append(hit)
+        return results
+
+    def _hybrid_prefetch(
+        self,
+        query_text: str,
+        query_vector: List[float],
+        dense_vectors: Optional[List[str]],
+        candidates: int,
+        score_threshold: Optional[float],
+        query_filter: Optional[Filter],
+        collection_name: str
+    ) -> List[Prefetch]:
+        """ハイブリッド検索の候補取得（密ベクトルごと＋スパースベクトル）"""
+        if self.is_named_layout(collection_name):
+            usings = dense_vectors or [VECTOR_BODY]
+        else:
+            usings = [DEFAULT_VECTOR]
+
+        prefetch = [
+            Prefetch(
+                query=query_vector,
+                using=using,
+                limit=candidates,
+                score_threshold=score_threshold,
+                filter=query_filter
+            )
+            for using in usings
+        ]
+        indices, values = self.sparse_encoder.encode_query(query_text)
+        if indices:
+            prefetch.append(Prefetch(
+                query=SparseVector(indices=indices, values=values),
+                using=SPARSE_VECTOR,
+                limit=candidates,
+                filter=query_filter
+            ))
+        return prefetch
+
+    def search_by_keyword(
+        self,
+        keyword: str,
+        limit: int = 10,
+        query_filter: Optional[Filter] = None,
+        collection_name: Optional[str] = None,
+        with_payload=SEARCH_PAYLOAD
+    ) -> list:
+        """
+        スパース（BM25）ベクトルだけでキーワード検索（Embedding APIを呼ばない）
+
+        Redmineの件名 LIKE 検索（RedmineService.search_tickets_by_keyword）の代わりに使える。
+        説明・コメントも対象になる。
+
+        Args:
+            keyword: 検索キーワード（ホスト名、エラーコードなど）
+            limit: 取得するチケット数
+            query_filter: 絞り込み条件
+            collection_name: 検索対象（省略時はこのサービスのコレクション）
+            with_payload: 取得するペイロード
+
+        Returns:
+            チケットごとのヒット（BM25スコア降順）。スパースベクトルのないコレクションでは空
+        """
+        name = collection_name or self.collection_name
+        if not self.has_sparse_vectors(name):
+            return []
+        indices, values = self.sparse_encoder.encode_query(keyword)
+        if not indices:
+            return []
+
+        result = self.qdrant.query_points_groups(
+            collection_name=name,
+            query=SparseVector(indices=indices, values=values),
+            using=SPARSE_VECTOR,
+            query_filter=query_filter,
+            group_by="ticket_id",
+            group_size=1,
+            limit=limit,
+            with_payload=with_payload
+        )
+        return [group.hits[0] for group in result.groups if group.hits]
+
+    def dense_vector_selector(self, collection_name: Optional[str] = None):
+        """検索で本文の密ベクトルだけを返させる with_vectors の値"""
+        name = collection_name or self.collection_name
+        if self.is_named_layout(name):
+            return [VECTOR_BODY]
+        if self.has_sparse_vectors(name):
+            return [DEFAULT_VECTOR]
+        return True
+
+    @staticmethod
+    def dense_vector(hit) -> Optional[List[float]]:
+        """ヒットから本文の密ベクトルを取り出す（ベクトルを取得していない場合は None）"""
+        vector = hit.vector
+        if isinstance(vector, dict):
+            return vector.get(VECTOR_BODY) or vector.get(DEFAULT_VECTOR)
+        return vector
+
+    def _finalize_results(
+        self,
+        query: str,
+        results: List[dict],
+        vectors: Dict[int, List[float]],
+        limit: int,
+        rerank: bool,
+        diversify: bool
+    ) -> List[dict]:
+        """
+        多めに取った候補を再ランキング・多様化して limit 件にする
+
+        Args:
+            query: 検索クエリ
+            results: 候補（類似度順）
+            vectors: {ticket_id: 本文ベクトル}（多様化する場合のみ）
+            limit: 返す件数
+            rerank: クロスエンコーダで並べ替えるか
+            diversify: 同じクラスタ・ほぼ重複したチケットを集約し、MMRで選ぶか
+        """
+        if rerank:
+            results = self.reranker.rerank(query, results)
+        if diversify:
+            results = collapse_clusters(results)
+            results = diversify_results(results, [vectors.get(r["ticket_id"]) for r in results], limit)
+        return results[:limit]
+
+    def fetch_canonical_resolutions(self, results: List[dict]) -> Dict[int, dict]:
+        """
+        検索結果のクラスタの代表チケットの解決策を取得
+
+        繰り返し起票されたアラートのチケットは、クラスタの代表チケット（解決策があり最も新しく
+        完了したもの）の対応をそのまま参照できる。
+
+        Args:
+            results: search_similar_tickets() の結果
+
+        Returns:
+            {代表チケットID: {"ticket_id", "subject", "resolution", "closed_on"}}
+        """
+        canonical_ids = sorted({
+            r["cluster_canonical_id"] for r in results
+            if r.get("cluster_canonical_id") and (r.get("cluster_size") or 1) > 1
+        })
+        if not canonical_ids:
+            return {}
+
+        # 先頭チャンク（親ポイント）のIDはチケットIDと同じ
+        records = self.qdrant.retrieve(
+            collection_name=self.collection_name,
+            ids=canonical_ids,
+            with_payload=["ticket_id", "subject", "resolution", "closed_on", "content_hash"],
+            with_vectors=False
+        )
+        content_hashes = self._content_hashes(records)
+        canonical = {
+            record.payload["ticket_id"]: {
+                "ticket_id": record.payload["ticket_id"],
+                "subject": record.payload.get("subject"),
+                "resolution": record.payload.get("resolution", ""),
+                "closed_on": record.payload.get("closed_on")
+            }
+            for record in records
+        }
+        self.hydrate_results(list(canonical.values()), content_hashes)
+        return canonical
+
+    @staticmethod
+    def _content_hashes(hits) -> Dict[int, str]:
+        """検索ヒット・レコードの {チケットID: content_hash}"""
+        return {
+            (hit.payload or {}).get("ticket_id"): (hit.payload or {}).get("content_hash")
+            for hit in hits
+        }
+
+    def hydrate_results(self, results: List[dict], content_hashes: Optional[Dict[int, str]] = None) -> List[dict]:
+        """
+        ドキュメントストアから説明・解決策・一致したチャンク本文を補う（ストアが有効な場合のみ）
+
+        ペイロードに値がある項目（ストア導入前のポイント）はそのまま使う。
+        説明・解決策は結果にその項目がある場合だけ、チャンク本文は matched_text がある場合だけ補う。
+        ストアは全コレクションバージョンで共有するため、ヒットしたポイントと content_hash が
+        異なる本文（Blue/Greenの構築中に更新された・書き込みに失敗したチケットなど）は使わない。
+
+        Args:
+            results: 検索結果
+            content_hashes: ヒットしたポイントの {チケットID: content_hash}（省略時は照合しない）
+        """
+        if self.doc_store is None or not results:
+            return results
+
+        documents = self.doc_store.get_many(r["ticket_id"] for r in results)
+        for result in results:
+            document = documents.get(result["ticket_id"])
+            if not document:
+                continue
+            expected = (content_hashes or {}).get(result["ticket_id"])
+            if expected and document.get("content_hash") and document["content_hash"] != expected:
+                continue
+            for field in ("description", "resolution"):
+                if field in result and not result[field]:
+                    result[field] = document.get(field, "")
+            if "matched_text" in result and not result["matched_text"]:
+                chunks = document.get("chunks", [])
+                chunk_index = result.get("matched_chunk_index") or 0
+                if chunk_index < len(chunks):
+                    result["matched_text"] = chunks[chunk_index]
+        return results
+
+    def fetch_comments(self, ticket_ids: List[int]) -> Dict[int, List[dict]]:
+        """親ポイント（先頭チャンク）またはドキュメントストアからコメント全文を取得"""
+        if not ticket_ids:
+            return {}
+        if self.doc_store is not None:
+            stored = {
+                ticket_id: document.get("comments", [])
+                for ticket_id, document in self.doc_store.get_many(ticket_ids).items()
+            }
+            if len(stored) == len(set(ticket_ids)):
+                return stored
+        records = self.qdrant.retrieve(
+            collection_name=self.collection_name,
+            ids=list(ticket_ids),
+            with_payload=["ticket_id", "comments"],
+            with_vectors=False
+        )
+        return {
+            (record.payload or {}).get("ticket_id", record.id): (record.payload or {}).get("comments", [])
+            for record in records
+        }
 
     def search_similar_tickets(
         self,
         alert_message: str,
         limit: int = 5,
-        score_threshold: float = 0.3
+        score_threshold: float = 0.3,
+        weights: Optional[Dict[str, float]] = None,
+        rerank: bool = True,
+        diversify: Optional[bool] = None,
+        shape: str = "full"
     ) -> List[dict]:
         """
         類似チケット検索
@@ -137,47 +1674,299 @@ class VectorService:
             alert_message: 検索クエリ（アラートメッセージ）
             limit: 取得する最大件数
             score_threshold: 類似度の閾値（0.0-1.0）
+            weights: 件名・本文ベクトルの融合重み（省略時は self.query_weights、
+                     アラート文には self.alert_weights を渡す）
+            rerank: クロスエンコーダで並べ替えるか（再ランキングが有効な場合のみ）
+            diversify: ほぼ重複したチケットを集約し、MMRで多様化するか
+                       （省略時は SEARCH_DIVERSIFY、デフォルト: false）
+            shape: 結果の形（"lite": 一覧表示・アラート応答用の項目のみ / "full": 一致したチャンク本文なども含む）
 
         Returns:
-            類似チケットのリスト
+            類似チケットのリスト（再ランキングした場合は rerank_score、
+            多様化した場合は duplicate_count / duplicate_ticket_ids 付き）
         """
         try:
+            rerank = rerank and self.reranker.enabled
+            if diversify is None:
+                diversify = self.diversify_default
+
+            # 再ランキング・多様化する場合は候補を多めに取る
+            candidates = self._candidate_count(limit, rerank, diversify)
+
             # クエリをベクトル化
             query_vector = self.embed_text(alert_message)
 
-            # Qdrantで検索
-            search_results = self.qdrant.search(
-                collection_name=self.collection_name,
-                query_vector=query_vector,
-                limit=limit,
+            # Qdrantで検索（チケット単位でグループ化、件名・本文ベクトルを融合）
+            started = time.perf_counter()
+            search_results = self.search_fused(
+                query_vector,
+                weights or self.query_weights,
+                limit=candidates,
                 score_threshold=score_threshold,
-                with_payload=True
+                with_payload=self.payload_selector(shape, rerank),
+                query_text=alert_message,
+                with_vectors=self.dense_vector_selector() if diversify else False
             )
+            self._record_payload_stats(f"similar:{shape}", search_results, time.perf_counter() - started)
 
             # 結果を整形
-            results = []
-            for hit in search_results:
-                results.append({
-                    "ticket_id": hit.payload.get("ticket_id"),
-                    "similarity": hit.score,
-                    "subject": hit.payload.get("subject"),
-                    "description": hit.payload.get("description", ""),
-                    "resolution": hit.payload.get("resolution", ""),
-                    "category": hit.payload.get("category"),
-                    "assigned_to": hit.payload.get("assigned_to"),
-                    "closed_on": hit.payload.get("closed_on"),
-                    "status": hit.payload.get("status")
-                })
+            results = self.hydrate_results(
+                [self._hit_to_result(hit, shape) for hit in search_results], self._content_hashes(search_results)
+            )
 
-            return results
+            vectors = {hit.payload.get("ticket_id"): self.dense_vector(hit) for hit in search_results} if diversify else {}
+            return self._finalize_results(alert_message, results, vectors, limit, rerank, diversify)
 
         except Exception as e:
             print(f"Error searching similar tickets: {e}")
             raise
 
+    def search_similar_tickets_batch(
+        self,
+        alert_messages: List[str],
+        limit: int = 5,
+        score_threshold: float = 0.3,
+        weights: Optional[Dict[str, float]] = None,
+        rerank: bool = True,
+        diversify: Optional[bool] = None,
+        shape: str = "full"
+    ) -> List[List[dict]]:
+        """
+        複数クエリの類似チケット検索をまとめて実行（Embedding API 1回、Qdrant 1回）
+
+        search_similar_tickets() と同じ検索（融合・ハイブリッド・再ランキング・多様化）を、
+        Qdrantのバッチクエリで全クエリ分まとめて行う。
+        バッチクエリはグループ化できないため、チャンク単位で多めに取ってチケット単位にまとめる。
+
+        Args:
+            alert_messages: 検索クエリのリスト
+            limit: クエリごとに取得する最大件数
+            score_threshold: 類似度の閾値（0.0-1.0）
+            weights: 件名・本文ベクトルの融合重み（省略時は self.query_weights）
+            rerank: クロスエンコーダで並べ替えるか（再ランキングが有効な場合のみ）
+            diversify: ほぼ重複したチケットを集約し、MMRで多様化するか（省略時は SEARCH_DIVERSIFY）
+            shape: 結果の形（"lite" / "full"、search_similar_tickets() を参照）
+
+        Returns:
+            クエリと同じ順の、類似チケットのリストのリスト
+        """
+        if not alert_messages:
+            return []
+
+        rerank = rerank and self.reranker.enabled
+        if diversify is None:
+            diversify = self.diversify_default
+        candidates = self._candidate_count(limit, rerank, diversify)
+        # 1チケットに複数チャンクがあるので、チャンク単位では多めに取る
+        chunk_limit = candidates * 3
+
+        name = self.collection_name
+        active = {vector: w for vector, w in (weights or self.query_weights).items() if w > 0}
+        named = self.is_named_layout(name)
+        hybrid = self.has_sparse_vectors(name)
+        with_vector = self.dense_vector_selector(name) if diversify else False
+        with_payload = self.payload_selector(shape, rerank)
+
+        query_vectors = self.embed_texts(alert_messages)
+
+        # クエリごとのリクエスト（重み付き融合はベクトルごとに1リクエスト）
+        requests = []
+        plans = []
+        for text, vector in zip(alert_messages, query_vectors):
+            if hybrid:
+                prefetch = self._hybrid_prefetch(
+                    text, vector, list(active) or [VECTOR_BODY], chunk_limit, score_threshold, None, name
+                )
+                list_weights = self._fusion_weights(prefetch, active)
+                if list_weights is None:
+                    plans.append(("hybrid", len(requests), [1.0] * len(prefetch)))
+                    requests.append(QueryRequest(
+                        prefetch=prefetch,
+                        query=FusionQuery(fusion=Fusion.RRF),
+                        limit=chunk_limit,
+                        with_payload=with_payload,
+                        with_vector=with_vector
+                    ))
+                else:
+                    # 重みが均等でなければ候補リストごとに取り、重み付きRRFで融合する（search_hybrid を参照）
+                    plans.append(("hybrid_weighted", len(requests), list_weights))
+                    requests.extend(self._prefetch_requests(prefetch, with_payload, with_vector))
+            elif named and len(active) > 1:
+                plans.append(("fused", len(requests), list(active)))
+                for vector_name in active:
+                    requests.append(QueryRequest(
+                        query=vector,
+                        using=vector_name,
+                        limit=chunk_limit,
+                        with_payload=with_payload,
+                        with_vector=with_vector
+                    ))
+            else:
+                plans.append(("single", len(requests), None))
+                requests.append(QueryRequest(
+                    query=vector,
+                    using=next(iter(active), VECTOR_BODY) if named else None,
+                    limit=chunk_limit,
+                    score_threshold=score_threshold,
+                    with_payload=with_payload,
+                    with_vector=with_vector
+                ))
+
+        started = time.perf_counter()
+        responses = self.qdrant.query_batch_points(collection_name=name, requests=requests)
+        self._record_payload_stats(
+            f"similar_batch:{shape}",
+            [point for response in responses for point in response.points],
+            time.perf_counter() - started
+        )
+
+        def best_per_ticket(points, max_tickets):
+            """チャンク単位のヒット（スコア降順）から、チケットごとの最上位を取り出す"""
+            seen = set()
+            hits = []
+            for point in points:
+                ticket_id = point.payload.get("ticket_id")
+                if ticket_id in seen:
+                    continue
+                seen.add(ticket_id)
+                hits.append(point)
+                if len(hits) >= max_tickets:
+                    break
+            return hits
+
+        # ハイブリッド検索のヒットは、密ベクトルの類似度をまとめてもう1回のバッチで取得する
+        # （類似度の閾値で落ちる分を見込んで多めに取り、閾値の適用後に candidates 件にする）
+        hybrid_hits = {}
+        rescore_requests = []
+        rescore_starts = {}
+        dense_weights = self._dense_weights(name, list(active) or [VECTOR_BODY], active) if hybrid else {}
+        hybrid_candidates = candidates * 2 if score_threshold is not None else candidates
+        for index, (kind, start, extra) in enumerate(plans):
+            if kind == "hybrid":
+                hits = best_per_ticket(responses[start].points, hybrid_candidates)
+            elif kind == "hybrid_weighted":
+                hits = self._fuse_rrf(
+                    [responses[start + i].points for i in range(len(extra))], extra, hybrid_candidates
+                )
+            else:
+                continue
+            hybrid_hits[index] = hits
+            if hits:
+                rescore_starts[index] = len(rescore_requests)
+                rescore_requests.extend(self._dense_rescore_requests(query_vectors[index], dense_weights, hits))
+        rescored = self.qdrant.query_batch_points(collection_name=name, requests=rescore_requests) if rescore_requests else []
+
+        all_results = []
+        for index, (text, (kind, start, extra)) in enumerate(zip(alert_messages, plans)):
+            if kind in ("hybrid", "hybrid_weighted"):
+                hits = hybrid_hits[index]
+                if hits:
+                    offset = rescore_starts[index]
+                    hits = self._apply_dense_scores(
+                        hits, rescored[offset:offset + len(dense_weights)], dense_weights, sum(extra), score_threshold
+                    )[:candidates]
+            elif kind == "fused":
+                hits_by_vector = {
+                    vector_name: best_per_ticket(responses[start + i].points, candidates)
+                    for i, vector_name in enumerate(extra)
+                }
+                hits = self._fuse_weighted(hits_by_vector, active, candidates, score_threshold)
+            else:
+                hits = best_per_ticket(responses[start].points, candidates)
+
+            results = self.hydrate_results([self._hit_to_result(hit, shape) for hit in hits], self._content_hashes(hits))
+            vectors = {hit.payload.get("ticket_id"): self.dense_vector(hit) for hit in hits} if diversify else {}
+            all_results.append(self._finalize_results(text, results, vectors, limit, rerank, diversify))
+
+        return all_results
+
+    def _candidate_count(self, limit: int, rerank: bool, diversify: bool) -> int:
+        """再ランキング・多様化の前に取る候補数"""
+        candidates = limit
+        if rerank:
+            candidates = max(candidates, limit * self.reranker.candidate_factor)
+        if diversify:
+            candidates = max(candidates, limit * self.diversify_candidate_factor)
+        return candidates
+
+    @staticmethod
+    def payload_selector(shape: str = "full", rerank: bool = False):
+        """
+        結果の形に合わせて取得するペイロード
+
+        Args:
+            shape: "lite" / "full"
+            rerank: 再ランキングするか（lite でもクロスエンコーダ用に一致したチャンク本文を取る）
+        """
+        if shape not in RESULT_SHAPES:
+            raise ValueError(f"Unknown result shape: {shape} (expected one of {RESULT_SHAPES})")
+        if shape == "lite":
+            return PayloadSelectorInclude(
+                include=LITE_PAYLOAD_FIELDS + (["chunk_index", "chunk_type", "chunk_text"] if rerank else [])
+            )
+        return SEARCH_PAYLOAD
+
+    def _record_payload_stats(self, label: str, hits: list, seconds: float):
+        """検索で受け取ったペイロードのサイズ（JSON換算）と検索時間を記録"""
+        if not self.payload_stats_enabled:
+            return
+        size = sum(
+            len(json.dumps(hit.payload or {}, ensure_ascii=False, default=str).encode("utf-8")) for hit in hits
+        )
+        with self._payload_stats_lock:
+            entry = self.payload_stats.setdefault(label, {"searches": 0, "hits": 0, "payload_bytes": 0, "seconds": 0.0})
+            entry["searches"] += 1
+            entry["hits"] += len(hits)
+            entry["payload_bytes"] += size
+            entry["seconds"] += seconds
+
+    def payload_stats_summary(self) -> Dict[str, dict]:
+        """検索の種類（メソッド:結果の形）ごとの1回あたりのヒット数・ペイロードサイズ・検索時間"""
+        with self._payload_stats_lock:
+            return {
+                label: {
+                    "searches": entry["searches"],
+                    "avg_hits": entry["hits"] / entry["searches"],
+                    "avg_payload_bytes": entry["payload_bytes"] / entry["searches"],
+                    "avg_bytes_per_hit": entry["payload_bytes"] / entry["hits"] if entry["hits"] else 0,
+                    "avg_ms": entry["seconds"] * 1000 / entry["searches"]
+                }
+                for label, entry in self.payload_stats.items()
+            }
+
+    @staticmethod
+    def _hit_to_result(hit, shape: str = "full") -> dict:
+        """検索ヒットを類似チケットの辞書に整形（lite でチャンク本文を取得していなければ matched_* を含めない）"""
+        result = {
+            "ticket_id": hit.payload.get("ticket_id"),
+            "similarity": hit.score,
+            "subject": hit.payload.get("subject"),
+            "description": hit.payload.get("description", ""),
+            "resolution": hit.payload.get("resolution", ""),
+            "category": hit.payload.get("category"),
+            "assigned_to": hit.payload.get("assigned_to"),
+            "closed_on": hit.payload.get("closed_on"),
+            "status": hit.payload.get("status"),
+            "priority": hit.payload.get("priority"),
+            "tracker": hit.payload.get("tracker"),
+            "project": hit.payload.get("project"),
+            "enriched_at": hit.payload.get("enriched_at"),
+            "matched_chunk_type": hit.payload.get("chunk_type"),
+            "matched_chunk_index": hit.payload.get("chunk_index"),
+            "matched_text": hit.payload.get("chunk_text"),
+            "cluster_id": hit.payload.get("cluster_id"),
+            "cluster_size": hit.payload.get("cluster_size", 1),
+            "cluster_canonical_id": hit.payload.get("cluster_canonical_id")
+        }
+        if shape == "lite" and "chunk_type" not in hit.payload:
+            del result["matched_chunk_type"], result["matched_chunk_index"], result["matched_text"]
+        if "fusion_score" in hit.payload:
+            result["fusion_score"] = hit.payload["fusion_score"]
+        return result
+
     def delete_ticket(self, ticket_id: int):
         """
-        チケットをインデックスから削除
+        チケットをインデックスから削除（すべてのチャンク）
 
         Args:
             ticket_id: 削除するチケットID
@@ -185,13 +1974,41 @@ class VectorService:
         try:
             self.qdrant.delete(
                 collection_name=self.collection_name,
-                points_selector=[ticket_id]
+                points_selector=FilterSelector(filter=Filter(must=[
+                    FieldCondition(key="ticket_id", match=MatchValue(value=ticket_id))
+                ]))
             )
+            if self.doc_store is not None:
+                self.doc_store.delete_many([ticket_id])
             print(f"Deleted ticket #{ticket_id} from index")
         except Exception as e:
             print(f"Error deleting ticket {ticket_id}: {e}")
             raise
 
+    def delete_tickets(self, ticket_ids: List[int]):
+        """
+        複数チケットをまとめてインデックスから削除
+
+        Args:
+            ticket_ids: 削除するチケットIDのリスト
+        """
+        if not ticket_ids:
+            return
+
+        try:
+            self.qdrant.delete(
+                collection_name=self.collection_name,
+                points_selector=FilterSelector(filter=Filter(must=[
+                    FieldCondition(key="ticket_id", match=MatchAny(any=list(ticket_ids)))
+                ]))
+            )
+            if self.doc_store is not None:
+                self.doc_store.delete_many(list(ticket_ids))
+            print(f"Deleted {len(ticket_ids)} tickets from index")
+        except Exception as e:
+            print(f"Error deleting {len(ticket_ids)} tickets: {e}")
+            raise
+
     def get_collection_info(self) -> dict:
         """
         コレクション情報を取得
@@ -203,6 +2020,8 @@ class VectorService:
             collection_info = self.qdrant.get_collection(self.collection_name)
             return {
                 "name": self.collection_name,
+                "mode": qdrant_mode(),
+                "collection": self.resolve_alias(self.collection_name) or self.collection_name,
                 "vectors_count": collection_info.vectors_count,
                 "points_count": collection_info.points_count,
                 "status": collection_info.status
@@ -218,11 +2037,14 @@ class VectorService:
         description: str = "",
         resolution: str = "",
         comments: List[dict] = None,
-        metadata: dict = None
+        metadata: dict = None,
+        writer: Optional[BufferedPointWriter] = None
     ):
         """
         チケットをコメント付きでインデックス（Phase 2拡張機能）
 
+        互換性のために残している。新しいコードでは TicketIndexer を使うこと。
+
         Args:
             ticket_id: チケットID
             subject: 件名
@@ -230,45 +2052,17 @@ class VectorService:
             resolution: 解決策
             comments: コメントリスト [{"user": "...", "created_on": "...", "notes": "..."}]
             metadata: 追加メタデータ（category, assigned_to, created_on, closed_onなど）
+            writer: 指定した場合は即時upsertせずライターのバッファに追加
         """
-        # コメントを全文に含める
-        comments_text = ""
-        if comments:
-            comments_text = "\n".join([
-                f"コメント ({c.get('user', 'N/A')}, {c.get('created_on', 'N/A')}): {c.get('notes', '')}"
-                for c in comments
-            ])
-
-        full_text = f"件名: {subject}\n説明: {description}\n解決策: {resolution}\n{comments_text}"
-
         try:
-            # ベクトル化
-            vector = self.embed_text(full_text)
-
-            # ペイロード作成（拡張メタデータ）
-            payload = {
+            document = self.build_ticket_document({
                 "ticket_id": ticket_id,
                 "subject": subject,
                 "description": description,
                 "resolution": resolution,
-                "comments": comments or [],
-                "indexed_at": datetime.now().isoformat()
-            }
-
-            # メタデータを追加
-            if metadata:
-                payload.update(metadata)
-
-            # Qdrantに保存
-            self.qdrant.upsert(
-                collection_name=self.collection_name,
-                points=[PointStruct(
-                    id=ticket_id,
-                    vector=vector,
-                    payload=payload
-                )]
-            )
-
+                "comments": comments or []
+            }, with_comments=True)
+            self._index_document(document, metadata, writer)
             print(f"Indexed ticket #{ticket_id} with {len(comments or [])} comments: {subject}")
 
         except Exception as e:
@@ -281,7 +2075,10 @@ class VectorService:
         limit: int = 5,
         score_threshold: float = 0.3,
         date_range: Optional[dict] = None,
-        server_filter: Optional[List[str]] = None
+        server_filter: Optional[List[str]] = None,
+        weights: Optional[Dict[str, float]] = None,
+        rerank: bool = True,
+        diversify: Optional[bool] = None
     ) -> List[dict]:
         """
         高度な類似チケット検索（日付・サーバー名フィルタ対応）（Phase 2拡張機能）
@@ -292,11 +2089,23 @@ class VectorService:
             score_threshold: 類似度閾値
             date_range: {"start": "YYYY-MM-DD", "end": "YYYY-MM-DD"}
             server_filter: サーバー名リスト
+            weights: 件名・本文ベクトルの融合重み（省略時は self.query_weights）
+            rerank: クロスエンコーダで並べ替えるか（再ランキングが有効な場合のみ）
+            diversify: ほぼ重複したチケットを集約し、MMRで多様化するか
+                       （省略時は SEARCH_DIVERSIFY、デフォルト: false）
 
         Returns:
-            類似チケットのリスト
+            類似チケットのリスト（再ランキングした場合は rerank_score、
+            多様化した場合は duplicate_count / duplicate_ticket_ids 付き）
         """
         try:
+            rerank = rerank and self.reranker.enabled
+            if diversify is None:
+                diversify = self.diversify_default
+
+            # 再ランキング・多様化する場合は候補を多めに取り、並べ替えてから limit 件に絞る
+            candidates = self._candidate_count(limit, rerank, diversify)
+
             # クエリをベクトル化
             query_vector = self.embed_text(alert_message)
 
@@ -331,21 +2140,18 @@ class VectorService:
             # TODO: Qdrantのネストフィールド検索機能を使用
             # 現在は検索後にPythonでフィルタリング
 
-            # 検索パラメータ構築
-            search_params = {
-                "collection_name": self.collection_name,
-                "query_vector": query_vector,
-                "limit": limit * 2 if server_filter else limit,  # サーバーフィルタがある場合は多めに取得
-                "score_threshold": score_threshold,
-                "with_payload": True
-            }
-
-            # 日付フィルタを適用
-            if filter_conditions:
-                search_params["query_filter"] = Filter(must=filter_conditions)
-
-            # Qdrantで検索
-            search_results = self.qdrant.search(**search_params)
+            # Qdrantで検索（チケット単位でグループ化、日付フィルタを適用）
+            started = time.perf_counter()
+            search_results = self.search_fused(
+                query_vector,
+                weights or self.query_weights,
+                limit=candidates * 2 if server_filter else candidates,  # サーバーフィルタがある場合は多めに取得
+                score_threshold=score_threshold,
+                query_filter=Filter(must=filter_conditions) if filter_conditions else None,
+                query_text=alert_message,
+                with_vectors=self.dense_vector_selector() if diversify else False
+            )
+            self._record_payload_stats("advanced:full", search_results, time.perf_counter() - started)
 
             # 結果を整形
             results = []
@@ -356,13 +2162,19 @@ class VectorService:
                     "subject": hit.payload.get("subject"),
                     "description": hit.payload.get("description", ""),
                     "resolution": hit.payload.get("resolution", ""),
-                    "comments": hit.payload.get("comments", []),
+                    "comments": [],
                     "server_names": hit.payload.get("server_names", []),
                     "category": hit.payload.get("category"),
                     "assigned_to": hit.payload.get("assigned_to"),
                     "created_on": hit.payload.get("created_on"),
                     "closed_on": hit.payload.get("closed_on"),
-                    "status": hit.payload.get("status")
+                    "status": hit.payload.get("status"),
+                    "matched_chunk_type": hit.payload.get("chunk_type"),
+                    "matched_chunk_index": hit.payload.get("chunk_index"),
+                    "matched_text": hit.payload.get("chunk_text"),
+                    "cluster_id": hit.payload.get("cluster_id"),
+                    "cluster_size": hit.payload.get("cluster_size", 1),
+                    "cluster_canonical_id": hit.payload.get("cluster_canonical_id")
                 }
 
                 # サーバー名フィルタ（Pythonレベル）
@@ -377,9 +2189,18 @@ class VectorService:
                     results.append(result)
 
                 # 必要な件数に達したら終了
-                if len(results) >= limit:
+                if len(results) >= candidates:
                     break
 
+            results = self.hydrate_results(results, self._content_hashes(search_results))
+            vectors = {hit.payload.get("ticket_id"): self.dense_vector(hit) for hit in search_results} if diversify else {}
+            results = self._finalize_results(alert_message, results, vectors, limit, rerank, diversify)
+
+            # コメント全文は親ポイントにだけあるので、結果のチケット分をまとめて取得
+            comments = self.fetch_comments([r["ticket_id"] for r in results])
+            for result in results:
+                result["comments"] = comments.get(result["ticket_id"], [])
+
             return results
 
         except Exception as e:
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+検索で取得するペイロードの違いによる転送量・デシリアライズ時間を比較するスクリプト
+
+コレクションからチケットをサンプルして件名をクエリにし、同じクエリベクトルで
+    - all:   with_payload=True（コメント全文を含むすべて）
+    - full:  SEARCH_PAYLOAD（コメント全文・インデックス管理用の項目を除く）
+    - lite:  一覧表示・アラート応答に必要な項目のみ
+    - ids:   ticket_id のみ
+を検索し、1回あたりのペイロードサイズ（JSON換算）、検索時間（転送・デシリアライズを含む）、
+受け取ったペイロードのJSONの読み込み時間（クライアントでのデシリアライズ量の目安）を集計する。
+最後に、バッチ検索（Webhookの経路）を shape="lite" で実行し、lite の項目以外
+（一致したチャンク本文・コメントなど）を取得していないことを確認する（違反があれば終了コード1）。
+
+使用方法:
+    python scripts/benchmark_payload_selection.py [オプション]
+
+オプション:
+    --collection NAME   対象コレクション（省略時は QDRANT_COLLECTION_NAME）
+    --samples N         サンプルするクエリ数（デフォルト: 50）
+    --limit N           1回の検索で取得するチケット数（デフォルト: 20）
+    --seed N            サンプリングの乱数シード（デフォルト: 42）
+"""
+
+import sys
+import json
+import random
+import argparse
+import statistics
+import time
+from pathlib import Path
+
+# プロジェクトルートをPythonパスに追加
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from dotenv import load_dotenv
+from qdrant_client.models import FieldCondition, Filter, Range
+
+from app.services.vector_service import VectorService, SEARCH_PAYLOAD, LITE_PAYLOAD_FIELDS
+
+load_dotenv()
+
+
+def parse_args():
+    """コマンドライン引数をパース"""
+    parser = argparse.ArgumentParser(
+        description="検索で取得するペイロードの違いによる転送量・デシリアライズ時間を比較"
+    )
+    parser.add_argument("--collection", type=str, default=None, help="対象コレクション")
+    parser.add_argument("--samples", type=int, default=50, help="サンプルするクエリ数")
+    parser.add_argument("--limit", type=int, default=20, help="1回の検索で取得するチケット数")
+    parser.add_argument("--seed", type=int, default=42, help="サンプリングの乱数シード")
+    return parser.parse_args()
+
+
+def sample_subjects(vector_service: VectorService, collection_name: str, samples: int, seed: int):
+    """親ポイント（先頭チャンク）の件名をクエリにする"""
+    records, _ = vector_service.qdrant.scroll(
+        collection_name=collection_name,
+        scroll_filter=Filter(must_not=[FieldCondition(key="chunk_index", range=Range(gt=0))]),
+        limit=max(samples * 5, 200),
+        with_payload=["subject"],
+        with_vectors=False
+    )
+    random.Random(seed).shuffle(records)
+    return [r.payload["subject"] for r in records if (r.payload or {}).get("subject")][:samples]
+
+
+def run_selector(vector_service: VectorService, collection_name: str, vectors, limit: int, with_payload):
+    """1つのペイロード指定で全クエリを検索して集計"""
+    sizes, latencies, parse_times = [], [], []
+    for vector in vectors:
+        started = time.perf_counter()
+        hits = vector_service.search_fused(
+            vector, vector_service.alert_weights, limit=limit,
+            collection_name=collection_name, with_payload=with_payload
+        )
+        latencies.append((time.perf_counter() - started) * 1000)
+
+        encoded = json.dumps([hit.payload for hit in hits], ensure_ascii=False, default=str).encode("utf-8")
+        sizes.append(len(encoded))
+        started = time.perf_counter()
+        json.loads(encoded)
+        parse_times.append((time.perf_counter() - started) * 1000)
+    return sizes, latencies, parse_times
+
+
+def check_lite_batch(vector_service: VectorService, subjects, limit: int) -> set:
+    """
+    shape="lite" のバッチ検索でQdrantから受け取ったペイロードの項目のうち、lite 以外のものを返す
+
+    再ランキングはしない（再ランキング時は lite でもチャンク本文を取得するため）。
+    """
+    received = set()
+    query_batch_points = vector_service.qdrant.query_batch_points
+
+    def recording(*args, **kwargs):
+        responses = query_batch_points(*args, **kwargs)
+        for response in responses:
+            for point in response.points:
+                received.update((point.payload or {}).keys())
+        return responses
+
+    vector_service.qdrant.query_batch_points = recording
+    try:
+        vector_service.search_similar_tickets_batch(subjects, limit=limit, rerank=False, shape="lite")
+    finally:
+        vector_service.qdrant.query_batch_points = query_batch_points
+    return received - set(LITE_PAYLOAD_FIELDS)
+
+
+def main():
+    """メイン処理"""
+    args = parse_args()
+
+    print("=" * 70)
+    print("MindAIgis - ペイロード取得のベンチマーク")
+    print("=" * 70)
+
+    vector_service = VectorService()
+    collection_name = args.collection or vector_service.collection_name
+
+    subjects = sample_subjects(vector_service, collection_name, args.samples, args.seed)
+    if not subjects:
+        print("  ✗ サンプルできるチケットがありません")
+        sys.exit(1)
+    print(f"  クエリ数: {len(subjects)}、取得件数: {args.limit}")
+
+    vectors = vector_service.embed_texts(subjects)
+
+    selectors = {
+        "all": True,
+        "full": SEARCH_PAYLOAD,
+        "lite": vector_service.payload_selector("lite"),
+        "ids": ["ticket_id"]
+    }
+
+    # 初回の接続確立を計測に含めない
+    run_selector(vector_service, collection_name, vectors[:1], args.limit, True)
+
+    print()
+    print(f"{'payload':<10}{'avg KB':>10}{'vs all':>9}{'p50 ms':>10}{'p95 ms':>10}{'parse ms':>10}")
+    print("-" * 59)
+    baseline = None
+    for label, with_payload in selectors.items():
+        sizes, latencies, parse_times = run_selector(vector_service, collection_name, vectors, args.limit, with_payload)
+        size = statistics.mean(sizes)
+        baseline = baseline or size
+        ordered = sorted(latencies)
+        print(
+            f"{label:<10}{size / 1024:>10.1f}{size / baseline:>8.0%}"
+            f"{statistics.median(latencies):>10.1f}{ordered[int(0.95 * (len(ordered) - 1))]:>10.1f}"
+            f"{statistics.mean(parse_times):>10.2f}"
+        )
+
+    print()
+    unexpected = check_lite_batch(vector_service, subjects[:10], args.limit)
+    if unexpected:
+        print(f"  ✗ lite のバッチ検索が lite 以外の項目を取得しています: {', '.join(sorted(unexpected))}")
+        sys.exit(1)
+    print("  ✓ lite のバッチ検索は lite の項目だけを取得しています")
+
+    print()
+    print("  ℹ️  検索時間はQdrantからの転送とクライアントでのデシリアライズを含みます")
+    print("  ℹ️  運用中の値は SEARCH_PAYLOAD_STATS=true にして GET /search/payload-stats で確認できます")
+
+
+if __name__ == "__main__":
+    main()
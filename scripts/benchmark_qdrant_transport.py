@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+Qdrantへの接続方式（REST / gRPC）による検索時間の違いを比較するスクリプト
+
+コレクションからチケットのベクトルをサンプルしてそのままクエリにし（Embedding APIは呼ばない）、
+RESTとgRPCのクライアントで同じ検索を繰り返して、1回あたりの検索時間を集計する。
+あわせて、RESTで送るクエリ（3072次元のベクトル）のJSONエンコードと、受け取った結果のJSONパースに
+かかる時間を計測し、検索時間のうちシリアライズが占める分の目安を表示する。
+
+使用方法:
+    python scripts/benchmark_qdrant_transport.py [オプション]
+
+オプション:
+    --collection NAME   対象コレクション（省略時は QDRANT_COLLECTION_NAME）
+    --samples N         サンプルするクエリ数（デフォルト: 50）
+    --limit N           1回の検索で取得するポイント数（デフォルト: 20）
+    --rounds N          クエリごとの繰り返し回数（デフォルト: 3）
+"""
+
+import sys
+import json
+import argparse
+import statistics
+import time
+from pathlib import Path
+
+# プロジェクトルートをPythonパスに追加
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from dotenv import load_dotenv
+
+from app.services.qdrant_connection import create_qdrant_client, is_embedded
+from app.services.vector_service import VectorService, VECTOR_BODY
+
+load_dotenv()
+
+
+def parse_args():
+    """コマンドライン引数をパース"""
+    parser = argparse.ArgumentParser(
+        description="Qdrantへの接続方式（REST / gRPC）による検索時間の違いを比較"
+    )
+    parser.add_argument("--collection", type=str, default=None, help="対象コレクション")
+    parser.add_argument("--samples", type=int, default=50, help="サンプルするクエリ数")
+    parser.add_argument("--limit", type=int, default=20, help="1回の検索で取得するポイント数")
+    parser.add_argument("--rounds", type=int, default=3, help="クエリごとの繰り返し回数")
+    return parser.parse_args()
+
+
+def sample_vectors(vector_service: VectorService, collection_name: str, samples: int, using):
+    """保存済みの密ベクトルをクエリとして取得"""
+    records, _ = vector_service.qdrant.scroll(
+        collection_name=collection_name,
+        limit=samples,
+        with_payload=False,
+        with_vectors=[using] if using else True
+    )
+    vectors = []
+    for record in records:
+        vector = record.vector
+        if isinstance(vector, dict):
+            vector = vector.get(using)
+        if vector:
+            vectors.append(list(vector))
+    return vectors
+
+
+def run_transport(client, collection_name: str, vectors, using, limit: int, with_payload, rounds: int):
+    """1つのクライアントで全クエリを検索し、1回あたりの時間（ms）と結果を返す"""
+    latencies = []
+    last = []
+    for vector in vectors:
+        for _ in range(rounds):
+            started = time.perf_counter()
+            last = client.query_points(
+                collection_name=collection_name,
+                query=vector,
+                using=using,
+                limit=limit,
+                with_payload=with_payload
+            ).points
+            latencies.append((time.perf_counter() - started) * 1000)
+    return latencies, last
+
+
+def json_overhead(vectors, points, limit: int, rounds: int = 20):
+    """RESTでのクエリのJSONエンコードと結果のJSONパースの時間（ms）"""
+    body = {"query": vectors[0], "limit": limit, "with_payload": True}
+    response = json.dumps({
+        "result": {"points": [{"id": str(p.id), "score": p.score, "payload": p.payload} for p in points]}
+    }, ensure_ascii=False, default=str)
+
+    started = time.perf_counter()
+    for _ in range(rounds):
+        json.dumps(body)
+    encode_ms = (time.perf_counter() - started) * 1000 / rounds
+
+    started = time.perf_counter()
+    for _ in range(rounds):
+        json.loads(response)
+    parse_ms = (time.perf_counter() - started) * 1000 / rounds
+    return encode_ms, parse_ms, len(json.dumps(body)), len(response.encode("utf-8"))
+
+
+def summarize(label: str, latencies):
+    ordered = sorted(latencies)
+    print(
+        f"{label:<16}{statistics.median(ordered):>10.2f}{ordered[int(0.95 * (len(ordered) - 1))]:>10.2f}"
+        f"{statistics.mean(ordered):>10.2f}"
+    )
+
+
+def main():
+    """メイン処理"""
+    args = parse_args()
+
+    print("=" * 70)
+    print("MindAIgis - Qdrant接続方式（REST / gRPC）のベンチマーク")
+    print("=" * 70)
+
+    if is_embedded():
+        print("  ✗ QDRANT_MODE=server で実行してください（組み込みモードにはREST / gRPCの区別がありません）")
+        sys.exit(1)
+
+    vector_service = VectorService(collection_name=args.collection)
+    collection_name = vector_service.resolve_alias(vector_service.collection_name) or vector_service.collection_name
+    using = VECTOR_BODY if vector_service.is_named_layout(collection_name) else None
+
+    vectors = sample_vectors(vector_service, collection_name, args.samples, using)
+    if not vectors:
+        print("  ✗ サンプルできるベクトルがありません")
+        sys.exit(1)
+    print(f"  コレクション: {collection_name}")
+    print(f"  クエリ数: {len(vectors)} × {args.rounds} 回、次元数: {len(vectors[0])}、取得件数: {args.limit}")
+
+    clients = {
+        "rest": create_qdrant_client(prefer_grpc=False, shared=False),
+        "grpc": create_qdrant_client(prefer_grpc=True, shared=False)
+    }
+    selectors = {"ids": False, "lite": vector_service.payload_selector("lite")}
+
+    print()
+    print(f"{'transport':<16}{'p50 ms':>10}{'p95 ms':>10}{'avg ms':>10}")
+    print("-" * 46)
+    medians = {}
+    last_points = []
+    for payload_label, with_payload in selectors.items():
+        for transport, client in clients.items():
+            # 初回の接続確立を計測に含めない
+            run_transport(client, collection_name, vectors[:1], using, args.limit, with_payload, 1)
+            latencies, points = run_transport(
+                client, collection_name, vectors, using, args.limit, with_payload, args.rounds
+            )
+            label = f"{transport}/{payload_label}"
+            medians[label] = statistics.median(latencies)
+            summarize(label, latencies)
+            if transport == "rest" and payload_label == "lite":
+                last_points = points
+
+    encode_ms, parse_ms, request_bytes, response_bytes = json_overhead(vectors, last_points, args.limit)
+    print()
+    print("  RESTのJSON変換（クライアント側、1回あたり）:")
+    print(f"    クエリのエンコード: {encode_ms:.2f} ms（{request_bytes / 1024:.1f} KB）")
+    print(f"    結果のパース:       {parse_ms:.2f} ms（{response_bytes / 1024:.1f} KB）")
+    for payload_label in selectors:
+        rest, grpc = medians[f"rest/{payload_label}"], medians[f"grpc/{payload_label}"]
+        print(f"  {payload_label}: gRPCはRESTの {grpc / rest:.0%}（p50 の差 {rest - grpc:+.2f} ms）")
+
+    print()
+    print("  ℹ️  gRPCを使うには QDRANT_PREFER_GRPC=true（QDRANT_GRPC_PORT、デフォルト6334）")
+
+
+if __name__ == "__main__":
+    main()
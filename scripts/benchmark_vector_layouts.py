@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+1ベクトル構成と名前付きベクトル（subject/body）構成の検索精度・レイテンシを比較するスクリプト
+
+コレクションがスパース（BM25）ベクトルを持つ場合は、スパース単独とハイブリッド（RRF）も比較する。
+
+名前付きベクトル構成のコレクションからチケットをサンプルし、
+    - アラート風クエリ: 件名
+    - 質問風クエリ: 説明文の冒頭
+で検索して、元のチケットが上位 k 件に入るか（Recall@k）と順位（MRR）、
+検索レイテンシ（p50 / p95）をモードごとに集計する。
+クエリのベクトル化は1回だけ行い、すべてのモードで共有する。
+
+使用方法:
+    python scripts/benchmark_vector_layouts.py --named-collection maintenance_tickets_v20250101000000 \
+        --single-collection maintenance_tickets_v20241201000000 [オプション]
+
+オプション:
+    --named-collection NAME   名前付きベクトル構成のコレクション（省略時は QDRANT_COLLECTION_NAME）
+    --single-collection NAME  比較対象の1ベクトル構成のコレクション（省略時は比較しない）
+    --samples N               サンプルするチケット数（デフォルト: 50）
+    --top-k N                 Recall@k の k（デフォルト: 10）
+    --seed N                  サンプリングの乱数シード（デフォルト: 42）
+"""
+
+import sys
+import random
+import argparse
+import statistics
+import time
+from pathlib import Path
+
+# プロジェクトルートをPythonパスに追加
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from dotenv import load_dotenv
+from qdrant_client.models import FieldCondition, Filter, Range
+
+from app.services.vector_service import VectorService, VECTOR_BODY, VECTOR_SUBJECT
+
+load_dotenv()
+
+
+def parse_args():
+    """コマンドライン引数をパース"""
+    parser = argparse.ArgumentParser(
+        description="1ベクトル構成と名前付きベクトル構成の検索精度・レイテンシを比較"
+    )
+    parser.add_argument("--named-collection", type=str, default=None, help="名前付きベクトル構成のコレクション")
+    parser.add_argument("--single-collection", type=str, default=None, help="1ベクトル構成のコレクション")
+    parser.add_argument("--samples", type=int, default=50, help="サンプルするチケット数")
+    parser.add_argument("--top-k", type=int, default=10, help="Recall@k の k")
+    parser.add_argument("--seed", type=int, default=42, help="サンプリングの乱数シード")
+    return parser.parse_args()
+
+
+def sample_queries(vector_service: VectorService, collection_name: str, samples: int, seed: int):
+    """親ポイント（先頭チャンク）からクエリを作成"""
+    records, _ = vector_service.qdrant.scroll(
+        collection_name=collection_name,
+        scroll_filter=Filter(must_not=[FieldCondition(key="chunk_index", range=Range(gt=0))]),
+        limit=max(samples * 5, 200),
+        with_payload=["ticket_id", "subject", "description"],
+        with_vectors=False
+    )
+    random.Random(seed).shuffle(records)
+
+    queries = []
+    for record in records[:samples]:
+        payload = record.payload or {}
+        if payload.get("subject"):
+            queries.append(("alert", payload["ticket_id"], payload["subject"]))
+        description = (payload.get("description") or "").strip()
+        if description:
+            queries.append(("question", payload["ticket_id"], description[:200]))
+    return queries
+
+
+def run_mode(search, queries, vectors, top_k: int):
+    """1つのモードで全クエリを検索し、クエリ種別ごとに集計"""
+    stats = {}
+    for (kind, ticket_id, text), vector in zip(queries, vectors):
+        started = time.perf_counter()
+        hits = search(vector, top_k, text)
+        latency = (time.perf_counter() - started) * 1000
+
+        ranked = [hit.payload.get("ticket_id") for hit in hits]
+        rank = ranked.index(ticket_id) + 1 if ticket_id in ranked else None
+
+        entry = stats.setdefault(kind, {"hits": 0, "rr": 0.0, "latencies": [], "count": 0})
+        entry["count"] += 1
+        entry["latencies"].append(latency)
+        if rank:
+            entry["hits"] += 1
+            entry["rr"] += 1.0 / rank
+    return stats
+
+
+def percentile(values, pct: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def main():
+    """メイン処理"""
+    args = parse_args()
+
+    print("=" * 70)
+    print("MindAIgis - ベクトル構成ベンチマーク")
+    print("=" * 70)
+
+    vector_service = VectorService()
+    named_collection = args.named_collection or vector_service.collection_name
+
+    if not vector_service.is_named_layout(named_collection):
+        print(f"  ✗ {named_collection} は名前付きベクトル構成ではありません")
+        sys.exit(1)
+    if args.single_collection and vector_service.is_named_layout(args.single_collection):
+        print(f"  ✗ {args.single_collection} は1ベクトル構成ではありません")
+        sys.exit(1)
+
+    queries = sample_queries(vector_service, named_collection, args.samples, args.seed)
+    if not queries:
+        print("  ✗ サンプルできるチケットがありません")
+        sys.exit(1)
+    print(f"  クエリ数: {len(queries)}（アラート風・質問風）")
+
+    vectors = vector_service.embed_texts([text for _, _, text in queries])
+
+    modes = {}
+    if args.single_collection:
+        modes["single"] = lambda v, k, t: vector_service.search_ticket_groups(
+            v, limit=k, collection_name=args.single_collection, with_payload=["ticket_id"]
+        )
+    for vector_name in (VECTOR_SUBJECT, VECTOR_BODY):
+        modes[f"named:{vector_name}"] = (lambda name: lambda v, k, t: vector_service.search_ticket_groups(
+            v, limit=k, collection_name=named_collection, with_payload=["ticket_id"], using=name
+        ))(vector_name)
+    for label, weights in (("alert", vector_service.alert_weights), ("query", vector_service.query_weights)):
+        modes[f"fused:{label}"] = (lambda w: lambda v, k, t: vector_service.search_fused(
+            v, w, limit=k, collection_name=named_collection, with_payload=["ticket_id"]
+        ))(weights)
+    if vector_service.has_sparse_vectors(named_collection):
+        modes["sparse"] = lambda v, k, t: vector_service.search_by_keyword(
+            t, limit=k, collection_name=named_collection, with_payload=["ticket_id"]
+        )
+        for label, weights in (("alert", vector_service.alert_weights), ("query", vector_service.query_weights)):
+            modes[f"hybrid:{label}"] = (lambda w: lambda v, k, t: vector_service.search_fused(
+                v, w, limit=k, collection_name=named_collection, with_payload=["ticket_id"], query_text=t
+            ))(weights)
+
+    print()
+    print(f"{'mode':<16}{'query':<10}{'recall@' + str(args.top_k):>10}{'MRR':>8}{'p50 ms':>10}{'p95 ms':>10}")
+    print("-" * 64)
+    for mode, search in modes.items():
+        stats = run_mode(search, queries, vectors, args.top_k)
+        for kind in ("alert", "question"):
+            entry = stats.get(kind)
+            if not entry:
+                continue
+            recall = entry["hits"] / entry["count"]
+            mrr = entry["rr"] / entry["count"]
+            print(
+                f"{mode:<16}{kind:<10}{recall:>10.3f}{mrr:>8.3f}"
+                f"{statistics.median(entry['latencies']):>10.1f}{percentile(entry['latencies'], 95):>10.1f}"
+            )
+
+    print()
+    print("  ℹ️  正解は「クエリの元になったチケット自身」。重みは SEARCH_WEIGHTS_ALERT / SEARCH_WEIGHTS_QUERY で調整できます")
+
+
+if __name__ == "__main__":
+    main()
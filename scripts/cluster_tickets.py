@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+ほぼ重複したチケットをクラスタにまとめるスクリプト
+
+インデックス時に件名・説明のSimHashを保存し、このスクリプト（または差分同期のあと）で
+ハミング距離が近いチケットに同じ cluster_id を割り当てる。
+cluster_size と cluster_canonical_id（代表チケット）もペイロードに保存するので、
+検索ではクラスタごとに1件だけ返したり、代表チケットの解決策を参照したりできる。
+
+使用方法:
+    python scripts/cluster_tickets.py [オプション]
+
+オプション:
+    --full           すべてのチケットのクラスタを計算し直す（初回、閾値変更後、チケット削除後）
+    --limit N        差分処理で処理する最大件数
+    --threshold N    同じクラスタとみなすハミング距離（デフォルト: CLUSTER_HAMMING_THRESHOLD または 3）
+"""
+
+import sys
+import argparse
+import time
+from pathlib import Path
+
+# プロジェクトルートをPythonパスに追加
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from dotenv import load_dotenv
+
+from app.services.vector_service import VectorService
+from app.services.ticket_clusterer import TicketClusterer
+
+load_dotenv()
+
+
+def parse_args():
+    """コマンドライン引数をパース"""
+    parser = argparse.ArgumentParser(
+        description="ほぼ重複したチケットをクラスタにまとめる"
+    )
+    parser.add_argument(
+        "--full",
+        action="store_true",
+        help="すべてのチケットのクラスタを計算し直す"
+    )
+    parser.add_argument(
+        "--limit",
+        type=int,
+        default=None,
+        help="差分処理で処理する最大件数"
+    )
+    parser.add_argument(
+        "--threshold",
+        type=int,
+        default=None,
+        help="同じクラスタとみなすハミング距離"
+    )
+    return parser.parse_args()
+
+
+def main():
+    """メイン処理"""
+    args = parse_args()
+
+    print("=" * 60)
+    print("MindAIgis - チケットのクラスタリング")
+    print("=" * 60)
+
+    try:
+        clusterer = TicketClusterer(VectorService(), threshold=args.threshold)
+        print(f"  ハミング距離の閾値: {clusterer.threshold}")
+        start = time.time()
+
+        if args.full:
+            print("\n  全件を再計算中...")
+            result = clusterer.recompute_all()
+            print(f"  ✓ チケット: {result['tickets']} 件")
+            print(f"  ✓ クラスタ: {result['clusters']} 個（2件以上: {result['multi']} 個）")
+            print(f"  ✓ 更新: {result['updated']} 件")
+        else:
+            print("\n  未割り当てのチケットを処理中...")
+            result = clusterer.assign_pending(limit=args.limit)
+            print(f"  ✓ 処理: {result['processed']} 件（既存チケットと同じクラスタ: {result['merged']} 件）")
+            print(f"  ✓ 更新したクラスタ: {result['clusters']} 個")
+            if result["processed"] == 0:
+                print("  ℹ️  機能追加前にインデックスしたチケットは --full で割り当ててください")
+
+        print(f"\n  処理時間: {time.time() - start:.1f}秒")
+
+    except KeyboardInterrupt:
+        print("\n\n⚠️  中断されました（次回の実行で続きから処理されます）")
+        sys.exit(1)
+    except Exception as e:
+        print(f"\n  ✗ エラー: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
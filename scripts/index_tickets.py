@@ -2,18 +2,34 @@
 """
 Redmineの過去チケットをQdrantにインデックスするスクリプト
 
+ドキュメントの作成・ベクトル化・保存は app/services/ticket_indexer.py に共通化されており、
+reindex_tickets_with_comments.py や POST /index/ticket/{id} と同じ形のポイントを作成する。
+
 使用方法:
     python scripts/index_tickets.py [オプション]
 
 オプション:
-    --limit N       インデックスする最大件数（デフォルト: 全件）
+    --limit N       処理するチケットの最大件数（スキップ・変更なし・エラーも含む、デフォルト: 全件）
     --batch-size N  バッチサイズ（デフォルト: 100）
     --project-id ID プロジェクトIDでフィルタ
     --dry-run       実際にインデックスせずテスト実行
+    --workers N          チケット詳細取得の並列数（デフォルト: 4、旧名 --detail-workers）
+    --embed-workers N    ベクトル化の並列数（デフォルト: 1）
+    --upsert-workers N   Qdrant保存の並列数（デフォルト: 1）
+    --embed-batch-size N 1回のEmbedding APIコールでまとめる件数（デフォルト: 32）
+    --upsert-batch-size N 1回のupsertでまとめる件数（デフォルト: 64）
+    --queue-size N       ステージ間キューの上限（デフォルト: 256）
+    --checkpoint PATH    チェックポイントファイル（デフォルト: data/checkpoints/index_tickets.sqlite3）
+    --since DATETIME     この日時以降に更新されたチケットだけを処理（例: 2024-10-01T00:00:00Z）
+    --resume             チェックポイントから再開（デフォルト）
+    --no-resume          チェックポイントを破棄して最初から実行
+    --retry-failed       前回失敗したチケットだけを再処理
+    --reembed-all        内容が変わっていないチケットも再ベクトル化
+    --blue-green         新しいバージョンのコレクションに全件インデックスし、検証後にエイリアスを切り替え
+    --force-swap         --blue-green で検証に失敗してもエイリアスを切り替え
 """
 
 import sys
-import os
 import argparse
 from pathlib import Path
 
@@ -21,11 +37,11 @@ from pathlib import Path
 project_root = Path(__file__).parent.parent
 sys.path.insert(0, str(project_root))
 
-from tqdm import tqdm
 from dotenv import load_dotenv
 
 from app.services.vector_service import VectorService
 from app.services.redmine_service import RedmineService
+from app.services.ticket_indexer import TicketIndexer, print_run_summary
 
 load_dotenv()
 
@@ -39,7 +55,7 @@ def parse_args():
         "--limit",
         type=int,
         default=None,
-        help="インデックスする最大件数"
+        help="処理するチケットの最大件数（スキップ・変更なし・エラーも含む）"
     )
     parser.add_argument(
         "--batch-size",
@@ -63,12 +79,95 @@ def parse_args():
         action="store_true",
         help="エラーが発生しても処理を継続"
     )
+    parser.add_argument(
+        "--workers",
+        "--detail-workers",
+        dest="workers",
+        type=int,
+        default=4,
+        help="チケット詳細取得の並列数"
+    )
+    parser.add_argument(
+        "--embed-workers",
+        type=int,
+        default=1,
+        help="ベクトル化の並列数"
+    )
+    parser.add_argument(
+        "--upsert-workers",
+        type=int,
+        default=1,
+        help="Qdrant保存の並列数"
+    )
+    parser.add_argument(
+        "--embed-batch-size",
+        type=int,
+        default=32,
+        help="1回のEmbedding APIコールでまとめる件数"
+    )
+    parser.add_argument(
+        "--upsert-batch-size",
+        type=int,
+        default=64,
+        help="1回のupsertでまとめる件数"
+    )
+    parser.add_argument(
+        "--queue-size",
+        type=int,
+        default=256,
+        help="ステージ間キューの上限（超えると上流が待機）"
+    )
+    parser.add_argument(
+        "--checkpoint",
+        type=str,
+        default="data/checkpoints/index_tickets.sqlite3",
+        help="進捗を保存するチェックポイントファイル"
+    )
+    parser.add_argument(
+        "--since",
+        type=str,
+        default=None,
+        help="この日時以降に更新されたチケットだけを処理（例: 2024-10-01T00:00:00Z）"
+    )
+    parser.add_argument(
+        "--resume",
+        dest="resume",
+        action="store_true",
+        default=True,
+        help="チェックポイントから再開（デフォルト）"
+    )
+    parser.add_argument(
+        "--no-resume",
+        dest="resume",
+        action="store_false",
+        help="チェックポイントを破棄して最初から実行"
+    )
+    parser.add_argument(
+        "--retry-failed",
+        action="store_true",
+        help="前回失敗したチケット（デッドレター）だけを再処理"
+    )
+    parser.add_argument(
+        "--reembed-all",
+        action="store_true",
+        help="テキストハッシュが一致する（内容が変わっていない）チケットも再ベクトル化"
+    )
+    parser.add_argument(
+        "--blue-green",
+        action="store_true",
+        help="新しいバージョンのコレクションを作成してインデックスし、検証後にエイリアスを切り替え"
+    )
+    parser.add_argument(
+        "--force-swap",
+        action="store_true",
+        help="--blue-green で検証に失敗してもエイリアスを切り替え"
+    )
 
     return parser.parse_args()
 
 
 def index_all_tickets(args):
-    """すべてのクローズ済みチケットをインデックス"""
+    """すべてのチケットをインデックス"""
 
     print("=" * 60)
     print("MindAIgis - Redmineチケットインデックス")
@@ -85,6 +184,8 @@ def index_all_tickets(args):
             redmine_service.project_id = args.project_id
             print(f"  ✓ プロジェクトID: {args.project_id}")
 
+        indexer = TicketIndexer(vector_service, redmine_service)
+
         print("  ✓ Vector Service: 起動完了")
         print("  ✓ Redmine Service: 起動完了")
 
@@ -111,84 +212,27 @@ def index_all_tickets(args):
     if args.dry_run:
         print("  ⚠️  DRY-RUN モード: 実際にはインデックスしません\n")
 
-    indexed_count = 0
-    error_count = 0
-    skipped_count = 0
-
-    try:
-        # チケット取得イテレータ
-        ticket_iter = redmine_service.get_all_closed_tickets_iter(
-            batch_size=args.batch_size
-        )
-
-        # プログレスバー付きで処理
-        with tqdm(desc="インデックス中", unit="tickets") as pbar:
-            for ticket in ticket_iter:
-                # 件数制限チェック
-                if args.limit and indexed_count >= args.limit:
-                    print(f"\n  制限数 {args.limit} 件に到達")
-                    break
-
-                try:
-                    # チケット詳細取得
-                    detail = redmine_service.get_ticket_details(ticket.id)
-
-                    if not detail:
-                        skipped_count += 1
-                        pbar.update(1)
-                        continue
-
-                    # 説明文または解決策が空の場合はスキップ
-                    if not detail.get("description") and not detail.get("resolution"):
-                        skipped_count += 1
-                        pbar.update(1)
-                        continue
-
-                    # DRY-RUNでない場合のみインデックス
-                    if not args.dry_run:
-                        vector_service.index_ticket(
-                            ticket_id=detail["ticket_id"],
-                            subject=detail["subject"],
-                            description=detail.get("description", ""),
-                            resolution=detail.get("resolution", ""),
-                            metadata={
-                                "category": detail.get("category"),
-                                "assigned_to": detail.get("assigned_to"),
-                                "status": detail.get("status"),
-                                "priority": detail.get("priority"),
-                                "closed_on": detail.get("closed_on").isoformat() if detail.get("closed_on") else None
-                            }
-                        )
-
-                    indexed_count += 1
-                    pbar.update(1)
-
-                except Exception as e:
-                    error_count += 1
-                    if args.force:
-                        pbar.write(f"  ⚠️  チケット #{ticket.id} エラー: {e}")
-                        pbar.update(1)
-                        continue
-                    else:
-                        print(f"\n  ✗ チケット #{ticket.id} でエラー発生: {e}")
-                        raise
-
-    except KeyboardInterrupt:
-        print("\n\n  ⚠️  ユーザーによる中断")
-
-    except Exception as e:
-        print(f"\n  ✗ 処理エラー: {e}")
-
-    # 結果サマリー
-    print("\n" + "=" * 60)
-    print("処理完了")
-    print("=" * 60)
-    print(f"  インデックス成功: {indexed_count} 件")
-    print(f"  スキップ: {skipped_count} 件")
-    print(f"  エラー: {error_count} 件")
+    result = indexer.run(
+        checkpoint_path=args.checkpoint,
+        workers=args.workers,
+        embed_workers=args.embed_workers,
+        upsert_workers=args.upsert_workers,
+        batch_size=args.batch_size,
+        embed_batch_size=args.embed_batch_size,
+        upsert_batch_size=args.upsert_batch_size,
+        queue_size=args.queue_size,
+        limit=args.limit,
+        since=args.since,
+        resume=args.resume,
+        retry_failed=args.retry_failed,
+        reembed_all=args.reembed_all,
+        dry_run=args.dry_run,
+        force=args.force,
+        blue_green=args.blue_green,
+        force_swap=args.force_swap
+    )
 
-    if args.dry_run:
-        print("\n  ℹ️  DRY-RUNモードのため、実際にはインデックスされていません")
+    print_run_summary(result, dry_run=args.dry_run)
 
     # 最終的なコレクション情報
     if not args.dry_run:
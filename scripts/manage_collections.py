@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+Qdrantコレクションのバージョン（Blue/Green）を管理するスクリプト
+
+検索は QDRANT_COLLECTION_NAME のエイリアスを通して行い、実体は
+「{エイリアス名}_v{日時}」のバージョン付きコレクションに置く。
+新しいバージョンの作成は index_tickets.py / reindex_tickets_with_comments.py の
+--blue-green オプションで行う。
+
+使用方法:
+    python scripts/manage_collections.py <コマンド> [オプション]
+
+コマンド:
+    status              エイリアスの向き先と各バージョンの件数を表示
+    migrate             エイリアス導入前のコレクションをバージョン付きコレクションに移行
+    swap NAME           指定したバージョンを検証してエイリアスを切り替え（--force で検証失敗でも切り替え）
+    rollback            エイリアスを1つ前のバージョンに戻す
+    prune [--keep N]    古いバージョンを削除（現行を含めて N 個残す、デフォルト: 2）
+    export PATH         コレクションをファイル（gzip圧縮NDJSON）に書き出す（--collection で対象を指定、
+                        省略時は現行バージョン）
+    import PATH         ファイルから新しいバージョンを作成（再ベクトル化なし、--swap で検証後に切り替え）
+    snapshot            現行バージョンのスナップショットを作成（--download PATH でローカルに保存）
+    snapshots           スナップショットの一覧
+    restore-snapshot LOCATION
+                        スナップショット（URLまたはローカルファイル）から新しいバージョンを作成
+                        （--swap で検証後に切り替え）
+"""
+
+import sys
+import os
+import argparse
+import time
+from pathlib import Path
+
+# プロジェクトルートをPythonパスに追加
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from dotenv import load_dotenv
+
+from app.services.vector_service import VectorService
+from app.services.collection_manager import CollectionManager
+from app.services.index_transfer import export_collection, import_collection
+
+load_dotenv()
+
+
+def parse_args():
+    """コマンドライン引数をパース"""
+    parser = argparse.ArgumentParser(
+        description="Qdrantコレクションのバージョン（エイリアス）を管理"
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    subparsers.add_parser("status", help="エイリアスの向き先と各バージョンを表示")
+    subparsers.add_parser("migrate", help="エイリアス導入前のコレクションを移行")
+
+    swap_parser = subparsers.add_parser("swap", help="指定したバージョンにエイリアスを切り替え")
+    swap_parser.add_argument("collection", type=str, help="切り替え先のコレクション名")
+    swap_parser.add_argument(
+        "--force",
+        action="store_true",
+        help="検証に失敗しても切り替え"
+    )
+
+    subparsers.add_parser("rollback", help="1つ前のバージョンに戻す")
+
+    prune_parser = subparsers.add_parser("prune", help="古いバージョンを削除")
+    prune_parser.add_argument(
+        "--keep",
+        type=int,
+        default=2,
+        help="現行を含めて残すバージョン数"
+    )
+
+    export_parser = subparsers.add_parser("export", help="コレクションをファイルに書き出す")
+    export_parser.add_argument("path", type=str, help="出力ファイル（.ndjson.gz）")
+    export_parser.add_argument("--collection", type=str, default=None, help="対象コレクション（省略時は現行バージョン）")
+    export_parser.add_argument("--batch-size", type=int, default=256, help="1回に読み出すポイント数")
+
+    import_parser = subparsers.add_parser("import", help="ファイルから新しいバージョンを作成")
+    import_parser.add_argument("path", type=str, help="export で書き出したファイル")
+    import_parser.add_argument("--collection", type=str, default=None, help="作成するコレクション（省略時は日時から生成）")
+    import_parser.add_argument("--swap", action="store_true", help="検証に通ればエイリアスを切り替え")
+
+    snapshot_parser = subparsers.add_parser("snapshot", help="スナップショットを作成")
+    snapshot_parser.add_argument("--collection", type=str, default=None, help="対象コレクション（省略時は現行バージョン）")
+    snapshot_parser.add_argument("--download", type=str, default=None, metavar="PATH", help="作成したスナップショットの保存先")
+
+    snapshots_parser = subparsers.add_parser("snapshots", help="スナップショットの一覧")
+    snapshots_parser.add_argument("--collection", type=str, default=None, help="対象コレクション（省略時は現行バージョン）")
+
+    restore_parser = subparsers.add_parser("restore-snapshot", help="スナップショットから新しいバージョンを作成")
+    restore_parser.add_argument("location", type=str, help="スナップショットのURLまたはローカルファイル")
+    restore_parser.add_argument("--collection", type=str, default=None, help="復元先のコレクション（省略時は日時から生成）")
+    restore_parser.add_argument("--swap", action="store_true", help="検証に通ればエイリアスを切り替え")
+
+    return parser.parse_args()
+
+
+def print_status(manager: CollectionManager):
+    """エイリアスと各バージョンの状態を表示"""
+    status = manager.status()
+    print(f"  エイリアス: {status['alias']}")
+    print(f"  現行バージョン: {status['current'] or '(なし)'}")
+    if status["legacy_collection"]:
+        print("  ⚠️  エイリアス導入前のコレクションがあります（migrate を実行してください）")
+
+    if not status["versions"]:
+        print("  バージョン: (なし)")
+        return
+
+    print("  バージョン:")
+    for version in status["versions"]:
+        marker = "*" if version["current"] else " "
+        print(f"    {marker} {version['name']}  {version['points_count']} 件  ({version['status']})")
+
+
+def print_progress(done: int, total: int):
+    print(f"\r  {done} / {total} ポイント", end="", flush=True)
+
+
+def swap_after_validation(manager: CollectionManager, collection: str, force: bool = False):
+    """検証してエイリアスを切り替え、結果を表示（失敗時は終了コード1）"""
+    report = manager.finish_build(collection, force=force)
+    print(f"  件数: {report['old_count']} → {report['new_count']}")
+    if report["recall"] is not None:
+        print(f"  サンプル再現率: {report['recall']:.2f}")
+    for reason in report["reasons"]:
+        print(f"  ⚠️  {reason}")
+    if report["swapped"]:
+        print(f"  ✓ エイリアスを {collection} に切り替えました")
+    else:
+        print("  ✗ 検証に失敗したため切り替えていません（--force で強制切り替え）")
+        sys.exit(1)
+
+
+def main():
+    """メイン処理"""
+    args = parse_args()
+
+    print("=" * 60)
+    print("MindAIgis - コレクション管理")
+    print("=" * 60)
+
+    try:
+        manager = CollectionManager(VectorService())
+
+        if args.command == "status":
+            print_status(manager)
+
+        elif args.command == "migrate":
+            print("  ⚠️  移行中は検索・書き込みができません（APIサーバー・差分同期・インデックス処理を止めて実行してください）")
+            version = manager.migrate_legacy()
+            print(f"  ✓ {version} に移行しました")
+
+        elif args.command == "swap":
+            if not manager.vector_service.collection_exists(args.collection):
+                print(f"  ✗ コレクションが見つかりません: {args.collection}")
+                sys.exit(1)
+            swap_after_validation(manager, args.collection, force=args.force)
+
+        elif args.command == "rollback":
+            previous = manager.rollback()
+            print(f"  ✓ {previous} に戻しました")
+
+        elif args.command == "prune":
+            removed = manager.prune(keep=args.keep)
+            print(f"  ✓ {len(removed)} 個のバージョンを削除しました")
+
+        elif args.command == "export":
+            start = time.time()
+            result = export_collection(
+                manager.vector_service, args.path,
+                collection_name=args.collection or manager.current_collection(),
+                batch_size=args.batch_size, on_progress=print_progress
+            )
+            print()
+            print(f"  ✓ {result['collection']} の {result['written']} ポイントを書き出しました"
+                  f"（{os.path.getsize(args.path) / 1024 / 1024:.1f} MB、{time.time() - start:.1f}秒）")
+
+        elif args.command == "import":
+            start = time.time()
+            collection = args.collection or manager.new_version_name()
+            result = import_collection(manager.vector_service, args.path, collection, on_progress=print_progress)
+            print()
+            print(f"  ✓ {collection} に {result['loaded']} ポイントを読み込みました"
+                  f"（コレクションの件数: {result['count']}、{time.time() - start:.1f}秒）")
+            if result["count"] != result["points"]:
+                print(f"  ⚠️  書き出し時の件数（{result['points']}）と一致しません")
+            if args.swap:
+                swap_after_validation(manager, collection)
+
+        elif args.command == "snapshot":
+            snapshot = manager.create_snapshot(args.collection)
+            print(f"  ✓ スナップショットを作成しました: {snapshot}")
+            if args.download:
+                size = manager.download_snapshot(snapshot, args.download, collection_name=args.collection)
+                print(f"  ✓ {args.download} に保存しました（{size / 1024 / 1024:.1f} MB）")
+
+        elif args.command == "snapshots":
+            snapshots = manager.list_snapshots(args.collection)
+            if not snapshots:
+                print("  スナップショット: (なし)")
+            for snapshot in snapshots:
+                print(f"    {snapshot['name']}  {(snapshot['size'] or 0) / 1024 / 1024:.1f} MB  {snapshot['created_at']}")
+
+        elif args.command == "restore-snapshot":
+            start = time.time()
+            collection = manager.recover_snapshot(args.location, args.collection)
+            count = manager.qdrant.count(collection, exact=True).count
+            print(f"  ✓ {collection} に復元しました（{count} 件、{time.time() - start:.1f}秒）")
+            if args.swap:
+                swap_after_validation(manager, collection)
+
+    except Exception as e:
+        print(f"\n  ✗ エラー: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+インデックス済みのチケット本文をQdrantのペイロードからドキュメントストアに移すスクリプト
+
+説明・解決策・コメント全文・チャンク本文をドキュメントストア（DOC_STORE_PATH）に保存し、
+Qdrantのペイロードからは削除する（再ベクトル化はしない）。
+移行の前後で、ペイロードのサイズ（JSON換算）とドキュメントストアのサイズを表示する。
+
+移行後は DOC_STORE_ENABLED=true にしてAPI・インデックス処理を再起動すること
+（無効のままだと検索結果の説明・解決策が空になる）。
+途中で止めても、もう一度実行すれば残りのポイントから続けられる。
+
+使用方法:
+    python scripts/migrate_document_store.py [オプション]
+
+オプション:
+    --collection NAME   対象コレクション（省略時は QDRANT_COLLECTION_NAME）
+    --batch-size N      1回に処理するポイント数（デフォルト: 256）
+    --dry-run           移行せず、現在のペイロードのサイズだけを表示
+"""
+
+import sys
+import os
+import json
+import argparse
+import time
+from pathlib import Path
+
+# プロジェクトルートをPythonパスに追加
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from dotenv import load_dotenv
+from qdrant_client.models import DeletePayload, DeletePayloadOperation, SetPayload, SetPayloadOperation
+
+from app.services.vector_service import VectorService
+from app.services.document_store import BULKY_FIELDS, DocumentStore
+
+load_dotenv()
+
+
+def parse_args():
+    """コマンドライン引数をパース"""
+    parser = argparse.ArgumentParser(
+        description="チケット本文をQdrantのペイロードからドキュメントストアに移す"
+    )
+    parser.add_argument("--collection", type=str, default=None, help="対象コレクション")
+    parser.add_argument("--batch-size", type=int, default=256, help="1回に処理するポイント数")
+    parser.add_argument("--dry-run", action="store_true", help="移行せず、ペイロードのサイズだけを表示")
+    return parser.parse_args()
+
+
+def payload_size(payload: dict) -> int:
+    return len(json.dumps(payload or {}, ensure_ascii=False, default=str).encode("utf-8"))
+
+
+def iter_points(vector_service: VectorService, collection_name: str, batch_size: int):
+    """すべてのポイントをペイロード付きで取得（ページごと）"""
+    offset = None
+    while True:
+        records, offset = vector_service.qdrant.scroll(
+            collection_name=collection_name,
+            limit=batch_size,
+            offset=offset,
+            with_payload=True,
+            with_vectors=False
+        )
+        yield records
+        if offset is None:
+            break
+
+
+def measure(vector_service: VectorService, collection_name: str, batch_size: int) -> dict:
+    """ポイント数とペイロードの合計サイズ（本文の項目とそれ以外）"""
+    result = {"points": 0, "payload_bytes": 0, "bulky_bytes": 0}
+    for records in iter_points(vector_service, collection_name, batch_size):
+        for record in records:
+            payload = record.payload or {}
+            result["points"] += 1
+            result["payload_bytes"] += payload_size(payload)
+            result["bulky_bytes"] += payload_size({k: payload[k] for k in BULKY_FIELDS if k in payload})
+    return result
+
+
+def print_measure(label: str, stats: dict):
+    print(f"  {label}: {stats['points']} ポイント、ペイロード {stats['payload_bytes'] / 1024 / 1024:.1f} MB"
+          f"（うち本文 {stats['bulky_bytes'] / 1024 / 1024:.1f} MB）")
+
+
+def migrate_page(vector_service: VectorService, store: DocumentStore, collection_name: str, records, migrated: set) -> int:
+    """1ページ分のポイントの本文をストアに保存し、ペイロードから削除"""
+    targets = [r for r in records if any(k in (r.payload or {}) for k in BULKY_FIELDS)]
+    if not targets:
+        return 0
+
+    # チャンクがページをまたぐチケット・中断前に一部を移したチケットは、保存済みの分に追記する
+    ticket_ids = {r.payload["ticket_id"] for r in targets}
+    documents = store.get_many(ticket_ids)
+    for record in targets:
+        payload = record.payload
+        document = documents.setdefault(payload["ticket_id"], {
+            "description": "", "resolution": "", "comments": [], "chunks": []
+        })
+        document["content_hash"] = payload.get("content_hash") or document.get("content_hash")
+        document["description"] = payload.get("description") or document["description"]
+        document["resolution"] = payload.get("resolution") or document["resolution"]
+        if payload.get("comments"):
+            document["comments"] = payload["comments"]
+        chunk_index = payload.get("chunk_index") or 0
+        chunks = document["chunks"]
+        chunks.extend([""] * (chunk_index + 1 - len(chunks)))
+        chunks[chunk_index] = payload.get("chunk_text") or ""
+
+    store.put_many(documents)
+    migrated.update(ticket_ids)
+
+    operations = [
+        SetPayloadOperation(set_payload=SetPayload(
+            payload={"has_resolution": bool((r.payload.get("resolution") or "").strip())},
+            points=[r.id]
+        ))
+        for r in targets if "has_resolution" not in r.payload
+    ]
+    operations.append(DeletePayloadOperation(delete_payload=DeletePayload(
+        keys=BULKY_FIELDS,
+        points=[r.id for r in targets]
+    )))
+    vector_service.qdrant.batch_update_points(
+        collection_name=collection_name,
+        update_operations=operations,
+        wait=True
+    )
+    return len(targets)
+
+
+def main():
+    """メイン処理"""
+    args = parse_args()
+
+    print("=" * 60)
+    print("MindAIgis - ドキュメントストアへの移行")
+    print("=" * 60)
+
+    try:
+        vector_service = VectorService(collection_name=args.collection)
+        collection_name = vector_service.resolve_alias(vector_service.collection_name) or vector_service.collection_name
+        print(f"  コレクション: {collection_name}")
+
+        before = measure(vector_service, collection_name, args.batch_size)
+        print_measure("移行前", before)
+        if args.dry_run:
+            return
+
+        store = vector_service.doc_store or DocumentStore()
+        print(f"  ドキュメントストア: {store.path}（{store.codec}）")
+        start = time.time()
+        migrated_points = 0
+        migrated_tickets: set = set()
+        for records in iter_points(vector_service, collection_name, args.batch_size):
+            migrated_points += migrate_page(vector_service, store, collection_name, records, migrated_tickets)
+            print(f"\r  移行中: {migrated_points} ポイント / {len(migrated_tickets)} チケット", end="", flush=True)
+        print()
+
+        after = measure(vector_service, collection_name, args.batch_size)
+        status = store.status()
+        print(f"\n  ✓ 移行完了（{time.time() - start:.1f}秒）")
+        print_measure("移行前", before)
+        print_measure("移行後", after)
+        if before["payload_bytes"]:
+            print(f"  ペイロード削減: {1 - after['payload_bytes'] / before['payload_bytes']:.0%}")
+        print(f"  ドキュメントストア: {status['documents']} 件、"
+              f"圧縮前 {status['raw_bytes'] / 1024 / 1024:.1f} MB → 圧縮後 {status['compressed_bytes'] / 1024 / 1024:.1f} MB"
+              f"（ファイル {status['file_bytes'] / 1024 / 1024:.1f} MB）")
+
+        if os.getenv("DOC_STORE_ENABLED", "false").lower() != "true":
+            print("\n  ⚠️  DOC_STORE_ENABLED=true にしてAPI・インデックス処理を再起動してください")
+
+    except KeyboardInterrupt:
+        print("\n\n⚠️  中断されました（もう一度実行すると残りのポイントを移行します）")
+        sys.exit(1)
+    except Exception as e:
+        print(f"\n  ✗ エラー: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
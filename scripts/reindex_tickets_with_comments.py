@@ -9,36 +9,65 @@ Phase 1でインデックスされたチケットには、コメント（ジャ
     python scripts/reindex_tickets_with_comments.py [--limit N] [--batch-size N]
 
 オプション:
-    --limit N: インデックスする最大件数（省略時は全件）
+    --limit N: 処理するチケットの最大件数（スキップ・変更なし・エラーも含む、省略時は全件）
     --batch-size N: バッチサイズ（デフォルト: 50）
     --dry-run: 実際のインデックスを行わず、処理内容のみ表示
+    --workers N: チケット詳細取得の並列数（デフォルト: 4）
+    --checkpoint PATH: チェックポイントファイル（デフォルト: data/checkpoints/reindex_tickets_with_comments.sqlite3）
+    --since DATETIME: この日時以降に更新されたチケットだけを処理（例: 2024-10-01T00:00:00Z）
+    --resume: チェックポイントから再開（デフォルト）
+    --no-resume: チェックポイントを破棄して最初から実行
+    --retry-failed: 前回失敗したチケットだけを再処理
+    --reembed-all: 内容が変わっていないチケットも再ベクトル化
+    --blue-green: 新しいバージョンのコレクションに全件インデックスし、検証後にエイリアスを切り替え
+    --force-swap: --blue-green で検証に失敗してもエイリアスを切り替え
+
+ドキュメントの作成・保存は app/services/ticket_indexer.py に共通化されており、
+index_tickets.py と同じ形のポイントを作成します。
+
+中断（Ctrl-C）や異常終了した場合も、次回実行時はチェックポイントから再開します。
 """
 
 import sys
 import os
 import argparse
-from datetime import datetime
 
 # プロジェクトルートをパスに追加
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from app.services.vector_service import VectorService
 from app.services.redmine_service import RedmineService
-from tqdm import tqdm
+from app.services.ticket_indexer import TicketIndexer, print_run_summary
 
 
 def reindex_tickets_with_comments(
     limit: int = None,
     batch_size: int = 50,
-    dry_run: bool = False
+    dry_run: bool = False,
+    workers: int = 4,
+    checkpoint_path: str = "data/checkpoints/reindex_tickets_with_comments.sqlite3",
+    resume: bool = True,
+    retry_failed: bool = False,
+    reembed_all: bool = False,
+    blue_green: bool = False,
+    force_swap: bool = False,
+    since: str = None
 ):
     """
     クローズ済みチケットをコメント付きで再インデックス
 
     Args:
-        limit: インデックスする最大件数（Noneの場合は全件）
+        limit: 処理するチケットの最大件数（スキップ・変更なし・エラーも含む、Noneの場合は全件）
         batch_size: Redmineから一度に取得する件数
         dry_run: Trueの場合、実際のインデックスは行わない
+        workers: チケット詳細取得の並列数
+        checkpoint_path: 進捗を保存するチェックポイントファイル
+        resume: Trueの場合、チェックポイントから再開する
+        retry_failed: Trueの場合、前回失敗したチケットだけを再処理する
+        reembed_all: Trueの場合、テキストハッシュが一致するチケットも再ベクトル化する
+        blue_green: Trueの場合、新しいバージョンのコレクションに書き込み、検証後にエイリアスを切り替える
+        force_swap: Trueの場合、検証に失敗してもエイリアスを切り替える
+        since: 指定した場合、この日時以降に更新されたチケットだけを処理する
     """
     print("=" * 70)
     print("MindAIgis - Phase 2 チケット再インデックス")
@@ -54,6 +83,7 @@ def reindex_tickets_with_comments(
         print("[1/4] サービスを初期化中...")
         vector_service = VectorService()
         redmine_service = RedmineService()
+        indexer = TicketIndexer(vector_service, redmine_service)
         print("  ✓ Vector Service initialized")
         print("  ✓ Redmine Service initialized")
         print()
@@ -79,97 +109,29 @@ def reindex_tickets_with_comments(
 
     # クローズ済みチケットを取得してインデックス
     print("[4/4] チケットを再インデックス中...")
-
-    indexed_count = 0
-    error_count = 0
-    skipped_count = 0
-    start_time = datetime.now()
+    if not retry_failed and not since:
+        print(f"  対象チケット数: {limit if limit else 'All'}")
 
     try:
-        # イテレータを使用して大量データに対応
-        ticket_iter = redmine_service.get_all_closed_tickets_iter(batch_size=batch_size)
-
-        # 全体の件数取得のための一時的なフィルタ（概算）
-        total_tickets = redmine_service.get_closed_tickets(limit=1, offset=0)
-        total_count = len(total_tickets) if total_tickets else 0
-
-        # 実際の件数がわからないため、limitがある場合はそれを使用
-        max_tickets = limit if limit else "All"
-        print(f"  対象チケット数: {max_tickets}")
-        print()
-
-        with tqdm(total=limit if limit else None, desc="Indexing tickets") as pbar:
-            for ticket in ticket_iter:
-                # 件数制限チェック
-                if limit and indexed_count + error_count + skipped_count >= limit:
-                    break
-
-                try:
-                    # チケット詳細を取得（コメント付き）
-                    ticket_details = redmine_service.get_ticket_details_with_comments(ticket.id)
-
-                    if not ticket_details:
-                        print(f"  ⚠️  チケット #{ticket.id} の詳細取得に失敗")
-                        skipped_count += 1
-                        pbar.update(1)
-                        continue
-
-                    # DRY RUNモードの場合は表示のみ
-                    if dry_run:
-                        print(f"  [DRY RUN] Would index ticket #{ticket_details['ticket_id']}: {ticket_details['subject']}")
-                        print(f"            Comments: {len(ticket_details.get('comments', []))}")
-                        indexed_count += 1
-                        pbar.update(1)
-                        continue
-
-                    # コメント付きでインデックス
-                    metadata = {
-                        "server_names": ticket_details.get("server_names", []),
-                        "category": ticket_details.get("category"),
-                        "assigned_to": ticket_details.get("assigned_to"),
-                        "status": ticket_details.get("status"),
-                        "priority": ticket_details.get("priority"),
-                        "created_on": ticket_details.get("created_on"),
-                        "closed_on": ticket_details.get("closed_on"),
-                        "tracker": ticket_details.get("tracker"),
-                        "project": ticket_details.get("project")
-                    }
-
-                    vector_service.index_ticket_with_comments(
-                        ticket_id=ticket_details["ticket_id"],
-                        subject=ticket_details["subject"],
-                        description=ticket_details["description"],
-                        resolution=ticket_details["resolution"],
-                        comments=ticket_details.get("comments", []),
-                        metadata=metadata
-                    )
-
-                    indexed_count += 1
-                    pbar.update(1)
-
-                except Exception as e:
-                    print(f"  ✗ チケット #{ticket.id} のインデックスに失敗: {e}")
-                    error_count += 1
-                    pbar.update(1)
-                    continue
-
-    except KeyboardInterrupt:
-        print("\n\n⚠️  ユーザーによって中断されました")
+        result = indexer.run(
+            checkpoint_path=checkpoint_path,
+            workers=workers,
+            batch_size=batch_size,
+            limit=limit,
+            since=since,
+            resume=resume,
+            retry_failed=retry_failed,
+            reembed_all=reembed_all,
+            dry_run=dry_run,
+            force=True,
+            blue_green=blue_green,
+            force_swap=force_swap
+        )
     except Exception as e:
         print(f"\n\n✗ エラーが発生しました: {e}")
+        return
 
-    # 結果サマリー
-    end_time = datetime.now()
-    elapsed = (end_time - start_time).total_seconds()
-
-    print()
-    print("=" * 70)
-    print("再インデックス完了")
-    print("=" * 70)
-    print(f"  処理時間: {elapsed:.1f}秒")
-    print(f"  成功: {indexed_count} 件")
-    print(f"  エラー: {error_count} 件")
-    print(f"  スキップ: {skipped_count} 件")
+    print_run_summary(result, dry_run=dry_run)
     print()
 
     if not dry_run:
@@ -181,7 +143,6 @@ def reindex_tickets_with_comments(
         print(f"  Vectors count: {updated_collection_info.get('vectors_count')}")
         print()
     else:
-        print("⚠️  DRY RUN MODE だったため、実際のインデックスは行われていません")
         print("   実際にインデックスするには、--dry-run オプションを外して実行してください")
         print()
 
@@ -195,7 +156,7 @@ def main():
         "--limit",
         type=int,
         default=None,
-        help="インデックスする最大件数（デフォルト: 全件）"
+        help="処理するチケットの最大件数（スキップ・変更なし・エラーも含む、デフォルト: 全件）"
     )
 
     parser.add_argument(
@@ -211,12 +172,80 @@ def main():
         help="実際のインデックスを行わず、処理内容のみ表示"
     )
 
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=4,
+        help="チケット詳細取得の並列数（デフォルト: 4）"
+    )
+
+    parser.add_argument(
+        "--checkpoint",
+        type=str,
+        default="data/checkpoints/reindex_tickets_with_comments.sqlite3",
+        help="進捗を保存するチェックポイントファイル"
+    )
+
+    parser.add_argument(
+        "--since",
+        type=str,
+        default=None,
+        help="この日時以降に更新されたチケットだけを処理（例: 2024-10-01T00:00:00Z）"
+    )
+
+    parser.add_argument(
+        "--resume",
+        dest="resume",
+        action="store_true",
+        default=True,
+        help="チェックポイントから再開（デフォルト）"
+    )
+
+    parser.add_argument(
+        "--no-resume",
+        dest="resume",
+        action="store_false",
+        help="チェックポイントを破棄して最初から実行"
+    )
+
+    parser.add_argument(
+        "--retry-failed",
+        action="store_true",
+        help="前回失敗したチケット（デッドレター）だけを再処理"
+    )
+
+    parser.add_argument(
+        "--reembed-all",
+        action="store_true",
+        help="テキストハッシュが一致する（内容が変わっていない）チケットも再ベクトル化"
+    )
+
+    parser.add_argument(
+        "--blue-green",
+        action="store_true",
+        help="新しいバージョンのコレクションを作成してインデックスし、検証後にエイリアスを切り替え"
+    )
+
+    parser.add_argument(
+        "--force-swap",
+        action="store_true",
+        help="--blue-green で検証に失敗してもエイリアスを切り替え"
+    )
+
     args = parser.parse_args()
 
     reindex_tickets_with_comments(
         limit=args.limit,
         batch_size=args.batch_size,
-        dry_run=args.dry_run
+        dry_run=args.dry_run,
+        workers=args.workers,
+        checkpoint_path=args.checkpoint,
+        resume=args.resume,
+        retry_failed=args.retry_failed,
+        reembed_all=args.reembed_all,
+        blue_green=args.blue_green,
+        force_swap=args.force_swap,
+        since=args.since
     )
 
 
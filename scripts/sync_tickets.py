@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Redmineの更新分だけをQdrantに差分同期するスクリプト
+
+前回の同期以降に更新されたチケット（updated_on >= ウォーターマーク）だけを
+再ベクトル化し、プロジェクト・トラッカーの対象外になったチケットは削除する。
+ウォーターマークは SYNC_STATE_PATH（デフォルト: data/sync_state.json）に保存される。
+
+使用方法:
+    python scripts/sync_tickets.py [オプション]
+
+オプション:
+    --since DATETIME  起点日時を指定（例: 2024-10-01T00:00:00Z、省略時は保存済みウォーターマーク）
+    --state-file PATH 状態ファイルのパス
+    --batch-size N    1回のAPIコールで取得するチケット数（デフォルト: 100）
+    --dry-run         対象件数の確認のみ（インデックス・状態を更新しない）
+    --status          現在のウォーターマークを表示して終了
+"""
+
+import sys
+import argparse
+from pathlib import Path
+
+# プロジェクトルートをPythonパスに追加
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from dotenv import load_dotenv
+
+from app.services.sync_service import DeltaSyncService, SyncStateStore
+
+load_dotenv()
+
+
+def parse_args():
+    """コマンドライン引数をパース"""
+    parser = argparse.ArgumentParser(
+        description="Redmineの更新分をベクトルデータベースに差分同期"
+    )
+    parser.add_argument(
+        "--since",
+        type=str,
+        default=None,
+        help="起点日時（例: 2024-10-01T00:00:00Z）"
+    )
+    parser.add_argument(
+        "--state-file",
+        type=str,
+        default=None,
+        help="状態ファイルのパス（デフォルト: SYNC_STATE_PATH）"
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=100,
+        help="1回のAPIコールで取得するチケット数"
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="対象件数の確認のみ"
+    )
+    parser.add_argument(
+        "--status",
+        action="store_true",
+        help="現在のウォーターマークを表示して終了"
+    )
+
+    return parser.parse_args()
+
+
+def main():
+    """メイン処理"""
+    args = parse_args()
+
+    print("=" * 60)
+    print("MindAIgis - 差分同期")
+    print("=" * 60)
+
+    state_store = SyncStateStore(args.state_file)
+
+    if args.status:
+        state = state_store.load()
+        print(f"  状態ファイル: {state_store.path}")
+        print(f"  ウォーターマーク: {state.get('watermark') or '(未同期)'}")
+        print(f"  最終同期: {state.get('last_synced_at') or '-'}")
+        print(f"  再試行待ち: {len(state.get('failed_ticket_ids', []))} 件")
+        return
+
+    try:
+        sync_service = DeltaSyncService(
+            state_store=state_store,
+            batch_size=args.batch_size
+        )
+        result = sync_service.sync(since=args.since, dry_run=args.dry_run)
+    except KeyboardInterrupt:
+        print("\n\n  ⚠️  ユーザーによる中断（ウォーターマークは更新されていません）")
+        sys.exit(1)
+    except Exception as e:
+        print(f"\n致命的エラー: {e}")
+        sys.exit(1)
+
+    print("\n" + "=" * 60)
+    print("処理完了")
+    print("=" * 60)
+    print(f"  起点: {result['since']}")
+    print(f"  更新: {result['updated']} 件")
+    print(f"  変更なし（再ベクトル化を省略）: {result['unchanged']} 件")
+    print(f"  削除（スコープ外）: {result['deleted']} 件")
+    print(f"  スキップ: {result['skipped']} 件")
+    print(f"  エラー: {result['errors']} 件")
+    print(f"  処理時間: {result['elapsed']:.1f}秒")
+
+    if args.dry_run:
+        print("\n  ℹ️  DRY-RUNモードのため、インデックス・ウォーターマークは更新されていません")
+    else:
+        print(f"  新しいウォーターマーク: {result['watermark']}")
+        if result["failed_ticket_ids"]:
+            print(f"  ⚠️  次回再試行: {result['failed_ticket_ids'][:20]}")
+
+
+if __name__ == "__main__":
+    main()
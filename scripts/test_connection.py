@@ -80,10 +80,10 @@ print("\n[3/4] Qdrant 接続テスト")
 print("-" * 60)
 
 try:
-    from qdrant_client import QdrantClient
+    from app.services.qdrant_connection import create_qdrant_client, describe_target
 
-    qdrant_url = env_vars["QDRANT_URL"]
-    qdrant = QdrantClient(url=qdrant_url)
+    qdrant_url = describe_target()
+    qdrant = create_qdrant_client()
 
     # コレクション一覧取得
     collections = qdrant.get_collections()